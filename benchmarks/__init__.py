@@ -0,0 +1,3 @@
+"""
+Benchmarks e verificações de desempenho do IADvogado
+"""
@@ -0,0 +1,84 @@
+"""
+Funções compartilhadas pelos benchmarks: estatísticas e gravação de resultados
+"""
+
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Sequence
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Percentil por interpolação linear (valores já ordenados)"""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def summarize(samples: List[float], scale: float = 1.0) -> Dict[str, float]:
+    """Resumo estatístico (mean/p50/p95/p99/max) multiplicado por `scale`"""
+    values = sorted(s * scale for s in samples)
+    if not values:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {
+        "mean": round(sum(values) / len(values), 3),
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(values[-1], 3),
+    }
+
+
+def time_calls(fn: Callable[[], object], number: int, warmup: int = 3) -> List[float]:
+    """Executa `fn` `number` vezes e retorna a duração de cada chamada em segundos"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(number):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR, capture_output=True, text=True, timeout=5,
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_metadata() -> Dict[str, object]:
+    """Informações do ambiente gravadas junto com os resultados"""
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def write_results(path: str | None, kind: str, results: Dict[str, object]) -> Dict[str, object]:
+    """Grava os resultados em JSON (ou imprime no stdout se `path` for None)"""
+    document = {"kind": kind, "meta": run_metadata(), **results}
+    text = json.dumps(document, indent=2, ensure_ascii=False)
+    if path:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+        print(f"Resultados gravados em {path}")
+    else:
+        print(text)
+    return document
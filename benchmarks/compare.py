@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Compara dois arquivos de resultado (micro ou load) entre commits
+
+Uso:
+    python -m benchmarks.compare base.json novo.json --threshold 10
+
+Sai com código 1 se alguma métrica piorar mais que o limite (em %).
+"""
+
+import argparse
+import json
+from typing import Dict, List, Tuple
+
+# Métricas em que um valor maior é melhor; as demais (latências) são "menor é melhor"
+HIGHER_IS_BETTER = ("ops_per_sec", "throughput_rps")
+# Apenas estas folhas entram na comparação
+COMPARED_LEAVES = ("p50", "p95", "p99", "mean", "ops_per_sec", "throughput_rps", "errors")
+
+
+def _flatten(document: Dict) -> Dict[str, float]:
+    """Achata os resultados em {caminho: valor} com chaves estáveis"""
+    flat: Dict[str, float] = {}
+
+    def walk(prefix: str, value):
+        if isinstance(value, dict):
+            for key, inner in value.items():
+                walk(f"{prefix}.{key}" if prefix else key, inner)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            if prefix.rsplit(".", 1)[-1] in COMPARED_LEAVES:
+                flat[prefix] = float(value)
+
+    if "benchmarks" in document:
+        walk("", document["benchmarks"])
+    for level in document.get("levels", []):
+        walk(f"c{level['concurrency']}", level)
+    return flat
+
+
+def compare(base: Dict, new: Dict, threshold: float) -> Tuple[List[Dict], bool]:
+    """Retorna (linhas da comparação, houve regressão)"""
+    base_flat, new_flat = _flatten(base), _flatten(new)
+    rows = []
+    regressed = False
+    for key in sorted(base_flat.keys() & new_flat.keys()):
+        old, cur = base_flat[key], new_flat[key]
+        if old == 0:
+            change = 0.0 if cur == 0 else float("inf")
+        else:
+            change = (cur - old) / old * 100.0
+        worse = -change if key.endswith(HIGHER_IS_BETTER) else change
+        is_regression = worse > threshold
+        regressed = regressed or is_regression
+        rows.append({"metric": key, "base": old, "new": cur, "change_pct": round(change, 2), "regression": is_regression})
+    return rows, regressed
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Compara resultados de benchmark")
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="piora máxima tolerada em %%")
+    args = parser.parse_args(argv)
+
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+
+    rows, regressed = compare(base, new, args.threshold)
+    print(f"base: {base.get('meta', {}).get('commit')}  novo: {new.get('meta', {}).get('commit')}")
+    for row in rows:
+        flag = "  ⚠ REGRESSÃO" if row["regression"] else ""
+        print(f"{row['metric']:<60} {row['base']:>12.3f} → {row['new']:>12.3f} ({row['change_pct']:+.1f}%){flag}")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Verificação de regressão do tempo de import da API
+
+Executa `python -X importtime -c "import iadvogado.api.main"` em processos
+limpos, mede o tempo cumulativo do módulo e falha se:
+- a mediana das execuções exceder o orçamento (em ms), ou
+- algum módulo pesado (torch, transformers, edge_tts, ...) for importado.
+
+A primeira execução só aquece o cache de disco e os .pyc e é descartada; uma
+execução isolada varia ±20% e a mediana de várias não. A maior parte do tempo
+é do FastAPI/pydantic (~400 ms); o orçamento deixa folga para a variação entre
+máquinas e pega regressões como um import pesado fora do caminho tardio.
+
+Uso (da raiz do projeto):
+    python -m benchmarks.importtime --budget-ms 800 --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+TARGET_MODULE = "iadvogado.api.main"
+DEFAULT_BUDGET_MS = 800.0
+DEFAULT_RUNS = 5
+
+# Módulos que não podem ser carregados no start da API
+FORBIDDEN_MODULES = (
+    "torch",
+    "transformers",
+    "bitsandbytes",
+    "accelerate",
+    "edge_tts",
+    "pytesseract",
+    "PIL",
+    "supabase",
+    "openai",
+    "gtts",
+    "boto3",
+)
+
+
+def measure_import(module: str = TARGET_MODULE) -> Dict[str, float]:
+    """Retorna {módulo: tempo cumulativo em ms} para o import do módulo"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=root,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Falha ao importar {module}:\n{proc.stderr[-2000:]}")
+
+    timings: Dict[str, float] = {}
+    for line in proc.stderr.splitlines():
+        # Formato: "import time:   self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings[name.strip()] = int(cumulative) / 1000.0
+    return timings
+
+
+def check(budget_ms: float = DEFAULT_BUDGET_MS, module: str = TARGET_MODULE, runs: int = DEFAULT_RUNS) -> Dict:
+    """Mede o import (mediana de `runs` execuções após uma de aquecimento) e compara com o orçamento"""
+    measure_import(module)
+    samples = [measure_import(module) for _ in range(max(1, runs))]
+    totals = [timings.get(module, 0.0) for timings in samples]
+    total_ms = statistics.median(totals)
+    # Execução mediana: a lista dos mais lentos vem dela
+    timings = samples[totals.index(sorted(totals)[(len(totals) - 1) // 2])]
+    forbidden: List[str] = sorted({
+        name for timings_run in samples for name in timings_run
+        if name.split(".")[0] in FORBIDDEN_MODULES
+    })
+    slowest = sorted(timings.items(), key=lambda kv: kv[1], reverse=True)[:15]
+    return {
+        "module": module,
+        "total_ms": round(total_ms, 2),
+        "runs_ms": [round(ms, 2) for ms in totals],
+        "budget_ms": budget_ms,
+        "forbidden_imports": forbidden,
+        "slowest": [{"module": name, "cumulative_ms": round(ms, 2)} for name, ms in slowest],
+        "ok": total_ms <= budget_ms and not forbidden,
+    }
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--module", default=TARGET_MODULE)
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="Execuções medidas (vale a mediana)")
+    args = parser.parse_args(argv)
+
+    result = check(args.budget_ms, args.module, args.runs)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0 if result["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
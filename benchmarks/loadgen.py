@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Gerador de carga para o endpoint /upload
+
+Dispara requisições com concorrência fixa (um nível por vez) e reporta vazão e
+latência p50/p95/p99. Por padrão roda a API no mesmo processo (ASGI) com os
+substitutos offline de benchmarks.standins: LLM minúsculo, Edge TTS falso e
+WhatsApp/Supabase falsos. Com --url, mede um servidor já em execução.
+
+Uso (da raiz do projeto):
+    python -m benchmarks.loadgen --concurrency 1,4,16 --requests 32 --output load.json
+    python -m benchmarks.loadgen --fake-ocr --as-audio --phone 5511999999999
+"""
+
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+from . import standins
+from ._common import summarize, write_results
+
+
+async def _run_level(client, concurrency: int, total: int, files: Dict, data: Dict) -> Dict[str, object]:
+    """Executa `total` requisições mantendo `concurrency` em voo"""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    tiers: Dict[str, int] = {}
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < total:
+            next_index += 1
+            start = time.perf_counter()
+            try:
+                response = await client.post("/upload", files=files, data=data)
+                key = str(response.status_code)
+                if response.status_code == 200:
+                    tier = response.json().get("service_tier", "unknown")
+                    tiers[tier] = tiers.get(tier, 0) + 1
+            except Exception as e:
+                key = type(e).__name__
+            latencies.append(time.perf_counter() - start)
+            statuses[key] = statuses.get(key, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    errors = sum(count for key, count in statuses.items() if key != "200")
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "status_counts": statuses,
+        "tier_counts": tiers,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 3) if elapsed else 0.0,
+        "latency_ms": summarize(latencies, scale=1e3),
+    }
+
+
+def _install_standins(args, cache_dir: str):
+    """Liga a API aos substitutos offline (modo in-process)"""
+    standins.install_tiny_llm(seed=args.seed, max_new_tokens=args.max_new_tokens)
+    standins.install_fake_tts(cache_dir, cache_enabled=args.tts_cache)
+    standins.install_fake_integrations(whatsapp_latency=args.whatsapp_latency)
+    if args.fake_ocr:
+        standins.install_fake_ocr()
+
+    from iadvogado.config.config import settings
+    # Mede o pipeline, não o controle de admissão: nenhuma requisição recebe 429
+    settings.admission_burst = settings.admission_rate_per_minute = float("inf")
+    settings.admission_queue_per_slot = args.requests * 1024
+    # O texto de exemplo é uma intimação rotineira; sem --templates ele vai para o LLM
+    settings.template_fast_path = args.templates
+    # Todas as requisições enviam o mesmo documento: sem --near-duplicates, nenhuma sai do cache
+    settings.near_duplicate_cache = args.near_duplicates
+    settings.degradation_enabled = args.degradation
+    if args.phone:
+        settings.whatsapp_api_url = settings.whatsapp_api_url or "http://whatsapp.invalid"
+
+
+async def _run(args) -> Dict[str, object]:
+    import httpx
+
+    image_bytes = standins.make_document_image(args.width, args.height)
+    files = {"file": ("documento.jpg", image_bytes, "image/jpeg")}
+    data = {"as_audio": "true" if args.as_audio else "false"}
+    if args.phone:
+        data["phone_number"] = args.phone
+
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+        else:
+            # Importa a API antes dos substitutos para que eles sobrescrevam os módulos já carregados
+            from iadvogado.api.main import app
+            _install_standins(args, cache_dir)
+            transport = httpx.ASGITransport(app=app)
+            client = httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout)
+
+        async with client:
+            # Aquecimento (carregamento de módulos, primeira geração)
+            for _ in range(args.warmup):
+                await client.post("/upload", files=files, data=data)
+
+            results = []
+            for concurrency in levels:
+                print(f"→ concorrência {concurrency}: {args.requests} requisições", file=sys.stderr)
+                results.append(await _run_level(client, concurrency, args.requests, files, data))
+
+    return {
+        "config": {
+            "target": args.url or "in-process",
+            "image": f"{args.width}x{args.height}",
+            "image_bytes": len(image_bytes),
+            "as_audio": args.as_audio,
+            "whatsapp": bool(args.phone),
+            "fake_ocr": args.fake_ocr,
+            "tts_cache": args.tts_cache,
+            "templates": args.templates,
+            "near_duplicates": args.near_duplicates,
+            "degradation": args.degradation,
+            "max_new_tokens": args.max_new_tokens,
+            "seed": args.seed,
+        },
+        "levels": results,
+    }
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Teste de carga do /upload")
+    parser.add_argument("--url", default=None, help="servidor externo (padrão: API in-process com substitutos)")
+    parser.add_argument("--concurrency", default="1,4,16", help="níveis separados por vírgula")
+    parser.add_argument("--requests", type=int, default=32, help="requisições por nível")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=1810)
+    parser.add_argument("--as-audio", action="store_true")
+    parser.add_argument("--phone", default=None, help="ativa o envio (falso) via WhatsApp")
+    parser.add_argument("--fake-ocr", action="store_true", help="não usa tesseract")
+    parser.add_argument("--tts-cache", action="store_true", help="mantém o cache de áudio ligado")
+    parser.add_argument("--templates", action="store_true", help="liga o caminho rápido por modelos (sem LLM)")
+    parser.add_argument("--near-duplicates", action="store_true", help="liga o cache de quase-duplicatas")
+    parser.add_argument("--degradation", action="store_true", help="liga a degradação por carga (níveis de serviço)")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--whatsapp-latency", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", default=None, help="arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args(argv)
+
+    results = asyncio.run(_run(args))
+    write_results(args.output, "load", results)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks dos caminhos quentes do IADvogado
+
+- image_bytes_to_text em vários tamanhos de imagem (requer tesseract local)
+- normalize_legal_text (redução de tokens antes do LLM)
+- fingerprint SimHash e consulta ao índice de quase-duplicatas (até 1 milhão de documentos)
+- LlamaClient._parse_response / _manual_parse
+- EdgeTTSWorker.create_ssml_for_legal_text
+- chave de cache do TTS, validação do arquivo e leitura de cache hit
+
+Uso (da raiz do projeto):
+    python -m benchmarks.micro --output micro.json
+    python -m benchmarks.micro --only parse,ssml,cache
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from typing import Callable, Dict, List
+
+from . import standins
+from ._common import summarize, time_calls, write_results
+
+IMAGE_SIZES = ((640, 480), (1280, 960), (2480, 3508))  # até A4 a 300 dpi
+
+VALID_JSON_RESPONSE = (
+    'Aqui está o resultado:\n{"what_happened": "Você foi chamado para uma audiência.", '
+    '"what_it_means": "O juiz quer tentar um acordo.", '
+    '"what_to_do_now": "Compareça no dia 15/03 às 14h30 com seus documentos."}\nEspero ter ajudado.'
+)
+FREE_TEXT_RESPONSE = (
+    "O que aconteceu: você foi chamado para uma audiência de conciliação.\n"
+    "O que significa: o juiz quer tentar um acordo entre as partes.\n"
+    "O que fazer agora: compareça no dia marcado levando seus documentos.\n"
+) * 4
+
+
+def _result(samples: List[float], **extra) -> Dict[str, object]:
+    total = sum(samples)
+    return {
+        "iterations": len(samples),
+        "latency_us": summarize(samples, scale=1e6),
+        "ops_per_sec": round(len(samples) / total, 2) if total else 0.0,
+        **extra,
+    }
+
+
+def bench_ocr(number: int) -> Dict[str, object]:
+    from iadvogado.services.ocr_worker import image_bytes_to_text
+
+    results = {}
+    for width, height in IMAGE_SIZES:
+        image_bytes = standins.make_document_image(width, height)
+        samples = time_calls(lambda: image_bytes_to_text(image_bytes), number, warmup=1)
+        results[f"ocr.image_bytes_to_text.{width}x{height}"] = _result(samples, input_bytes=len(image_bytes))
+    return results
+
+
+def bench_normalize(number: int) -> Dict[str, object]:
+    from iadvogado.services.text_normalizer import normalize_legal_text
+
+    results = {}
+    for pages in (1, 5, 20):
+        text = standins.make_ocr_text(pages)
+        normalized = normalize_legal_text(text)
+        samples = time_calls(lambda: normalize_legal_text(text), number)
+        results[f"normalize.{pages}pages"] = _result(
+            samples,
+            original_tokens=normalized.original_tokens,
+            normalized_tokens=normalized.normalized_tokens,
+            reduction=round(normalized.reduction, 3),
+        )
+    return results
+
+
+def bench_near_duplicate(number: int) -> Dict[str, object]:
+    import random
+    from iadvogado.config.config import settings
+    from iadvogado.services.near_duplicates import fingerprint_document
+    from iadvogado.services.text_normalizer import normalize_legal_text
+    from iadvogado.storage.near_duplicate_index import NearDuplicateIndex
+
+    results = {}
+    for pages in (1, 20):
+        text = normalize_legal_text(standins.make_ocr_text(pages)).text
+        results[f"near_duplicate.fingerprint.{pages}pages"] = _result(time_calls(lambda: fingerprint_document(text), number))
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        index = NearDuplicateIndex(os.path.join(directory, "near_duplicates.db"), settings.near_duplicate_max_distance)
+        loaded = 0
+        for size in (10_000, 1_000_000):
+            # Fingerprints aleatórios direto na memória: mede a busca LSH, não o SQLite
+            with index._lock:
+                for row_id in range(loaded, size):
+                    index._insert(row_id + 1, rng.getrandbits(64))
+            loaded = size
+            probe = rng.getrandbits(64)
+            results[f"near_duplicate.lookup.{size}"] = _result(
+                time_calls(lambda: index.candidates(probe ^ 0b101), number),
+                max_distance=index.max_distance,
+            )
+        index.close()
+    return results
+
+
+def bench_parse(number: int) -> Dict[str, object]:
+    from iadvogado.services.llama_client import LlamaClient
+
+    # Sem __init__: os métodos de parse não dependem do modelo
+    client = LlamaClient.__new__(LlamaClient)
+    return {
+        "llm.parse_response.json": _result(time_calls(lambda: client._parse_response(VALID_JSON_RESPONSE), number)),
+        "llm.parse_response.fallback": _result(time_calls(lambda: client._parse_response(FREE_TEXT_RESPONSE), number)),
+        "llm.manual_parse": _result(time_calls(lambda: client._manual_parse(FREE_TEXT_RESPONSE), number)),
+    }
+
+
+def bench_ssml(number: int) -> Dict[str, object]:
+    with tempfile.TemporaryDirectory() as cache_dir:
+        worker = standins.install_fake_tts(cache_dir)
+        results = {}
+        for size in (200, 2000, 10000):
+            text = (standins.SAMPLE_LEGAL_TEXT * (size // len(standins.SAMPLE_LEGAL_TEXT) + 1))[:size]
+            samples = time_calls(lambda: worker.create_ssml_for_legal_text(text), number)
+            results[f"tts.create_ssml.{size}chars"] = _result(samples)
+        return results
+
+
+def bench_cache(number: int) -> Dict[str, object]:
+    with tempfile.TemporaryDirectory() as cache_dir:
+        worker = standins.install_fake_tts(cache_dir, cache_enabled=True, seconds_per_char=0.0)
+        text = standins.SAMPLE_LEGAL_TEXT
+        args = (text, worker.voice, worker.rate, worker.volume, worker.pitch)
+
+        # Popula o cache uma vez para medir o caminho de hit
+        asyncio.run(worker.text_to_speech_bytes(text))
+        hit_file = worker._get_cache_file_path(worker._get_cache_key(*args))
+        miss_file = os.path.join(cache_dir, "nao-existe.mp3")
+
+        async def lookup_many(n: int) -> List[float]:
+            import time
+            samples = []
+            for _ in range(n):
+                start = time.perf_counter()
+                await worker.text_to_speech_bytes(text)
+                samples.append(time.perf_counter() - start)
+            return samples
+
+        return {
+            "tts.cache_key": _result(time_calls(lambda: worker._get_cache_key(*args), number)),
+            "tts.cache_valid.hit": _result(time_calls(lambda: worker._is_cache_valid(hit_file), number)),
+            "tts.cache_valid.miss": _result(time_calls(lambda: worker._is_cache_valid(miss_file), number)),
+            "tts.text_to_speech_bytes.cache_hit": _result(asyncio.run(lookup_many(number))),
+        }
+
+
+BENCHMARKS: Dict[str, Callable[[int], Dict[str, object]]] = {
+    "ocr": bench_ocr,
+    "normalize": bench_normalize,
+    "near_duplicate": bench_near_duplicate,
+    "parse": bench_parse,
+    "ssml": bench_ssml,
+    "cache": bench_cache,
+}
+
+# O OCR é ordens de grandeza mais lento; usa menos iterações por padrão
+DEFAULT_ITERATIONS = {"ocr": 5, "normalize": 500, "near_duplicate": 500, "parse": 2000, "ssml": 2000, "cache": 500}
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks do IADvogado")
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help="grupos separados por vírgula")
+    parser.add_argument("--iterations", type=int, default=None, help="sobrescreve as iterações de todos os grupos")
+    parser.add_argument("--output", default=None, help="arquivo JSON de saída (padrão: stdout)")
+    args = parser.parse_args(argv)
+
+    results: Dict[str, object] = {}
+    for name in [n.strip() for n in args.only.split(",") if n.strip()]:
+        if name not in BENCHMARKS:
+            parser.error(f"grupo desconhecido: {name} (opções: {', '.join(BENCHMARKS)})")
+        number = args.iterations or DEFAULT_ITERATIONS[name]
+        print(f"→ {name} ({number} iterações)", file=sys.stderr)
+        results.update(BENCHMARKS[name](number))
+
+    write_results(args.output, "micro", {"benchmarks": results})
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,297 @@
+"""
+Substitutos offline e determinísticos para os benchmarks
+
+- TinyCausalLM: modelo Llama minúsculo com pesos aleatórios (seed fixa) e um
+  tokenizer de bytes, plugado no LlamaClient real para exercitar tokenize,
+  prefill e decode sem GPU nem download.
+- fake edge_tts: stream de áudio sintético com latência proporcional ao texto.
+- WhatsApp e Supabase falsos que apenas registram as chamadas.
+
+Nada aqui faz acesso à rede.
+"""
+
+import asyncio
+import io
+import sys
+import types
+from typing import Dict, List
+
+# A audiência fica em data futura fixa: o caminho por modelos ignora datas passadas
+SAMPLE_LEGAL_TEXT = (
+    "PODER JUDICIÁRIO\n"
+    "TRIBUNAL DE JUSTIÇA DO ESTADO DE SÃO PAULO\n"
+    "Processo nº 1001234-54.2024.8.26.0100\n"
+    "INTIMAÇÃO\n"
+    "Fica a parte autora intimada para comparecer à audiência de conciliação "
+    "designada para o dia 15/03/2099, às 14h30, na sala de audiências da 2ª Vara "
+    "Cível do Foro Central, devendo apresentar documentos pessoais e comprovante "
+    "de residência, sob pena de extinção do feito, nos termos do art. 334, §8º, "
+    "do Código de Processo Civil. Prazo: 15 (quinze) dias.\n"
+    "São Paulo, 10 de fevereiro de 2025.\n"
+)
+
+# Rodapé típico do e-SAJ repetido em cada página da saída do OCR
+SAMPLE_OCR_FOOTER = (
+    "____________________________\n"
+    "Este documento é cópia do original, assinado digitalmente por MARIA DE SOUZA, "
+    "liberado nos autos em 10/02/2025 às 16:42.\n"
+    "Para conferir o original, acesse o site https://esaj.tjsp.jus.br/pastadigital/pg/"
+    "abrirConferenciaDocumento.do, informe o processo 1001234-54.2024.8.26.0100 e código 1A2B3C4.\n"
+    "fls. {page}\n"
+)
+
+
+def make_ocr_text(pages: int, text: str = SAMPLE_LEGAL_TEXT) -> str:
+    """Saída de OCR com várias páginas: cabeçalho e rodapé repetidos, hifenização"""
+    body = text.replace("comparecer à audiência", "compa-\nrecer à audiência")
+    return "\f".join(body + SAMPLE_OCR_FOOTER.format(page=page + 1) for page in range(pages))
+
+
+# ---------------------------------------------------------------------------
+# LLM
+# ---------------------------------------------------------------------------
+
+class ByteTokenizer:
+    """Tokenizer de bytes UTF-8 (ids 0-255) com tokens especiais de pad/eos"""
+
+    pad_token_id = 256
+    eos_token_id = 257
+    pad_token = "<pad>"
+    eos_token = "<eos>"
+    vocab_size = 258
+    all_special_ids = [256, 257]
+
+    def __len__(self):
+        return self.vocab_size
+
+    padding_side = "right"
+
+    def __call__(self, text, return_tensors="pt", truncation=True, max_length=2048, padding=True, padding_side=None):
+        import torch
+
+        padding_side = padding_side or self.padding_side
+        texts = [text] if isinstance(text, str) else list(text)
+        rows = [list(t.encode("utf-8"))[:max_length] if truncation else list(t.encode("utf-8")) for t in texts]
+        width = max(len(ids) for ids in rows)
+        input_ids, attention_mask = [], []
+        for ids in rows:
+            pad = [self.pad_token_id] * (width - len(ids))
+            mask = [0] * len(pad) + [1] * len(ids) if padding_side == "left" else [1] * len(ids) + [0] * len(pad)
+            input_ids.append(pad + ids if padding_side == "left" else ids + pad)
+            attention_mask.append(mask)
+        return {
+            "input_ids": torch.tensor(input_ids, dtype=torch.long),
+            "attention_mask": torch.tensor(attention_mask, dtype=torch.long),
+        }
+
+    def decode(self, ids, skip_special_tokens=True):
+        data = bytes(int(i) for i in ids if int(i) < 256)
+        # "replace": bytes UTF-8 incompletos viram U+FFFD, como nos tokenizers byte-level
+        return data.decode("utf-8", errors="replace")
+
+    def batch_decode(self, sequences, skip_special_tokens=True):
+        return [self.decode(ids, skip_special_tokens) for ids in sequences]
+
+
+def build_tiny_causal_lm(seed: int = 0):
+    """Cria um LlamaForCausalLM de ~100k parâmetros com pesos determinísticos"""
+    import torch
+    from transformers import LlamaConfig, LlamaForCausalLM
+
+    torch.manual_seed(seed)
+    config = LlamaConfig(
+        vocab_size=ByteTokenizer.vocab_size,
+        hidden_size=64,
+        intermediate_size=128,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=4,
+        max_position_embeddings=4096,
+        pad_token_id=ByteTokenizer.pad_token_id,
+        eos_token_id=ByteTokenizer.eos_token_id,
+        bos_token_id=ByteTokenizer.eos_token_id,
+    )
+    model = LlamaForCausalLM(config)
+    model.eval()
+    return model
+
+
+def install_tiny_llm(seed: int = 0, max_new_tokens: int | None = None):
+    """Pluga o modelo minúsculo no LlamaClient do registro de provedores"""
+    import torch
+    from iadvogado.config.config import settings
+    from iadvogado.services.providers import get_llm_client
+
+    settings.llm_provider = "llama"
+    if max_new_tokens is not None:
+        settings.llama_max_tokens = max_new_tokens
+
+    torch.manual_seed(seed)
+    client = get_llm_client("llama")
+    client.device = "cpu"
+    client.model = build_tiny_causal_lm(seed)
+    client.tokenizer = ByteTokenizer()
+    client.model_loaded = True
+    client.load_error = None
+    return client
+
+
+# ---------------------------------------------------------------------------
+# TTS
+# ---------------------------------------------------------------------------
+
+FAKE_MP3_FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413  # quadro MP3 de 417 bytes
+
+
+def make_fake_edge_tts(seconds_per_char: float = 0.0002, chunk_chars: int = 200) -> types.ModuleType:
+    """Módulo `edge_tts` falso: áudio determinístico e latência proporcional ao texto"""
+    module = types.ModuleType("edge_tts")
+
+    class Communicate:
+        def __init__(self, text, voice=None, **kwargs):
+            self.text = text
+            self.voice = voice
+
+        async def stream(self):
+            for start in range(0, max(1, len(self.text)), chunk_chars):
+                piece = self.text[start:start + chunk_chars]
+                await asyncio.sleep(len(piece) * seconds_per_char)
+                yield {"type": "audio", "data": FAKE_MP3_FRAME * max(1, len(piece) // 20)}
+
+    async def list_voices():
+        return [{"Name": "pt-BR-FranciscaNeural", "ShortName": "pt-BR-FranciscaNeural", "Locale": "pt-BR"}]
+
+    module.Communicate = Communicate
+    module.list_voices = list_voices
+    module.__stand_in__ = True
+    return module
+
+
+def install_fake_tts(cache_dir: str, cache_enabled: bool = False, seconds_per_char: float = 0.0002):
+    """Substitui o edge_tts pelo falso e aponta o cache para `cache_dir`"""
+    from iadvogado.config.config import settings
+
+    sys.modules["edge_tts"] = make_fake_edge_tts(seconds_per_char)
+    settings.tts_provider = "edge"
+
+    from iadvogado.services import edge_tts_worker as module
+    module.edge_tts = sys.modules["edge_tts"]
+
+    from iadvogado.services.providers import get_tts_worker
+    worker = get_tts_worker("edge")
+    worker.cache_dir = cache_dir
+    worker.cache_enabled = cache_enabled
+    return worker
+
+
+# ---------------------------------------------------------------------------
+# OCR, WhatsApp e Supabase
+# ---------------------------------------------------------------------------
+
+def make_document_image(width: int, height: int, text: str = SAMPLE_LEGAL_TEXT, fmt: str = "JPEG") -> bytes:
+    """Gera uma imagem de documento com texto para OCR (PIL)"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    line_height = max(12, height // 60)
+    y = line_height
+    for paragraph in text.splitlines() * max(1, height // (line_height * 12)):
+        draw.text((line_height, y), paragraph, fill="black")
+        y += line_height
+        if y > height - line_height:
+            break
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, quality=85)
+    return buffer.getvalue()
+
+
+def install_fake_ocr(text: str = SAMPLE_LEGAL_TEXT):
+    """Troca o OCR por um texto fixo (para máquinas sem tesseract)"""
+    from iadvogado.core import pipeline
+
+    def fake_image_bytes_to_text(image_bytes: bytes) -> str:
+        return text
+
+    pipeline.image_bytes_to_text = fake_image_bytes_to_text
+
+
+class FakeWhatsApp:
+    """Registra as mensagens que seriam enviadas, com latência fixa"""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.sent: List[Dict[str, str]] = []
+
+    async def send_whatsapp_text(self, to_number: str, text: str):
+        await asyncio.sleep(self.latency)
+        self.sent.append({"to": to_number, "text": text})
+        return {"messages": [{"id": f"fake-{len(self.sent)}"}]}
+
+
+class FakeSupabase:
+    """Imita `client.table(name).insert(data).execute()` guardando em memória"""
+
+    def __init__(self):
+        self.rows: Dict[str, List[dict]] = {}
+
+    def table(self, name: str):
+        client = self
+
+        class _Query:
+            def insert(self, data):
+                self._data = data
+                return self
+
+            def execute(self):
+                client.rows.setdefault(name, []).append(self._data)
+                return types.SimpleNamespace(data=[self._data])
+
+        return _Query()
+
+
+class FakeCourtFetcher:
+    """Fonte de processos em memória: número CNJ (20 dígitos) -> texto do documento"""
+
+    name = "fake"
+
+    def __init__(self, documents: Dict[str, str] | None = None, latency: float = 0.0):
+        self.documents = dict(documents or {})
+        self.latency = latency
+        self.requests: List[str] = []
+
+    async def fetch(self, process_number: str):
+        from iadvogado.integrations.court_fetchers import FetchedDocument
+
+        await asyncio.sleep(self.latency)
+        self.requests.append(process_number)
+        text = self.documents.get(process_number)
+        return FetchedDocument(process_number, text, self.name) if text else None
+
+
+def install_fake_integrations(whatsapp_latency: float = 0.05):
+    """Instala WhatsApp e Supabase falsos no pipeline e na camada de storage"""
+    from iadvogado.core import pipeline
+    from iadvogado.storage import storage
+
+    whatsapp = FakeWhatsApp(whatsapp_latency)
+    pipeline.send_whatsapp_text = whatsapp.send_whatsapp_text
+
+    supabase = FakeSupabase()
+    storage.supabase = supabase
+    storage._initialized = True
+    return whatsapp, supabase
+
+
+def install_fake_court_fetcher(documents: Dict[str, str] | None = None, index_path: str | None = None):
+    """Instala o fetcher em memória e, opcionalmente, um índice de processos em outro arquivo"""
+    from iadvogado.config.config import settings
+    from iadvogado.integrations import court_fetchers
+    from iadvogado.storage import process_index
+
+    if index_path:
+        process_index.close_process_index()
+        settings.process_index_path = index_path
+    fetcher = FakeCourtFetcher(documents)
+    court_fetchers.set_court_fetcher(fetcher)
+    return fetcher
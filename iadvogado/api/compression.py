@@ -0,0 +1,87 @@
+"""
+Compressão negociada (br/gzip) das respostas JSON da API
+
+Respostas JSON acima de `minimum_size` são comprimidas conforme o
+Accept-Encoding do cliente. Respostas já codificadas (ex.: estáticos
+pré-comprimidos), pequenas ou de outros tipos passam intactas.
+"""
+
+import gzip
+from typing import List
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from .static_assets import negotiate_encoding
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele, apenas gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json",)
+
+
+def _compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        # Qualidade 5: boa taxa com custo de CPU compatível com compressão por requisição
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+class CompressionMiddleware:
+    """Middleware ASGI puro: não interfere em streaming nem em desconexões"""
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.available = ("br", "gzip") if brotli is not None else ("gzip",)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""), self.available)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        body_parts: List[bytes] = []
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "").split(";")[0].strip()
+                if content_type not in COMPRESSIBLE_TYPES or "content-encoding" in headers:
+                    passthrough = True
+                    await send(message)
+                else:
+                    start_message = message
+                return
+
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body_parts.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(body_parts)
+            headers = MutableHeaders(raw=start_message["headers"])
+            if len(body) >= self.minimum_size:
+                body = _compress(body, encoding)
+                headers["content-encoding"] = encoding
+                headers["content-length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,122 +1,553 @@
-from fastapi import FastAPI, UploadFile, File, Form, BackgroundTasks, HTTPException
-from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
-from fastapi.staticfiles import StaticFiles
-from ..services.ocr_worker import image_bytes_to_text
-from ..services.llama_client import simplify_text  # Mudança: usando Llama ao invés de OpenAI
-from ..services.edge_tts_worker import text_to_speech_bytes, edge_tts_worker  # Mudança: usando Edge TTS
-from ..storage.storage import save_processing_record
-from ..utils.utils import make_disclaimer, expiration_date
-from ..integrations.whatsapp_adapter import send_whatsapp_text
+from fastapi import FastAPI, UploadFile, File, Form, BackgroundTasks, HTTPException, Request, Depends
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, Response
+from starlette.datastructures import Headers, MutableHeaders
+from .static_assets import STATIC_DIR, PrecompressedStaticFiles, asset_response, asset_url
+from .compression import CompressionMiddleware
+from ..services.providers import text_to_speech_bytes, get_tts_worker, warmup_small_llm
+from ..services.ocr_worker import upload_image_formats
+from ..services.audio_formats import MP3, AudioFormat, resolve_audio_format
+from ..services.model_artifacts import check_artifacts
+from ..core.pipeline import process_document, process_text, deliver_stage, OCRFailed, PipelineResult
+from ..core.cancellation import CancellationToken, RequestCancelled, DEADLINE_EXCEEDED, run_cancellable
+from ..core.admission import AdmissionRejected, RATE_LIMITED, client_ip, get_admission_controller, request_cost, retry_after_header
+from ..core.batch import BatchDocument, BatchPipeline, expand_inputs
+from ..core.degradation import get_degradation_controller
+from .security import is_admin_token, require_admin, require_batch_token
+from ..storage.storage import save_processing_record, init_storage, close_storage
+from ..storage.process_index import get_process_index, index_document, close_process_index
+from ..storage.batch_store import get_batch_store, close_batch_store
+from ..storage.near_duplicate_index import get_near_duplicate_index, close_near_duplicate_index
+from ..integrations.court_fetchers import get_court_fetcher
+from ..utils.cnj import normalize_cnj, format_cnj
+from ..utils.utils import expiration_date
+from ..config.config import settings
+from ..core.metrics import time_stage, render_metrics, mark_process_dead
+from ..core.profiling import (
+    arm_torch_profiler, get_capture_store, loop_monitor_status, profile_request, profiling_status, set_sample_rate,
+    should_sample, start_loop_monitor, stop_loop_monitor,
+)
+from contextlib import asynccontextmanager
+from typing import List
 import asyncio
 import logging
 import os
 import base64
+import json
+import re
+import time
+import uuid
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="IADvogado - Justiça Simples")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Cria clientes externos no startup (e não no import do módulo)"""
+    if settings.model_artifacts_dir and settings.llm_provider == "llama":
+        # Artefato ausente, corrompido ou fora da revisão fixada impede o startup
+        await asyncio.to_thread(check_artifacts)
+    await asyncio.to_thread(init_storage)
+    if settings.near_duplicate_cache:
+        # Carrega os fingerprints no startup, e não na primeira requisição
+        await asyncio.to_thread(get_near_duplicate_index)
+    if settings.loop_monitor:
+        start_loop_monitor()
+    warmup = None
+    if settings.degradation_enabled and settings.llm_small_model:
+        # Em segundo plano: o nível small só entra em uso depois de carregado
+        warmup = asyncio.create_task(warmup_small_llm())
+    yield
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
+    await stop_loop_monitor()
+    close_storage()
+    close_process_index()
+    close_batch_store()
+    close_near_duplicate_index()
+    mark_process_dead()
 
-# Servir arquivos estáticos
-static_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "static")
+app = FastAPI(title="IADvogado - Justiça Simples", lifespan=lifespan)
+
+# Margem para os campos do formulário multipart além do arquivo
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+class RequestBodyTooLarge(Exception):
+    """Corpo da requisição passou do limite durante a leitura"""
+
+class UploadSizeLimitMiddleware:
+    """
+    Recusa POSTs grandes: pelo Content-Length, antes de ler o corpo, e contando
+    os bytes recebidos (corpos chunked, sem Content-Length), assim que passam
+    do limite
+
+    Middleware ASGI puro (sem BaseHTTPMiddleware) para não interferir em
+    streaming nem na detecção de desconexão do cliente.
+    """
+
+    def __init__(self, app, max_bytes: int, path_limits: dict | None = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = path_limits or {}
+
+    @staticmethod
+    def _too_large(max_bytes: int) -> JSONResponse:
+        return JSONResponse({"detail": f"Arquivo excede o limite de {max_bytes // (1024 * 1024)} MB"}, status_code=413)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = self.path_limits.get(scope["path"], self.max_bytes)
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > max_bytes:
+                await self._too_large(max_bytes)(scope, receive, send)
+                return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    exceeded = True
+                    raise RequestBodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            if exceeded:
+                # Resposta do app ao erro de leitura (ex.: 400 do parser do formulário): vale o 413
+                return
+            response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            # RequestBodyTooLarge, ou o erro em que o app a embrulhou
+            if not exceeded:
+                raise
+        if exceeded and not response_started:
+            await self._too_large(max_bytes)(scope, receive, send)
+
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=settings.upload_max_bytes + UPLOAD_FORM_OVERHEAD,
+    path_limits={"/batch": settings.batch_max_bytes + UPLOAD_FORM_OVERHEAD},
+)
+
+class ProfilingMiddleware:
+    """
+    Perfila a requisição marcada com `X-Profile` (exige X-Admin-Token) ou sorteada pela amostragem
+
+    A resposta traz `X-Profile-Id`, o prefixo das capturas em /admin/profiling.
+    """
+
+    SKIPPED_PREFIXES = ("/admin/", "/metrics", "/static/")
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.SKIPPED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        if headers.get("x-profile") and is_admin_token(headers.get("x-admin-token")):
+            trigger = "header"
+        elif should_sample():
+            trigger = "sample"
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        with profile_request(trigger) as profile:
+            async def send_with_id(message):
+                if message["type"] == "http.response.start":
+                    MutableHeaders(scope=message).append("X-Profile-Id", profile.capture_id)
+                await send(message)
+
+            await self.app(scope, receive, send_with_id)
+
+# Respostas JSON grandes (ex.: áudio em base64) comprimidas conforme Accept-Encoding
+app.add_middleware(CompressionMiddleware, minimum_size=settings.response_compression_min_bytes)
+
+# Mais externo: a captura cobre a requisição inteira
+app.add_middleware(ProfilingMiddleware)
+
+# Servir arquivos estáticos (variantes .br/.gz pré-comprimidas, ETag e 304)
+static_dir = STATIC_DIR
 if os.path.exists(static_dir):
-    app.mount("/static", StaticFiles(directory=static_dir), name="static")
+    app.mount("/static", PrecompressedStaticFiles(directory=static_dir), name="static")
 
 @app.get("/")
-async def root():
+async def root(request: Request):
     """Redireciona para a página do chatbot"""
     chatbot_path = os.path.join(static_dir, "chatbot.html")
     if os.path.exists(chatbot_path):
-        return FileResponse(chatbot_path)
+        return asset_response(chatbot_path, request.headers, request.scope.get("query_string", b""))
     return {"message": "IADvogado API", "chatbot": "/static/chatbot.html"}
 
 @app.post('/upload')
 async def upload_document(
+    request: Request,
     background: BackgroundTasks,
     user_id: str | None = Form(None),
     phone_number: str | None = Form(None),
     file: UploadFile = File(...),
     as_audio: bool = Form(False),
+    audio_format: str | None = Form(None),
+    deadline_seconds: float | None = Form(None),
 ):
-    contents = await file.read()
+    audio_format = requested_audio_format(audio_format)
+    # Recusa rápida (429) antes de qualquer trabalho caro
+    admission = await admit_request(request, [user_id and f"user:{user_id}", phone_number and f"phone:{phone_number}"], request_cost(as_audio))
     try:
-        raw_text = image_bytes_to_text(contents)
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"OCR failed: {e}")
-
-    simplified = await simplify_text(raw_text)
-    disclaimer = make_disclaimer()
-    payload_text = (
-        f"O que aconteceu:\n{simplified['what_happened']}\n\n"
-        f"O que significa:\n{simplified['what_it_means']}\n\n"
-        f"O que fazer agora:\n{simplified['what_to_do_now']}\n\n"
-        f"{disclaimer}"
+        with time_stage("upload_read"):
+            upload = await spooled_upload(file)
+
+        # O pipeline é abandonado se o cliente desconectar ou o prazo vencer
+        token = CancellationToken(request_deadline(deadline_seconds))
+        try:
+            result = await run_cancellable(
+                process_document(upload, phone_number=phone_number, as_audio=as_audio, cancel_token=token, audio_format=audio_format),
+                token,
+                request=request,
+            )
+        except OCRFailed as e:
+            raise HTTPException(status_code=400, detail=f"OCR failed: {e}")
+        except RequestCancelled as e:
+            return cancelled_response(e)
+
+        # Save record asynchronously
+        retention_until = expiration_date()
+        background.add_task(save_processing_record, user_id, result.raw_text, result.simplified, retention_until)
+        background.add_task(index_result, result, retention_until, document_owner(user_id, phone_number))
+
+        return JSONResponse(pipeline_response(result))
+    finally:
+        admission.release()
+
+@app.get('/upload/config')
+async def upload_config():
+    """
+    Como o cliente deve preparar a foto antes do /upload
+
+    O OCR usa no máximo `max_image_side` pixels no lado maior; enviar mais que
+    isso só gasta rede e decodificação no servidor.
+    """
+    return JSONResponse(
+        {
+            "max_image_side": settings.ocr_max_image_side,
+            "grayscale": settings.upload_image_grayscale,
+            "quality": settings.upload_image_quality,
+            "formats": await asyncio.to_thread(upload_image_formats),
+            "max_upload_bytes": settings.upload_max_bytes,
+            "worker_url": asset_url("image_worker.js"),
+        },
+        headers={"Cache-Control": "max-age=300"},
     )
 
-    # Save record asynchronously
-    background.add_task(save_processing_record, user_id, raw_text, simplified, expiration_date())
+def cancelled_response(e: RequestCancelled) -> Response:
+    """504 quando o prazo vence; 499 (convenção do nginx, só para logs/métricas) se o cliente já foi embora"""
+    if e.reason == DEADLINE_EXCEEDED:
+        raise HTTPException(status_code=504, detail="Tempo limite da requisição excedido")
+    return Response(status_code=499)
 
-    # If phone provided, send via WhatsApp (best-effort)
-    if phone_number:
-        try:
-            await send_whatsapp_text(phone_number, payload_text)
-        except Exception as e:
-            # log and continue
-            print('Failed to send WhatsApp message:', e)
-
-        if as_audio:
-            try:
-                audio_bytes = await text_to_speech_bytes(payload_text)
-                logger.info(f"Áudio gerado com sucesso: {len(audio_bytes)} bytes")
-                # TODO: Implementar envio de áudio via WhatsApp
-                # background.add_task(send_whatsapp_audio, phone_number, audio_bytes)
-            except Exception as e:
-                logger.error(f'Erro ao gerar áudio: {e}')
-                print('TTS failed:', e)
-
-    # Gerar áudio se solicitado (mesmo sem WhatsApp)
-    audio_base64 = None
-    if as_audio:
-        try:
-            audio_bytes = await text_to_speech_bytes(payload_text)
-            audio_base64 = base64.b64encode(audio_bytes).decode('utf-8')
-            logger.info(f"Áudio gerado com sucesso: {len(audio_bytes)} bytes")
-        except Exception as e:
-            logger.error(f'Erro ao gerar áudio: {e}')
+def pipeline_response(result: PipelineResult) -> dict:
+    """Corpo JSON com o texto final, a origem da simplificação e o áudio (se gerado)"""
+    response = {
+        "success": True, "text": result.payload_text, "generated_by": result.generated_by,
+        "service_tier": result.service_tier,
+    }
+    if result.template:
+        response["document_type"] = result.template.document_type
+    if result.process_numbers:
+        response["process_numbers"] = [format_cnj(number) for number in result.process_numbers]
+    response.update(audio_fields(result.delivery.audio_bytes, result.delivery.audio_format))
+    return response
+
+def requested_audio_format(name: str | None) -> str | None:
+    """Valida o formato de áudio pedido pelo cliente (400 se desconhecido)"""
+    if not name:
+        return None
+    try:
+        return resolve_audio_format(name).name
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def audio_fields(audio_bytes: bytes | None, audio_format: AudioFormat | None) -> dict:
+    """Áudio em base64 com o formato realmente entregue (pode ser mp3 se faltar o ffmpeg)"""
+    if not audio_bytes:
+        return {}
+    audio_format = audio_format or MP3
+    return {
+        "audio_base64": base64.b64encode(audio_bytes).decode('utf-8'),
+        "audio_format": audio_format.name,
+        "audio_media_type": audio_format.media_type,
+    }
+
+def document_owner(user_id: str | None, phone_number: str | None) -> str | None:
+    """Dono dos documentos enviados no índice de processos: usuário ou, sem ele, telefone"""
+    return user_id or (phone_number and f"phone:{phone_number}") or None
+
+def index_result(result: PipelineResult, retention_until, owner: str | None, extra_numbers=(), source: str = "upload"):
+    """Indexa o documento pelo número CNJ principal (roda em background, fora do event loop)"""
+    if result.service_tier != "full":
+        # Respostas degradadas (menos tokens, modelo menor, extrativo) não viram a resposta do processo
+        return
+    index_document(
+        [*extra_numbers, *result.process_numbers], result.raw_text, result.simplified, result.payload_text,
+        retention_until, user_id=owner, generated_by=result.generated_by,
+        document_type=result.template.document_type if result.template else None, source=source,
+    )
+
+async def admit_request(request: Request, keys, cost: float, hold_slot: bool = True):
+    """
+    Aplica o controle de admissão (chave do IP sempre incluída) ou responde 429
+
+    Roda no endpoint, depois que o FastAPI leu o corpo multipart (os campos do
+    formulário definem as chaves e o custo); o custo dessa leitura é limitado
+    pelo UploadSizeLimitMiddleware.
+    """
+    ip = client_ip(request.client.host if request.client else None, request.headers)
+    try:
+        return await get_admission_controller().admit([ip and f"ip:{ip}", *keys], cost, hold_slot=hold_slot)
+    except AdmissionRejected as e:
+        detail = "Muitas requisições; tente novamente em instantes" if e.reason == RATE_LIMITED else "Servidor ocupado; tente novamente em instantes"
+        raise HTTPException(status_code=429, detail=detail, headers={"Retry-After": retry_after_header(e.retry_after)})
 
-    response = {"success": True, "text": payload_text}
-    if audio_base64:
-        response["audio_base64"] = audio_base64
-        response["audio_format"] = "mp3"
+async def spooled_upload(file: UploadFile):
+    """
+    Retorna o arquivo temporário do upload (já em disco acima de 1 MB), sem copiá-lo para a memória
     
-    return JSONResponse(response)
+    O tamanho é validado contra `settings.upload_max_bytes` (413 se exceder).
+    """
+    size = file.size
+    if size is None:
+        size = await asyncio.to_thread(file.file.seek, 0, os.SEEK_END)
+    if size > settings.upload_max_bytes:
+        raise HTTPException(status_code=413, detail=f"Arquivo excede o limite de {settings.upload_max_bytes // (1024 * 1024)} MB")
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Arquivo vazio")
+    await file.seek(0)
+    return file.file
+
+def request_deadline(requested: float | None) -> float | None:
+    """Prazo efetivo: o pedido pelo cliente, limitado ao configurado no servidor"""
+    configured = settings.request_deadline_seconds or None
+    if requested and requested > 0:
+        return min(requested, configured) if configured else requested
+    return configured
 
 @app.post('/process-number')
-async def process_by_number(process_number: str = Form(...), user_id: str | None = Form(None), phone_number: str | None = Form(None), as_audio: bool = Form(False)):
+async def process_by_number(
+    request: Request,
+    background: BackgroundTasks,
+    process_number: str = Form(...),
+    user_id: str | None = Form(None),
+    phone_number: str | None = Form(None),
+    as_audio: bool = Form(False),
+    audio_format: str | None = Form(None),
+    deadline_seconds: float | None = Form(None),
+):
+    """
+    Responde pelo número do processo (CNJ) a partir do índice local, sem reprocessar
+
+    Documentos enviados pelo /upload e /batch são indexados pelo número CNJ
+    principal e só respondem a quem os enviou (mesmo `user_id` ou telefone).
+    Processos ainda não indexados são buscados no fetcher configurado
+    (COURT_FETCHER); sem fonte externa, a resposta é 404.
+    """
+    number = normalize_cnj(process_number)
+    if number is None:
+        raise HTTPException(status_code=400, detail="Número de processo inválido (formato CNJ: NNNNNNN-DD.AAAA.J.TR.OOOO)")
+    audio_format = requested_audio_format(audio_format)
+
+    admission = await admit_request(request, [user_id and f"user:{user_id}", phone_number and f"phone:{phone_number}"], request_cost(as_audio))
+    try:
+        with time_stage("index_lookup"):
+            indexed = await asyncio.to_thread(get_process_index().lookup, number, document_owner(user_id, phone_number))
+
+        token = CancellationToken(request_deadline(deadline_seconds))
+        try:
+            if indexed:
+                delivery = await run_cancellable(
+                    deliver_stage(indexed.payload_text, phone_number=phone_number, as_audio=as_audio, audio_format=audio_format),
+                    token,
+                    request=request,
+                )
+                response = {
+                    "success": True,
+                    "process_number": format_cnj(number),
+                    "source": "index",
+                    "indexed_at": indexed.created_at,
+                    "text": indexed.payload_text,
+                    "generated_by": indexed.generated_by,
+                    "service_tier": "full",
+                }
+                if indexed.document_type:
+                    response["document_type"] = indexed.document_type
+                response.update(audio_fields(delivery.audio_bytes, delivery.audio_format))
+                return JSONResponse(response)
+
+            fetched = await get_court_fetcher().fetch(number)
+            if fetched is None:
+                raise HTTPException(status_code=404, detail="Processo não encontrado. Envie o documento pelo /upload.")
+            result = await run_cancellable(
+                process_text(fetched.text, phone_number=phone_number, as_audio=as_audio, cancel_token=token, audio_format=audio_format),
+                token,
+                request=request,
+            )
+        except RequestCancelled as e:
+            return cancelled_response(e)
+
+        retention_until = expiration_date()
+        background.add_task(save_processing_record, user_id, result.raw_text, result.simplified, retention_until)
+        background.add_task(index_result, result, retention_until, document_owner(user_id, phone_number), (number,), fetched.source)
+
+        response = pipeline_response(result)
+        response.update({"process_number": format_cnj(number), "source": fetched.source})
+        return JSONResponse(response)
+    finally:
+        admission.release()
+
+class ReleasingStreamingResponse(StreamingResponse):
+    """StreamingResponse que executa `release` ao terminar, inclusive se o cliente desconectar"""
+
+    def __init__(self, content, release, **kwargs):
+        super().__init__(content, **kwargs)
+        self._release = release
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self._release()
+
+BATCH_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+_active_batches = 0
+
+@app.post('/batch')
+async def batch_process(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    batch_id: str | None = Form(None),
+    user_id: str | None = Form(None),
+    as_audio: bool = Form(False),
+    audio_format: str | None = Form(None),
+    client_key: str = Depends(require_batch_token),
+):
     """
-    Placeholder: here you would fetch process documents from official court APIs (CNJ, e-SAJ, etc.) if available.
-    For MVP we expect the backend to either store a previously-uploaded document or integrate specific court scraping/APIs (requires legal/terms checks).
+    Processa vários documentos (imagens e/ou ZIPs) e devolve NDJSON em ordem de conclusão
+
+    Linhas: {"type": "batch"} no início, uma {"type": "document"} por documento
+    concluído e {"type": "summary"} no fim. Para retomar um lote interrompido,
+    reenvie os mesmos arquivos com o `batch_id` recebido: documentos já
+    concluídos voltam com "resumed": true, sem OCR nem LLM.
     """
-    # For now return 501 to indicate provider integration needed
-    raise HTTPException(status_code=501, detail="Fetch-by-process-number not implemented in MVP. Upload document instead.")
+    global _active_batches
+    if batch_id is not None and not BATCH_ID_PATTERN.fullmatch(batch_id):
+        raise HTTPException(status_code=400, detail="batch_id inválido (até 64 caracteres: letras, dígitos, _ e -)")
+    if len(files) > settings.batch_max_documents:
+        raise HTTPException(status_code=413, detail=f"Lote excede o limite de {settings.batch_max_documents} documentos")
+    audio_format = requested_audio_format(audio_format)
+
+    await admit_request(request, [f"batch:{client_key}"], settings.admission_cost_text, hold_slot=False)
+    if _active_batches >= settings.batch_max_concurrent:
+        raise HTTPException(status_code=429, detail="Outro lote está em processamento; tente novamente mais tarde", headers={"Retry-After": "30"})
+
+    batch_id = batch_id or uuid.uuid4().hex
+    store = get_batch_store()
+    completed = await asyncio.to_thread(store.completed, batch_id)
+    retention_until = expiration_date()
+    pipeline = BatchPipeline(as_audio=as_audio, audio_format=audio_format, completed=completed)
+    inputs = expand_inputs(
+        ((upload.filename or f"documento_{i}", upload.file) for i, upload in enumerate(files)),
+        settings.batch_max_documents,
+        settings.upload_max_bytes,
+        settings.batch_max_expanded_bytes,
+    )
+
+    async def persist(document: BatchDocument):
+        """Grava o documento concluído para retomada, no storage e (nível full) no índice de processos"""
+        try:
+            if document.error is not None:
+                # Falhas não são gravadas: ao retomar o lote, o documento é processado de novo
+                return
+            await asyncio.to_thread(store.save, batch_id, document.key, document.result(), retention_until)
+            await save_processing_record(user_id, document.raw_text, document.simplified, retention_until)
+            if document.service_tier == "full":
+                await asyncio.to_thread(
+                    index_document, document.process_numbers, document.raw_text, document.simplified,
+                    document.payload_text, retention_until, user_id=user_id, generated_by=document.generated_by,
+                    document_type=document.template.document_type if document.template else None, source="batch",
+                )
+        except Exception as e:
+            logger.error(f"Erro ao gravar resultado do lote {batch_id}: {e}")
+
+    async def stream():
+        start = time.perf_counter()
+        counts = {"completed": 0, "failed": 0, "resumed": 0}
+        yield json.dumps({"type": "batch", "batch_id": batch_id, "previously_completed": len(completed)}) + "\n"
+        async for document in pipeline.run(inputs):
+            if document.resumed:
+                counts["resumed"] += 1
+            else:
+                await persist(document)
+            counts["failed" if document.error else "completed"] += 1
+
+            line = {"type": "document", "index": document.index, "name": document.name,
+                    **document.result(), "resumed": document.resumed}
+            line.update(audio_fields(document.audio_bytes, document.audio_format))
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+
+        summary = {"type": "summary", "batch_id": batch_id, **counts, "elapsed_s": round(time.perf_counter() - start, 3)}
+        if pipeline.input_error:
+            summary["error"] = pipeline.input_error
+        yield json.dumps(summary, ensure_ascii=False) + "\n"
+
+    def release():
+        global _active_batches
+        _active_batches -= 1
+
+    _active_batches += 1
+    return ReleasingStreamingResponse(
+        stream(), release, media_type="application/x-ndjson", headers={"X-Batch-Id": batch_id}
+    )
+
+@app.get('/metrics')
+async def metrics():
+    """Métricas no formato de exposição do Prometheus"""
+    data, content_type = render_metrics()
+    return Response(content=data, media_type=content_type)
 
 @app.get('/health')
 async def health():
-    return {"status": "ok"}
+    return {"status": "ok", "service_tier": get_degradation_controller().current().name}
 
 @app.get('/health/tts')
-async def health_tts():
-    """Health check específico para o sistema TTS"""
+async def health_tts(request: Request):
+    """Health check específico para o sistema TTS (sintetiza áudio: passa pelo controle de admissão)"""
+    admission = await admit_request(request, [], request_cost(True), hold_slot=False)
+    admission.release()
     try:
         # Testar geração de áudio
+        tts_worker = get_tts_worker()
         test_audio = await text_to_speech_bytes("Teste de saúde do TTS")
-        metrics = edge_tts_worker.get_metrics()
-        cache_info = edge_tts_worker.get_cache_info()
+        metrics = tts_worker.get_metrics()
+        cache_info = tts_worker.get_cache_info()
         
         return {
             "status": "ok",
-            "tts_provider": "edge",
+            "tts_provider": settings.tts_provider,
             "audio_size": len(test_audio),
-            "voice": edge_tts_worker.voice,
+            "voice": tts_worker.voice,
             "metrics": metrics,
             "cache": cache_info
         }
@@ -129,19 +560,67 @@ async def health_tts():
 @app.get('/tts/metrics')
 async def get_tts_metrics():
     """Retorna métricas de performance do TTS"""
-    return edge_tts_worker.get_metrics()
+    return get_tts_worker().get_metrics()
 
 @app.get('/tts/cache/info')
 async def get_cache_info():
     """Retorna informações sobre o cache de áudio"""
-    return edge_tts_worker.get_cache_info()
+    return get_tts_worker().get_cache_info()
 
-@app.post('/tts/cache/clear')
+@app.post('/tts/cache/clear', dependencies=[Depends(require_admin)])
 async def clear_cache():
     """Limpa o cache de áudio"""
-    removed_count = edge_tts_worker.clear_cache()
+    removed_count = get_tts_worker().clear_cache()
     return {
         "success": True,
         "removed_files": removed_count,
         "message": f"Cache limpo: {removed_count} arquivos removidos"
     }
+
+# Limite de chamadas ao generate capturadas de uma vez (cada trace tem dezenas de MB)
+TORCH_PROFILE_MAX_CALLS = 20
+
+@app.get('/admin/degradation', dependencies=[Depends(require_admin)])
+async def degradation_info():
+    """Nível de serviço atual, fila do LLM por vaga e p90 recente (deste worker)"""
+    return get_degradation_controller().status()
+
+@app.get('/admin/profiling', dependencies=[Depends(require_admin)])
+async def profiling_info():
+    """Estado dos modos de profiling e capturas disponíveis (deste worker)"""
+    return await asyncio.to_thread(profiling_status)
+
+@app.post('/admin/profiling/requests', dependencies=[Depends(require_admin)])
+async def profiling_requests(sample_rate: float = Form(...)):
+    """Fração das requisições perfiladas (0 desliga; o header X-Profile continua valendo)"""
+    if not 0 <= sample_rate <= 1:
+        raise HTTPException(status_code=400, detail="sample_rate deve estar entre 0 e 1")
+    set_sample_rate(sample_rate)
+    return {"success": True, "request_sample_rate": sample_rate}
+
+@app.post('/admin/profiling/torch', dependencies=[Depends(require_admin)])
+async def profiling_torch(calls: int = Form(...)):
+    """Captura as próximas `calls` chamadas ao generate com torch.profiler (0 cancela)"""
+    if not 0 <= calls <= TORCH_PROFILE_MAX_CALLS:
+        raise HTTPException(status_code=400, detail=f"calls deve estar entre 0 e {TORCH_PROFILE_MAX_CALLS}")
+    arm_torch_profiler(calls)
+    return {"success": True, "torch_calls_remaining": calls}
+
+@app.post('/admin/profiling/loop', dependencies=[Depends(require_admin)])
+async def profiling_loop(enabled: bool = Form(...), threshold_ms: float | None = Form(None)):
+    """Liga/desliga o monitor de atraso e bloqueios do event loop"""
+    if threshold_ms is not None and threshold_ms <= 0:
+        raise HTTPException(status_code=400, detail="threshold_ms deve ser positivo")
+    if enabled:
+        start_loop_monitor(threshold_ms)
+    else:
+        await stop_loop_monitor()
+    return {"success": True, **loop_monitor_status()}
+
+@app.get('/admin/profiling/captures/{name}', dependencies=[Depends(require_admin)])
+async def profiling_capture(name: str):
+    """Download de uma captura (.prof para pstats/snakeviz, .html do pyinstrument, .json do Chrome)"""
+    path = get_capture_store().resolve(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Captura não encontrada")
+    return FileResponse(path, filename=name)
@@ -0,0 +1,38 @@
+"""
+Proteção dos endpoints administrativos e do processamento em lote
+"""
+
+import hashlib
+import secrets
+
+from fastapi import Header, HTTPException
+
+from ..config.config import settings
+
+
+def is_admin_token(value: str | None) -> bool:
+    """Confere o token administrativo (falso se ADMIN_TOKEN não estiver configurado)"""
+    return bool(settings.admin_token and value and secrets.compare_digest(value, settings.admin_token))
+
+
+def require_admin(x_admin_token: str | None = Header(None)):
+    """Exige o header X-Admin-Token igual a `settings.admin_token`"""
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="Endpoints administrativos desabilitados (ADMIN_TOKEN não configurado)")
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=401, detail="Token administrativo inválido")
+
+
+def require_batch_token(x_batch_token: str | None = Header(None)) -> str:
+    """
+    Exige um dos tokens institucionais de `settings.batch_tokens` (header X-Batch-Token)
+
+    Retorna um identificador estável e não reversível do token, usado como
+    chave do controle de admissão.
+    """
+    tokens = [token.strip() for token in (settings.batch_tokens or "").split(",") if token.strip()]
+    if not tokens:
+        raise HTTPException(status_code=403, detail="Processamento em lote desabilitado (BATCH_TOKENS não configurado)")
+    if not x_batch_token or not any(secrets.compare_digest(x_batch_token, token) for token in tokens):
+        raise HTTPException(status_code=401, detail="Token de lote inválido")
+    return hashlib.sha256(x_batch_token.encode()).hexdigest()[:16]
@@ -0,0 +1,203 @@
+"""
+Arquivos estáticos pré-comprimidos, com ETag forte e GET condicional
+
+Build (uma vez por deploy, também chamado pelos scripts de execução):
+    python -m iadvogado.api.static_assets
+
+gera `arquivo.br` (se o pacote brotli estiver instalado) e `arquivo.gz` ao lado
+de cada arquivo de texto em static/. Em tempo de execução a variante é escolhida
+pelo Accept-Encoding, sem comprimir nada por requisição.
+
+Cache:
+- URLs com `?v=<hash>` (ver `asset_url`) recebem `max-age` de um ano e `immutable`;
+- as demais (inclusive a página em `/`) usam `no-cache`: o navegador revalida
+  com If-None-Match e recebe 304 sem corpo quando nada mudou.
+"""
+
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "static")
+
+COMPRESSIBLE_EXTENSIONS = (".html", ".css", ".js", ".mjs", ".json", ".svg", ".txt", ".xml", ".webmanifest")
+# Preferência do servidor quando o cliente aceita ambas
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+
+@dataclass
+class StaticAsset:
+    """Arquivo estático com hash do conteúdo e variantes pré-comprimidas"""
+    path: str
+    digest: str
+    media_type: str
+    variants: Dict[str, str] = field(default_factory=dict)
+
+    def etag(self, encoding: Optional[str] = None) -> str:
+        # ETag forte é por representação: cada codificação tem a sua
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+
+_assets: Dict[str, Tuple[Tuple[int, int], StaticAsset]] = {}
+
+
+def _file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()[:20]
+
+
+def get_asset(path: str) -> StaticAsset:
+    """Metadados do arquivo (recalculados apenas se mtime/tamanho mudarem)"""
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _assets.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    if media_type.startswith("text/") or media_type in ("application/javascript", "application/json"):
+        media_type += "; charset=utf-8"
+    asset = StaticAsset(path=path, digest=_file_digest(path), media_type=media_type)
+    for encoding, suffix in ENCODINGS:
+        variant = path + suffix
+        # Variantes mais antigas que o original estão desatualizadas e são ignoradas
+        if os.path.exists(variant) and os.stat(variant).st_mtime_ns >= stat.st_mtime_ns:
+            asset.variants[encoding] = variant
+    _assets[path] = (key, asset)
+    return asset
+
+
+def negotiate_encoding(accept_encoding: str, available) -> Optional[str]:
+    """Escolhe a codificação aceita pelo cliente (respeitando q=0)"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.lower()] = q
+    for encoding, _ in ENCODINGS:
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Comparação fraca (RFC 9110 §13.1.2): ignora o prefixo W/
+    candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+    return etag in candidates
+
+
+def asset_response(path: str, headers: Headers, query_string: bytes = b"") -> Response:
+    """Resposta para um arquivo estático: variante comprimida, ETag e 304"""
+    asset = get_asset(path)
+    encoding = negotiate_encoding(headers.get("accept-encoding", ""), asset.variants)
+    etag = asset.etag(encoding)
+
+    version = parse_qs(query_string.decode("latin-1")).get("v", [None])[0]
+    response_headers = {
+        "etag": etag,
+        "cache-control": IMMUTABLE_CACHE if version == asset.digest else REVALIDATE_CACHE,
+        "vary": "Accept-Encoding",
+    }
+
+    if_none_match = headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=response_headers)
+
+    if encoding:
+        response_headers["content-encoding"] = encoding
+        return FileResponse(asset.variants[encoding], headers=response_headers, media_type=asset.media_type)
+    return FileResponse(asset.path, headers=response_headers, media_type=asset.media_type)
+
+
+def asset_url(name: str, static_dir: str = STATIC_DIR, prefix: str = "/static") -> str:
+    """URL versionada (cacheável como immutable) para um arquivo de static/"""
+    asset = get_asset(os.path.join(static_dir, name))
+    return f"{prefix}/{name}?v={asset.digest}"
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles que serve as variantes .br/.gz com ETag forte e GET condicional"""
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        if status_code != 200:
+            return super().file_response(full_path, stat_result, scope, status_code)
+        return asset_response(str(full_path), Headers(scope=scope), scope.get("query_string", b""))
+
+
+def _brotli():
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        return None
+
+
+def precompress(static_dir: str = STATIC_DIR, force: bool = False) -> int:
+    """Gera as variantes .br/.gz desatualizadas; retorna quantos arquivos foram escritos"""
+    if not os.path.isdir(static_dir):
+        return 0
+
+    brotli = _brotli()
+    if brotli is None:
+        logger.info("Pacote brotli não instalado: gerando apenas .gz")
+
+    written = 0
+    for root, _, files in os.walk(static_dir):
+        for name in files:
+            if not name.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            mtime = os.stat(path).st_mtime_ns
+            with open(path, "rb") as f:
+                data = f.read()
+
+            outputs = {".gz": lambda d: gzip.compress(d, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                outputs[".br"] = lambda d: brotli.compress(d, quality=11)
+
+            for suffix, compress in outputs.items():
+                target = path + suffix
+                if not force and os.path.exists(target) and os.stat(target).st_mtime_ns >= mtime:
+                    continue
+                compressed = compress(data)
+                if len(compressed) >= len(data):
+                    continue
+                tmp = target + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(compressed)
+                os.replace(tmp, target)
+                written += 1
+                logger.info(f"{os.path.relpath(target, static_dir)}: {len(data)} → {len(compressed)} bytes")
+    return written
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    count = precompress(force="--force" in sys.argv)
+    print(f"{count} arquivo(s) pré-comprimido(s) em {STATIC_DIR}")
@@ -1,3 +1,4 @@
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 import os
 
@@ -6,14 +7,90 @@ class Settings(BaseSettings):
     fastapi_port: int = 8000
     supabase_url: str | None = None
     supabase_key: str | None = None
-    # openai_api_key: str | None = None  # Comentado - usando Llama local
+    # Provedor de LLM: llama (local) ou openai
+    llm_provider: str = "llama"
+    openai_api_key: str | None = None
+    openai_model: str = "gpt-4o"
     whatsapp_api_url: str | None = None
     whatsapp_api_token: str | None = None
+    # Upload de mídia (áudio); padrão: WHATSAPP_API_URL com /messages trocado por /media
+    whatsapp_media_url: str | None = None
     # Token do Hugging Face para acessar modelos gated (Llama 3.1)
     hugging_face_hub_token: str | None = None
     data_retention_days: int = 30
+    # Diretório compartilhado para agregar métricas de vários workers (Prometheus)
+    metrics_multiproc_dir: str | None = None
     ocr_engine: str = "pytesseract"
+    # Lado máximo (px) da imagem entregue ao OCR; fotos maiores são decodificadas já reduzidas
+    ocr_max_image_side: int = 2400
+    # Preparo da foto no navegador antes do upload (GET /upload/config)
+    upload_image_grayscale: bool = True
+    upload_image_quality: float = 0.8  # Qualidade WebP/JPEG (0 a 1)
+    text_normalization: bool = True  # Remove boilerplate/repetições do OCR antes do LLM
+    template_fast_path: bool = True  # Documentos rotineiros respondidos por modelo, sem LLM
+    template_min_confidence: float = 0.7  # Confiança mínima do classificador (0 a 1)
+    process_index_path: str = "process_index.db"  # Índice local de documentos por número CNJ
+    court_fetcher: str = "none"  # Fonte para processos não indexados: none, local
+    court_fetcher_dir: str = "court_documents"  # Diretório do fetcher "local" (<20 dígitos>.txt)
+    near_duplicate_cache: bool = True  # Reaproveita simplificações de documentos quase idênticos
+    near_duplicate_path: str = "near_duplicates.db"
+    near_duplicate_max_distance: int = 4  # Bits diferentes no SimHash de 64 bits (maior = tolera mais ruído de OCR, consulta mais lenta)
+    # Processamento em lote (/batch)
+    batch_tokens: str | None = None  # Tokens institucionais (header X-Batch-Token), separados por vírgula
+    batch_max_documents: int = 500
+    batch_max_bytes: int = 200 * 1024 * 1024  # Corpo máximo do POST /batch
+    batch_max_expanded_bytes: int = 1024 * 1024 * 1024  # Total lido dos documentos do lote, ZIPs descomprimidos
+    batch_max_concurrent: int = 1  # Lotes em execução simultânea por processo
+    batch_ocr_workers: int = 0  # 0 = número de CPUs
+    batch_llm_size: int = 4  # Documentos por chamada ao generate
+    batch_tts_workers: int = 2
+    batch_queue_size: int = 8  # Capacidade das filas entre os estágios
+    batch_store_path: str = "batch_results.db"  # Resultados para retomar lotes interrompidos
+    # Tamanho máximo do arquivo enviado em /upload (bytes)
+    upload_max_bytes: int = 15 * 1024 * 1024
+    # Respostas JSON a partir deste tamanho (bytes) são comprimidas (br/gzip)
+    response_compression_min_bytes: int = 1024
     
+    # Prazo máximo por requisição em segundos (0 = sem prazo)
+    request_deadline_seconds: float = 180.0
+    # Gerações simultâneas do LLM local; as demais aguardam (e podem ser canceladas) na fila
+    llm_concurrency: int = 1
+
+    # Controle de admissão (token bucket por IP/usuário/telefone)
+    admission_backend: str = "memory"  # memory, sqlite (compartilhado entre workers da máquina)
+    admission_sqlite_path: str = "admission.db"
+    admission_burst: float = 6.0  # Fichas máximas por chave
+    admission_rate_per_minute: float = 6.0  # Reposição de fichas por chave (maior que zero)
+    admission_cost_text: float = 1.0
+    admission_cost_audio: float = 2.0
+    admission_queue_per_slot: int = 4  # Requisições em andamento por vaga de inferência
+    # Atrás de proxy reverso: header com o IP do cliente (ex.: X-Forwarded-For), lido só
+    # em conexões vindas dos proxies confiáveis (IPs ou redes, separados por vírgula)
+    admission_client_ip_header: str | None = None
+    admission_trusted_proxies: str = "127.0.0.1,::1"
+    # Degradação sob sobrecarga (core.degradation): full -> reduced -> small -> extractive
+    degradation_enabled: bool = False
+    degradation_queue_high: float = 3.0  # Chamadas ao LLM (fila + execução) por vaga para descer de nível
+    degradation_queue_low: float = 1.0  # ... e para subir de volta
+    degradation_latency_high_seconds: float = 60.0  # p90 recente do LLM (fila + geração)
+    degradation_latency_low_seconds: float = 20.0
+    degradation_window_seconds: float = 30.0  # Janela da latência recente
+    degradation_step_down_seconds: float = 5.0  # Intervalo mínimo entre descidas
+    degradation_step_up_seconds: float = 30.0  # Tempo com carga baixa antes de subir um nível
+    degradation_reduced_max_tokens: int = 256  # Orçamento de tokens dos níveis reduced e small
+    degradation_template_min_confidence: float = 0.4  # Modelos de documento aceitos no nível extractive
+    llm_small_model: str | None = None  # Modelo menor do nível small (ex.: meta-llama/Llama-3.2-3B-Instruct, gpt-4o-mini)
+    # Token para endpoints administrativos (header X-Admin-Token); sem token, ficam desabilitados
+    admin_token: str | None = None
+    # Profiling sob demanda (/admin/profiling): capturas num diretório limitado
+    profiling_dir: str = "profiles"
+    profiling_max_files: int = 50
+    profiling_max_bytes: int = 200 * 1024 * 1024
+    profiling_sample_rate: float = 0.0  # Fração das requisições perfiladas (0 = só pelo header X-Profile)
+    loop_monitor: bool = False  # Mede o atraso do event loop e loga chamadas que o bloqueiam
+    loop_monitor_interval_ms: float = 100.0
+    loop_block_threshold_ms: float = 200.0
+
     # Configurações do Llama 3.1
     llama_model_name: str = "meta-llama/Llama-3.1-8B-Instruct"
     llama_device: str = "auto"  # auto, cpu, cuda
@@ -21,6 +98,13 @@ class Settings(BaseSettings):
     llama_temperature: float = 0.2
     llama_use_quantization: bool = True  # Para economizar memória
     llama_quantization_config: str = "4bit"  # 4bit, 8bit, None
+    llama_constrained_decoding: bool = True  # Saída restrita ao JSON de 3 chaves, para ao fechar o objeto
+    llama_model_revision: str | None = None  # Commit (ou tag) fixado; o artefato local precisa ser dessa revisão
+    # Artefatos locais (python -m iadvogado.services.model_artifacts prepare): com o diretório
+    # definido, o modelo é carregado só dele, offline, com os pesos mapeados em memória (mmap)
+    model_artifacts_dir: str | None = None
+    model_artifacts_dtype: str = "bfloat16"  # dtype gravado na preparação: bfloat16, float16, float32
+    model_artifacts_verify_hash: bool = False  # Confere o sha256 de todos os arquivos no startup (lê o modelo inteiro)
     
     # Configurações do Edge TTS
     tts_provider: str = "edge"  # edge, google, amazon
@@ -31,6 +115,21 @@ class Settings(BaseSettings):
     tts_use_ssml: bool = True  # Usar SSML para melhor qualidade
     tts_cache_enabled: bool = True  # Cache de áudios
     tts_cache_ttl: int = 3600  # TTL do cache em segundos
+    tts_audio_format: str = "mp3"  # Formato padrão da resposta HTTP: mp3, opus (OGG)
+    tts_opus_bitrate: str = "24k"  # Opus para fala: 16k a 32k
+    ffmpeg_path: str = "ffmpeg"  # Necessário para opus; sem ele o áudio sai em mp3
+
+    # Configurações dos provedores alternativos de TTS
+    polly_voice: str = "Camila"  # Amazon Polly (tts_provider=amazon)
+    aws_region: str = "us-east-1"
+
+    @field_validator("admission_rate_per_minute")
+    @classmethod
+    def _positive_rate(cls, value: float) -> float:
+        # Sem reposição os baldes nunca se recuperariam; falha na subida, não na primeira requisição
+        if value <= 0:
+            raise ValueError("ADMISSION_RATE_PER_MINUTE deve ser maior que zero")
+        return value
 
     class Config:
         # Buscar .env na raiz do projeto e também em iadvogado/config/
@@ -0,0 +1,296 @@
+"""
+Controle de admissão: token bucket por chave e limite global de concorrência
+
+Cada requisição consome `cost` fichas dos baldes de todas as suas chaves
+(IP, user_id, telefone); áudio custa mais que texto. Se algum balde não tiver
+fichas, ou se o número de requisições em andamento já atingiu o limite global
+(proporcional ao pool de inferência), a requisição é recusada na hora com
+AdmissionRejected, em vez de entrar numa fila sem fim.
+
+Backends dos baldes:
+- "memory": por processo (padrão);
+- "sqlite": arquivo local compartilhado pelos workers da mesma máquina; a
+  transação roda em thread, fora do event loop.
+
+Se o backend falhar (arquivo travado além do timeout, disco), a requisição é
+recusada (fail closed): desligar o limite justo sob carga seria o pior caso.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import math
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Mapping, Optional, Tuple
+
+from ..config.config import settings
+from .metrics import QUEUE_DEPTH, record_admission_rejection
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED = "rate_limited"
+OVERLOADED = "overloaded"
+BACKEND_UNAVAILABLE = "backend_unavailable"
+
+
+class AdmissionRejected(Exception):
+    """Requisição recusada; `retry_after` em segundos"""
+
+    def __init__(self, reason: str, retry_after: float, key: Optional[str] = None):
+        super().__init__(f"Requisição recusada ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+        self.key = key
+
+
+def _refill(tokens: float, updated: float, now: float, capacity: float, rate: float) -> float:
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+class MemoryBucketStore:
+    """Baldes em memória (LRU limitado para não crescer sem fim)"""
+    blocking = False
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, keys: List[str], cost: float, capacity: float, rate: float) -> Tuple[bool, float, Optional[str]]:
+        """Consome `cost` de todos os baldes ou de nenhum; retorna (ok, espera, chave limitante)"""
+        now = time.time()
+        with self._lock:
+            levels = {}
+            for key in keys:
+                tokens, updated = self._buckets.get(key, (capacity, now))
+                levels[key] = _refill(tokens, updated, now, capacity, rate)
+
+            for key, tokens in levels.items():
+                if tokens < cost:
+                    return False, (cost - tokens) / rate, key
+
+            for key, tokens in levels.items():
+                self._buckets[key] = (tokens - cost, now)
+                self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return True, 0.0, None
+
+
+class SQLiteBucketStore:
+    """Baldes num arquivo SQLite local, compartilhado entre processos"""
+    blocking = True  # Chamado via asyncio.to_thread
+
+    def __init__(self, path: str, timeout: float = 2.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        # Threads do mesmo processo esperam aqui, não no lock do arquivo
+        self._lock = threading.Lock()
+        self._calls = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def take(self, keys: List[str], cost: float, capacity: float, rate: float) -> Tuple[bool, float, Optional[str]]:
+        with self._lock:
+            return self._take(keys, cost, capacity, rate)
+
+    def _take(self, keys: List[str], cost: float, capacity: float, rate: float) -> Tuple[bool, float, Optional[str]]:
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            placeholders = ",".join("?" * len(keys))
+            rows = dict(
+                (key, (tokens, updated))
+                for key, tokens, updated in conn.execute(
+                    f"SELECT key, tokens, updated FROM buckets WHERE key IN ({placeholders})", keys
+                )
+            )
+            levels = {
+                key: _refill(*rows.get(key, (capacity, now)), now, capacity, rate)
+                for key in keys
+            }
+            for key, tokens in levels.items():
+                if tokens < cost:
+                    conn.execute("COMMIT")
+                    return False, (cost - tokens) / rate, key
+
+            conn.executemany(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)",
+                [(key, tokens - cost, now) for key, tokens in levels.items()],
+            )
+            self._calls += 1
+            if self._calls % 1000 == 0:
+                # Baldes parados há mais tempo que um enchimento completo estão cheios: podem sair
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - 2 * capacity / rate,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return True, 0.0, None
+
+
+class Admission:
+    """Vaga global ocupada enquanto a requisição está em andamento"""
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class AdmissionController:
+    """Aplica token buckets por chave e o limite global de requisições em andamento"""
+
+    def __init__(self, store=None, capacity: float = None, rate_per_minute: float = None, max_inflight: int = None):
+        self.store = store or _build_store()
+        self.capacity = capacity if capacity is not None else settings.admission_burst
+        self.rate = (rate_per_minute if rate_per_minute is not None else settings.admission_rate_per_minute) / 60.0
+        if self.rate <= 0:
+            raise ValueError("ADMISSION_RATE_PER_MINUTE deve ser maior que zero")
+        self.max_inflight = max_inflight if max_inflight is not None else (
+            max(1, settings.llm_concurrency) * settings.admission_queue_per_slot
+        )
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._gauge = QUEUE_DEPTH.labels(queue="admitted")
+
+    async def admit(self, keys: Iterable[Optional[str]], cost: float = 1.0, hold_slot: bool = True) -> Admission:
+        """Admite a requisição ou levanta AdmissionRejected (sem esperar por vaga)"""
+        keys = [key for key in keys if key]
+
+        if hold_slot:
+            with self._lock:
+                if self._inflight >= self.max_inflight:
+                    record_admission_rejection(OVERLOADED)
+                    raise AdmissionRejected(OVERLOADED, retry_after=1.0)
+                self._inflight += 1
+            self._gauge.inc()
+
+        admission = Admission(self) if hold_slot else _NO_SLOT
+        if not keys:
+            return admission
+
+        try:
+            if self.store.blocking:
+                ok, wait, key = await asyncio.to_thread(self.store.take, keys, cost, self.capacity, self.rate)
+            else:
+                ok, wait, key = self.store.take(keys, cost, self.capacity, self.rate)
+        except Exception as e:
+            admission.release()
+            logger.warning(f"Backend de admissão indisponível ({e}); recusando a requisição")
+            record_admission_rejection(BACKEND_UNAVAILABLE)
+            raise AdmissionRejected(BACKEND_UNAVAILABLE, retry_after=1.0)
+        except BaseException:
+            # Cancelada enquanto esperava o backend
+            admission.release()
+            raise
+
+        if not ok:
+            admission.release()
+            record_admission_rejection(RATE_LIMITED)
+            raise AdmissionRejected(RATE_LIMITED, retry_after=wait, key=key)
+        return admission
+
+    def _release(self):
+        with self._lock:
+            self._inflight -= 1
+        self._gauge.dec()
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+
+class _NoSlot(Admission):
+    def __init__(self):
+        self._released = True
+
+
+_NO_SLOT = _NoSlot()
+
+
+def _build_store():
+    if settings.admission_backend == "sqlite":
+        return SQLiteBucketStore(settings.admission_sqlite_path)
+    if settings.admission_backend != "memory":
+        raise ValueError(f"Backend de admissão desconhecido: '{settings.admission_backend}' (memory, sqlite)")
+    return MemoryBucketStore()
+
+
+def request_cost(as_audio: bool) -> float:
+    """Custo em fichas: áudio inclui a síntese de voz"""
+    return settings.admission_cost_audio if as_audio else settings.admission_cost_text
+
+
+def _trusted(address: str, networks: List[ipaddress.IPv4Network | ipaddress.IPv6Network]) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_ip(peer: Optional[str], headers: Mapping[str, str]) -> Optional[str]:
+    """
+    IP do cliente para a chave de admissão
+
+    Atrás de um proxy reverso todas as conexões vêm do IP do proxy e dividiriam
+    um único balde. Com `admission_client_ip_header` (ex.: X-Forwarded-For), o
+    header só é lido se a conexão vier de `admission_trusted_proxies`; os saltos
+    são percorridos da direita para a esquerda e o primeiro fora dos proxies
+    confiáveis é o cliente (os saltos à esquerda podem ter sido forjados por ele).
+    """
+    header = settings.admission_client_ip_header
+    if not header or not peer:
+        return peer
+    networks = [
+        ipaddress.ip_network(entry.strip(), strict=False)
+        for entry in settings.admission_trusted_proxies.split(",") if entry.strip()
+    ]
+    if not _trusted(peer, networks):
+        return peer
+    hops = [hop.strip() for hop in headers.get(header, "").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _trusted(hop, networks):
+            return hop
+    return hops[0] if hops else peer
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+_controller: Optional[AdmissionController] = None
+
+
+def get_admission_controller() -> AdmissionController:
+    """Controlador do processo (criado no primeiro uso)"""
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
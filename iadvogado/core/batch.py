@@ -0,0 +1,390 @@
+"""
+Processamento em lote (/batch) com estágios em pipeline
+
+    decode -> OCR (pool) -> normalização/modelos/quase-duplicatas -> LLM em lotes -> TTS (opcional)
+
+O nível de serviço (core.degradation) é escolhido a cada chamada ao LLM, como
+no fluxo interativo.
+
+Os estágios são ligados por filas limitadas: enquanto o LLM gera um lote, o
+pool de OCR já prepara os próximos documentos, e o decode para de ler quando
+as filas enchem (memória limitada, sem carregar o lote inteiro). O LLM pega
+tudo o que estiver na fila (até `batch_llm_size`) a cada chamada, então o
+tamanho do lote acompanha a carga. A vazão tende à capacidade do estágio mais
+lento, em vez da soma das latências por documento.
+
+Resultados saem em ordem de conclusão. Documentos cujo hash já consta em
+`completed` (lote retomado) não passam pelo OCR nem pelo LLM.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import zipfile
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..config.config import settings
+from ..services.audio_formats import AudioFormat
+from ..services.document_templates import TemplateMatch
+from ..services.near_duplicates import DocumentFingerprint, NearDuplicateMatch
+from ..services.providers import simplify_batch
+from ..utils.cnj import extract_cnj_numbers, format_cnj
+from .cancellation import CancellationToken, RequestCancelled
+from .degradation import get_degradation_controller
+from .metrics import record_served_tier, record_simplification, track_queue
+from .pipeline import (
+    compose_stage, fallback_stage, near_duplicate_stage, normalize_stage, ocr_stage, remember_stage, synthesize_stage,
+    template_stage, tier_stage,
+)
+
+logger = logging.getLogger(__name__)
+
+ZIP_MAGIC = b"PK\x03\x04"
+# Entradas de ZIP ignoradas (metadados do macOS, arquivos ocultos)
+_SKIPPED_PREFIXES = ("__MACOSX/", ".")
+
+
+class BatchInputError(Exception):
+    """Lote inválido (ZIP corrompido, documentos demais ou grandes demais)"""
+
+
+@dataclass
+class BatchDocument:
+    """Documento do lote e os artefatos produzidos pelos estágios"""
+    index: int
+    name: str
+    key: str  # sha256 do conteúdo: identifica o documento ao retomar o lote
+    data: Optional[bytes] = None
+    raw_text: str = ""
+    normalized_text: str = ""
+    simplified: Optional[Dict[str, str]] = None
+    template: Optional[TemplateMatch] = None
+    near_duplicate: Optional[NearDuplicateMatch] = None
+    fingerprint: Optional[DocumentFingerprint] = None
+    payload_text: str = ""
+    audio_bytes: Optional[bytes] = None
+    audio_format: Optional[AudioFormat] = None
+    process_numbers: List[str] = field(default_factory=list)
+    service_tier: str = "full"
+    error: Optional[str] = None
+    # Resultado gravado numa execução anterior do lote (retomada)
+    stored: Optional[dict] = None
+
+    @property
+    def resumed(self) -> bool:
+        return self.stored is not None
+
+    @property
+    def generated_by(self) -> str:
+        if self.template:
+            return "template"
+        if self.near_duplicate:
+            return "near_duplicate"
+        return "extractive" if self.service_tier == "extractive" else "llm"
+
+    def result(self) -> dict:
+        """Resultado persistido para retomada (sem o áudio)"""
+        if self.stored is not None:
+            return self.stored
+        if self.error:
+            return {"status": "error", "error": self.error}
+        result = {
+            "status": "ok",
+            "text": self.payload_text,
+            "generated_by": self.generated_by,
+            "service_tier": self.service_tier,
+            "process_numbers": [format_cnj(number) for number in self.process_numbers],
+        }
+        if self.template:
+            result["document_type"] = self.template.document_type
+        return result
+
+    @classmethod
+    def from_result(cls, index: int, name: str, key: str, result: dict) -> "BatchDocument":
+        return cls(
+            index=index, name=name, key=key, stored=result,
+            payload_text=result.get("text", ""), error=result.get("error"),
+        )
+
+
+def _is_zip(head: bytes) -> bool:
+    return head.startswith(ZIP_MAGIC)
+
+
+def _skipped(info: zipfile.ZipInfo) -> bool:
+    return info.is_dir() or os.path.basename(info.filename).startswith(_SKIPPED_PREFIXES) \
+        or info.filename.startswith(_SKIPPED_PREFIXES)
+
+
+def _zip_members(fileobj, max_documents: int, max_bytes: int, max_total_bytes: int) -> Iterator[Tuple[str, bytes]]:
+    """
+    Arquivos de um ZIP, um membro por vez (cada next() executa em thread)
+
+    O número de entradas é conferido no diretório central antes de ler qualquer
+    membro. O tamanho real lido (não o declarado) é limitado por membro e no
+    total descomprimido, então uma bomba de ZIP para no limite.
+    """
+    try:
+        with zipfile.ZipFile(fileobj) as archive:
+            infos = [info for info in archive.infolist() if not _skipped(info)]
+            if len(infos) > max_documents:
+                raise BatchInputError(f"Lote excede o limite de {max_documents} documentos")
+            remaining = max_total_bytes
+            for info in infos:
+                with archive.open(info) as member:
+                    data = member.read(min(max_bytes, remaining) + 1)
+                if len(data) > max_bytes:
+                    raise BatchInputError(f"{info.filename}: excede o limite de {max_bytes // (1024 * 1024)} MB")
+                if len(data) > remaining:
+                    raise BatchInputError("Lote excede o limite de dados descomprimidos")
+                remaining -= len(data)
+                yield info.filename, data
+    except zipfile.BadZipFile as e:
+        raise BatchInputError(f"ZIP inválido: {e}") from e
+
+
+def _plain_file(filename: str, fileobj, max_bytes: int) -> Iterator[Tuple[str, bytes]]:
+    data = fileobj.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise BatchInputError(f"{filename}: excede o limite de {max_bytes // (1024 * 1024)} MB")
+    yield filename, data
+
+
+async def expand_inputs(
+    files: Iterable[Tuple[str, object]], max_documents: int, max_bytes: int, max_total_bytes: int,
+) -> AsyncIterator[Tuple[str, bytes]]:
+    """
+    (nome, bytes) de cada documento: arquivos enviados e membros de ZIPs
+
+    `files` são pares (nome, arquivo binário) já recebidos (ex.: arquivos
+    temporários do multipart). A leitura acontece em thread, um documento por
+    vez e sob demanda: só o documento corrente e as filas do pipeline ficam em
+    memória. `max_total_bytes` limita o total lido, ZIPs descomprimidos incluídos.
+    """
+    count = 0
+    total = 0
+    for filename, fileobj in files:
+        head = await asyncio.to_thread(fileobj.read, len(ZIP_MAGIC))
+        await asyncio.to_thread(fileobj.seek, 0)
+        if _is_zip(head):
+            entries = _zip_members(fileobj, max_documents - count, max_bytes, max_total_bytes - total)
+        else:
+            entries = _plain_file(filename, fileobj, max_bytes)
+
+        try:
+            while (entry := await asyncio.to_thread(next, entries, None)) is not None:
+                name, data = entry
+                count += 1
+                total += len(data)
+                if count > max_documents:
+                    raise BatchInputError(f"Lote excede o limite de {max_documents} documentos")
+                if total > max_total_bytes:
+                    raise BatchInputError("Lote excede o limite de dados descomprimidos")
+                yield name, data
+        finally:
+            entries.close()
+
+
+class BatchPipeline:
+    """Executa os estágios do lote concorrentemente, ligados por filas limitadas"""
+
+    def __init__(
+        self,
+        as_audio: bool = False,
+        audio_format: Optional[str] = None,
+        completed: Optional[Dict[str, dict]] = None,
+        cancel_token: Optional[CancellationToken] = None,
+        ocr_workers: Optional[int] = None,
+        llm_batch_size: Optional[int] = None,
+        tts_workers: Optional[int] = None,
+        queue_size: Optional[int] = None,
+    ):
+        self.as_audio = as_audio
+        self.audio_format = audio_format
+        self.completed = completed or {}
+        self.token = cancel_token or CancellationToken()
+        self.ocr_workers = ocr_workers or settings.batch_ocr_workers or os.cpu_count() or 1
+        self.llm_batch_size = max(1, llm_batch_size or settings.batch_llm_size)
+        self.tts_workers = max(1, tts_workers or settings.batch_tts_workers)
+        queue_size = queue_size or settings.batch_queue_size
+
+        self._ocr_queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self._llm_queue: asyncio.Queue = asyncio.Queue(max(queue_size, self.llm_batch_size))
+        self._tts_queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self._out_queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self._ocr_running = self.ocr_workers
+        self._tts_running = self.tts_workers
+        self.input_error: Optional[str] = None
+
+    async def _emit(self, document: BatchDocument):
+        """Documento simplificado segue para o TTS (se pedido) ou direto para a saída"""
+        if self.as_audio and not document.error:
+            await self._tts_queue.put(document)
+        else:
+            await self._out_queue.put(document)
+
+    def _finish(self, document: BatchDocument, simplified: Dict[str, str]):
+        document.simplified = simplified
+        document.payload_text = compose_stage(simplified)
+        record_served_tier(document.service_tier)
+
+    async def _decode(self, inputs: AsyncIterator[Tuple[str, bytes]]):
+        index = 0
+        try:
+            async for name, data in inputs:
+                key = hashlib.sha256(data).hexdigest()
+                stored = self.completed.get(key)
+                if stored is not None:
+                    await self._emit(BatchDocument.from_result(index, name, key, stored))
+                else:
+                    await self._ocr_queue.put(BatchDocument(index=index, name=name, key=key, data=data))
+                index += 1
+        except BatchInputError as e:
+            # Documentos já lidos continuam; o erro vai no resumo do lote
+            self.input_error = str(e)
+            logger.warning(f"Lote interrompido na leitura: {e}")
+        # Sentinelas só no término normal: em falhas/cancelamento o run() derruba todos os estágios
+        for _ in range(self.ocr_workers):
+            await self._ocr_queue.put(None)
+
+    async def _ocr_worker(self):
+        while True:
+            document = await self._ocr_queue.get()
+            if document is None:
+                break
+            data, document.data = document.data, None
+            try:
+                document.raw_text = await ocr_stage(data)
+            except Exception as e:
+                document.error = f"OCR failed: {e}"
+                await self._out_queue.put(document)
+                continue
+
+            document.process_numbers = extract_cnj_numbers(document.raw_text)
+            document.normalized_text = normalize_stage(document.raw_text).text
+            document.template = template_stage(document.normalized_text)
+            if document.template:
+                record_simplification("template", document.template.document_type)
+                self._finish(document, document.template.simplified)
+                await self._emit(document)
+                continue
+
+            document.fingerprint, document.near_duplicate = await near_duplicate_stage(
+                document.normalized_text, document.process_numbers
+            )
+            if document.near_duplicate:
+                record_simplification("near_duplicate")
+                self._finish(document, document.near_duplicate.simplified)
+                await self._emit(document)
+            else:
+                await self._llm_queue.put(document)
+
+        self._ocr_running -= 1
+        if self._ocr_running == 0:
+            await self._llm_queue.put(None)
+
+    async def _llm_worker(self):
+        finished = False
+        while not finished:
+            document = await self._llm_queue.get()
+            if document is None:
+                break
+            # Leva tudo o que já está pronto, sem esperar o lote encher
+            batch = [document]
+            while len(batch) < self.llm_batch_size:
+                try:
+                    document = self._llm_queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if document is None:
+                    finished = True
+                    break
+                batch.append(document)
+
+            self.token.raise_if_cancelled()
+            tier = tier_stage()
+            for document in batch:
+                document.service_tier = tier.name
+            if not tier.use_llm:
+                for document in batch:
+                    simplified, document.template = fallback_stage(document.normalized_text)
+                    self._finish(document, simplified)
+                    await self._emit(document)
+                continue
+
+            try:
+                with get_degradation_controller().track(), track_queue("llm"):
+                    results = await simplify_batch(
+                        [d.normalized_text for d in batch], cancel_token=self.token,
+                        max_new_tokens=tier.max_new_tokens, small_model=tier.small_model,
+                    )
+            except RequestCancelled:
+                raise
+            except Exception as e:
+                logger.error(f"Erro no lote do LLM ({len(batch)} documentos): {e}")
+                results = [None] * len(batch)
+
+            for document, simplified in zip(batch, results):
+                if simplified is None:
+                    document.error = "Falha ao simplificar o documento"
+                    await self._out_queue.put(document)
+                    continue
+                record_simplification("llm")
+                if tier.name == "full":
+                    await remember_stage(document.fingerprint, document.raw_text, document.process_numbers, simplified)
+                self._finish(document, simplified)
+                await self._emit(document)
+
+        for _ in range(self.tts_workers):
+            await self._tts_queue.put(None)
+
+    async def _tts_worker(self):
+        while True:
+            document = await self._tts_queue.get()
+            if document is None:
+                break
+            audio = await synthesize_stage(document.payload_text, self.audio_format)
+            if audio:
+                document.audio_bytes, document.audio_format = audio.data, audio.format
+            await self._out_queue.put(document)
+
+        self._tts_running -= 1
+        if self._tts_running == 0:
+            await self._out_queue.put(None)
+
+    async def run(self, inputs: AsyncIterator[Tuple[str, bytes]]) -> AsyncIterator[BatchDocument]:
+        """Documentos concluídos, em ordem de conclusão"""
+        tasks = [
+            asyncio.create_task(self._decode(inputs)),
+            *(asyncio.create_task(self._ocr_worker()) for _ in range(self.ocr_workers)),
+            asyncio.create_task(self._llm_worker()),
+            *(asyncio.create_task(self._tts_worker()) for _ in range(self.tts_workers)),
+        ]
+        getter = None
+        try:
+            while True:
+                if getter is None:
+                    getter = asyncio.ensure_future(self._out_queue.get())
+                # Um estágio que falhou de forma inesperada não pode travar o lote
+                done, _ = await asyncio.wait({getter, *tasks}, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task is not getter and not task.cancelled() and task.exception():
+                        raise task.exception()
+                tasks = [task for task in tasks if not task.done()]
+                if getter not in done:
+                    continue
+                document, getter = getter.result(), None
+                if document is None:
+                    break
+                yield document
+        finally:
+            # Cliente desconectou ou o lote terminou: para os estágios e a geração em curso
+            self.token.cancel()
+            if getter is not None:
+                getter.cancel()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
@@ -0,0 +1,115 @@
+"""
+Cancelamento de requisições (cliente desconectado ou prazo esgotado)
+
+O CancellationToken é compartilhado entre o event loop e as threads de
+inferência: a geração do Llama consulta o token a cada passo e o pipeline
+consulta entre estágios. `run_cancellable` executa o pipeline como task,
+observa a conexão do cliente e o prazo, e cancela tudo quando um deles dispara.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Optional
+
+from .metrics import record_cancellation
+
+logger = logging.getLogger(__name__)
+
+CLIENT_DISCONNECTED = "client_disconnected"
+DEADLINE_EXCEEDED = "deadline_exceeded"
+SERVER_SHUTDOWN = "server_shutdown"
+
+
+class RequestCancelled(Exception):
+    """A requisição foi abandonada; o resultado não deve mais ser produzido"""
+
+    def __init__(self, reason: str):
+        super().__init__(f"Requisição cancelada: {reason}")
+        self.reason = reason
+
+
+class CancellationToken:
+    """Sinal de cancelamento thread-safe com prazo opcional"""
+
+    def __init__(self, deadline_seconds: Optional[float] = None):
+        self._event = threading.Event()
+        self.reason: Optional[str] = None
+        self.deadline = time.monotonic() + deadline_seconds if deadline_seconds else None
+
+    def cancel(self, reason: str = CLIENT_DISCONNECTED):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+
+    def remaining(self) -> Optional[float]:
+        """Segundos até o prazo (None = sem prazo)"""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.monotonic()
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set():
+            remaining = self.remaining()
+            if remaining is not None and remaining <= 0:
+                self.cancel(DEADLINE_EXCEEDED)
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise RequestCancelled(self.reason or CLIENT_DISCONNECTED)
+
+
+async def run_cancellable(
+    awaitable: Awaitable[Any],
+    token: CancellationToken,
+    request=None,
+    poll_interval: float = 0.25,
+) -> Any:
+    """
+    Executa `awaitable` até terminar, o prazo vencer ou o cliente desconectar
+
+    Em caso de cancelamento a task é cancelada (abortando TTS e envios
+    pendentes), o token é sinalizado (parando a geração na thread de inferência)
+    e RequestCancelled é levantada.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            timeout = poll_interval
+            remaining = token.remaining()
+            if remaining is not None:
+                timeout = max(0.0, min(timeout, remaining))
+
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+            if done:
+                try:
+                    return task.result()
+                except RequestCancelled as e:
+                    # Token verificado no meio do pipeline (ex.: prazo vencido entre o LLM e o TTS)
+                    record_cancellation(e.reason)
+                    logger.info(f"Requisição cancelada ({e.reason})")
+                    raise
+            if token.cancelled:
+                break
+            if request is not None and await request.is_disconnected():
+                token.cancel(CLIENT_DISCONNECTED)
+                break
+    except asyncio.CancelledError:
+        token.cancel(SERVER_SHUTDOWN)
+        task.cancel()
+        raise
+
+    task.cancel()
+    try:
+        await task
+    except (asyncio.CancelledError, RequestCancelled):
+        pass
+    except Exception as e:
+        logger.debug(f"Erro descartado após cancelamento: {e}")
+
+    record_cancellation(token.reason)
+    logger.info(f"Requisição cancelada ({token.reason})")
+    raise RequestCancelled(token.reason)
@@ -0,0 +1,170 @@
+"""
+Degradação controlada sob sobrecarga: níveis de serviço do LLM
+
+Quando a fila de inferência cresce, atender todo mundo com o modelo completo
+faz a latência subir para todos. O controlador acompanha a profundidade da
+fila do LLM (por vaga de inferência) e o p90 recente da latência do LLM (fila
++ geração) e desce um nível por vez:
+
+    full        modelo completo, `llama_max_tokens`
+    reduced     mesmo modelo, orçamento de tokens menor
+    small       modelo menor (`llm_small_model`), só se configurado e já carregado
+    extractive  sem LLM: modelo de documento com confiança menor ou resumo extrativo
+
+Para subir de volta (histerese) a carga precisa ficar abaixo dos limites
+inferiores por `degradation_step_up_seconds`; para descer basta um pico acima
+dos limites superiores, respeitando `degradation_step_down_seconds` entre passos.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Deque, Iterator, List, Optional, Tuple
+
+from ..config.config import settings
+from ..services.providers import small_llm_ready
+from .metrics import record_service_tier_change, set_service_tier
+
+logger = logging.getLogger(__name__)
+
+# Amostras de latência guardadas na janela
+_MAX_SAMPLES = 512
+# Abaixo disso o p90 não é confiável; conta só a fila
+_MIN_SAMPLES = 3
+
+
+@dataclass(frozen=True)
+class ServiceTier:
+    """Nível de serviço: como o LLM é chamado (ou não) neste nível"""
+    name: str
+    use_llm: bool = True
+    max_new_tokens: Optional[int] = None  # None: settings.llama_max_tokens
+    small_model: bool = False
+
+
+def _build_tiers() -> List[ServiceTier]:
+    reduced = settings.degradation_reduced_max_tokens
+    return [
+        ServiceTier("full"),
+        ServiceTier("reduced", max_new_tokens=reduced),
+        ServiceTier("small", max_new_tokens=reduced, small_model=True),
+        ServiceTier("extractive", use_llm=False),
+    ]
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class DegradationController:
+    """Escolhe o nível de serviço pela fila do LLM e pela latência recente"""
+
+    def __init__(
+        self,
+        tiers: Optional[List[ServiceTier]] = None,
+        slots: Optional[int] = None,
+        available: Optional[Callable[[ServiceTier], bool]] = None,
+    ):
+        self.tiers = tiers or _build_tiers()
+        self.slots = max(1, slots or settings.llm_concurrency)
+        self.available = available or (lambda tier: True)
+        self.level = 0
+        self._inflight = 0
+        self._samples: Deque[Tuple[float, float]] = deque(maxlen=_MAX_SAMPLES)
+        self._changed = 0.0
+        self._calm_since: Optional[float] = None
+        self._lock = threading.Lock()
+        set_service_tier(self.level)
+
+    @property
+    def queue_depth(self) -> float:
+        """Chamadas ao LLM aguardando ou em execução, por vaga de inferência"""
+        return self._inflight / self.slots
+
+    def latency_p90(self, now: Optional[float] = None) -> float:
+        """p90 da latência do LLM na janela (0 sem amostras suficientes)"""
+        now = now if now is not None else time.monotonic()
+        horizon = now - settings.degradation_window_seconds
+        with self._lock:
+            while self._samples and self._samples[0][0] < horizon:
+                self._samples.popleft()
+            values = [seconds for _, seconds in self._samples]
+        return _percentile(values, 0.9) if len(values) >= _MIN_SAMPLES else 0.0
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """Conta a chamada na fila do LLM e registra sua latência (espera pela vaga + geração)"""
+        with self._lock:
+            self._inflight += 1
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            end = time.monotonic()
+            with self._lock:
+                self._inflight -= 1
+                self._samples.append((end, end - start))
+
+    def _step(self, direction: int, now: float, reason: str):
+        """Move um nível (pulando os indisponíveis); chamar fora do lock"""
+        level = self.level + direction
+        while 0 < level < len(self.tiers) - 1 and not self.available(self.tiers[level]):
+            level += direction
+        level = max(0, min(level, len(self.tiers) - 1))
+        if level == self.level:
+            return
+        previous, self.level = self.tiers[self.level], level
+        self._changed = now
+        set_service_tier(level)
+        record_service_tier_change("down" if direction > 0 else "up")
+        log = logger.warning if direction > 0 else logger.info
+        log(f"Nível de serviço: {previous.name} → {self.tiers[level].name} ({reason})")
+
+    def current(self) -> ServiceTier:
+        """Nível para a próxima chamada (reavalia a carga)"""
+        if not settings.degradation_enabled:
+            return self.tiers[0]
+        now = time.monotonic()
+        depth, latency = self.queue_depth, self.latency_p90(now)
+        reason = f"fila {depth:.1f}/vaga, p90 {latency:.1f}s"
+        pressured = depth >= settings.degradation_queue_high or latency >= settings.degradation_latency_high_seconds
+        calm = depth <= settings.degradation_queue_low and latency <= settings.degradation_latency_low_seconds
+
+        if pressured:
+            self._calm_since = None
+            if now - self._changed >= settings.degradation_step_down_seconds:
+                self._step(+1, now, reason)
+        elif calm and self.level > 0:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif now - max(self._calm_since, self._changed) >= settings.degradation_step_up_seconds:
+                self._step(-1, now, reason)
+                self._calm_since = now
+        elif not calm:
+            self._calm_since = None
+        return self.tiers[self.level]
+
+    def status(self) -> dict:
+        return {
+            "enabled": settings.degradation_enabled,
+            "tier": self.tiers[self.level].name,
+            "level": self.level,
+            "queue_depth_per_slot": round(self.queue_depth, 2),
+            "latency_p90_s": round(self.latency_p90(), 3),
+            "tiers": [tier.name for tier in self.tiers if tier.name != "small" or self.available(tier)],
+        }
+
+
+_controller: Optional[DegradationController] = None
+
+
+def get_degradation_controller() -> DegradationController:
+    """Controlador do processo (criado no primeiro uso)"""
+    global _controller
+    if _controller is None:
+        _controller = DegradationController(available=lambda tier: not tier.small_model or small_llm_ready())
+    return _controller
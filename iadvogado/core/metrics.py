@@ -0,0 +1,282 @@
+"""
+Métricas no formato Prometheus para o pipeline do IADvogado
+
+Histogramas por estágio (upload, OCR, normalização, tokenização, prefill, decode, TTS,
+armazenamento e envio WhatsApp), tokens/s, profundidade de filas, acertos de
+cache e memória do modelo.
+
+Com vários workers (uvicorn --workers N / gunicorn), defina METRICS_MULTIPROC_DIR:
+cada processo grava seus valores em arquivos mmap nesse diretório e o endpoint
+/metrics agrega todos os processos.
+"""
+
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+from ..config.config import settings
+
+# O prometheus_client decide o modo multiprocesso no import, então a variável
+# de ambiente precisa existir antes dele ser importado.
+if settings.metrics_multiproc_dir:
+    os.makedirs(settings.metrics_multiproc_dir, exist_ok=True)
+    os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", settings.metrics_multiproc_dir)
+
+from prometheus_client import (  # noqa: E402
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess  # noqa: E402
+
+STAGES = (
+    "upload_read",
+    "ocr",
+    "normalize",
+    "template",
+    "near_duplicate",
+    "tokenize",
+    "prefill",
+    "decode",
+    "tts",
+    "storage",
+    "index_lookup",
+    "whatsapp_send",
+)
+
+# Buckets de 5 ms a 2 min: cobrem desde cache hits até a geração completa na CPU
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0,
+)
+
+STAGE_LATENCY = Histogram(
+    "iadvogado_stage_duration_seconds",
+    "Duração de cada estágio do pipeline",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+TOKENS_PER_SECOND = Histogram(
+    "iadvogado_llm_tokens_per_second",
+    "Velocidade de decode do LLM por requisição",
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250),
+)
+
+GENERATED_TOKENS = Counter(
+    "iadvogado_llm_generated_tokens_total",
+    "Total de tokens gerados pelo LLM",
+)
+
+PROMPT_TOKENS = Counter(
+    "iadvogado_llm_prompt_tokens_total",
+    "Total de tokens de entrada (prefill) enviados ao LLM",
+)
+
+TRUNCATED_OUTPUTS = Counter(
+    "iadvogado_llm_truncated_total",
+    "Respostas do LLM cortadas pelo limite de tokens antes de fechar o JSON",
+)
+
+NORMALIZATION_REDUCTION = Histogram(
+    "iadvogado_normalization_token_reduction_ratio",
+    "Fração dos tokens (estimados) do OCR removida pela normalização, por documento",
+    buckets=(0.0, 0.02, 0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.75),
+)
+
+NORMALIZATION_TOKENS_SAVED = Counter(
+    "iadvogado_normalization_tokens_saved_total",
+    "Total de tokens (estimados) removidos do texto antes do LLM",
+)
+
+SIMPLIFICATIONS = Counter(
+    "iadvogado_simplifications_total",
+    "Documentos simplificados por origem da resposta (llm, template ou near_duplicate) e tipo",
+    ["source", "document_type"],
+)
+
+QUEUE_DEPTH = Gauge(
+    "iadvogado_queue_depth",
+    "Itens aguardando ou em execução em cada fila",
+    ["queue"],
+    multiprocess_mode="livesum",
+)
+
+CACHE_REQUESTS = Counter(
+    "iadvogado_cache_requests_total",
+    "Consultas a caches por resultado (hit/miss)",
+    ["cache", "result"],
+)
+
+CANCELLED_REQUESTS = Counter(
+    "iadvogado_requests_cancelled_total",
+    "Requisições abandonadas antes de terminar, por motivo",
+    ["reason"],
+)
+
+ADMISSION_REJECTED = Counter(
+    "iadvogado_admission_rejected_total",
+    "Requisições recusadas pelo controle de admissão (429), por motivo",
+    ["reason"],
+)
+
+EVENT_LOOP_LAG = Histogram(
+    "iadvogado_event_loop_lag_seconds",
+    "Atraso do event loop medido pelo monitor de profiling",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+EVENT_LOOP_BLOCKS = Counter(
+    "iadvogado_event_loop_blocks_total",
+    "Vezes em que o event loop ficou bloqueado acima do limite configurado",
+)
+
+SERVICE_TIER = Gauge(
+    "iadvogado_service_tier_level",
+    "Nível de serviço do LLM (0 = completo; maior = mais degradado pela carga)",
+    multiprocess_mode="livemax",
+)
+
+SERVICE_TIER_CHANGES = Counter(
+    "iadvogado_service_tier_changes_total",
+    "Mudanças de nível de serviço por direção (down/up)",
+    ["direction"],
+)
+
+SERVED_TIER = Counter(
+    "iadvogado_served_tier_total",
+    "Documentos simplificados por nível de serviço em que foram atendidos",
+    ["tier"],
+)
+
+MODEL_MEMORY = Gauge(
+    "iadvogado_model_memory_bytes",
+    "Memória ocupada pelos pesos do modelo carregado",
+    ["model"],
+    multiprocess_mode="livemax",
+)
+
+
+def observe_stage(stage: str, seconds: float):
+    """Registra a duração de um estágio"""
+    STAGE_LATENCY.labels(stage=stage).observe(seconds)
+
+
+@contextmanager
+def time_stage(stage: str) -> Iterator[None]:
+    """Mede a duração do bloco (funciona também dentro de corrotinas)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
+
+
+@contextmanager
+def track_queue(queue: str) -> Iterator[None]:
+    """Conta o item na fila enquanto o bloco estiver em execução"""
+    gauge = QUEUE_DEPTH.labels(queue=queue)
+    gauge.inc()
+    try:
+        yield
+    finally:
+        gauge.dec()
+
+
+def record_cache(cache: str, hit: bool):
+    """Registra um acerto ou falha de cache"""
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+
+def record_generation(prompt_tokens: int, new_tokens: int, decode_seconds: float):
+    """Registra contadores de tokens e a velocidade de decode"""
+    PROMPT_TOKENS.inc(prompt_tokens)
+    GENERATED_TOKENS.inc(new_tokens)
+    if new_tokens and decode_seconds > 0:
+        TOKENS_PER_SECOND.observe(new_tokens / decode_seconds)
+
+
+def record_truncation():
+    """Conta uma resposta do LLM fechada à força por ter atingido o limite de tokens"""
+    TRUNCATED_OUTPUTS.inc()
+
+
+def record_normalization(original_tokens: int, normalized_tokens: int):
+    """Registra a redução de tokens obtida pela normalização de um documento"""
+    saved = max(0, original_tokens - normalized_tokens)
+    NORMALIZATION_TOKENS_SAVED.inc(saved)
+    if original_tokens:
+        NORMALIZATION_REDUCTION.observe(saved / original_tokens)
+
+
+def record_simplification(source: str, document_type: str | None = None):
+    """Conta uma simplificação feita pelo LLM ou pelo caminho rápido de modelos"""
+    SIMPLIFICATIONS.labels(source=source, document_type=document_type or "unknown").inc()
+
+
+def record_cancellation(reason: str | None):
+    """Conta uma requisição cancelada (desconexão, prazo, shutdown)"""
+    CANCELLED_REQUESTS.labels(reason=reason or "unknown").inc()
+
+
+def record_admission_rejection(reason: str):
+    """Conta uma requisição recusada (limite por chave ou sobrecarga)"""
+    ADMISSION_REJECTED.labels(reason=reason).inc()
+
+
+def record_loop_lag(seconds: float):
+    """Registra o atraso de um batimento do event loop"""
+    EVENT_LOOP_LAG.observe(seconds)
+
+
+def record_loop_block():
+    """Conta um bloqueio do event loop acima do limite"""
+    EVENT_LOOP_BLOCKS.inc()
+
+
+def set_service_tier(level: int):
+    """Atualiza o nível de serviço atual"""
+    SERVICE_TIER.set(level)
+
+
+def record_service_tier_change(direction: str):
+    """Conta uma mudança de nível de serviço"""
+    SERVICE_TIER_CHANGES.labels(direction=direction).inc()
+
+
+def record_served_tier(tier: str):
+    """Conta um documento atendido no nível `tier`"""
+    SERVED_TIER.labels(tier=tier).inc()
+
+
+def set_model_memory(model: str, num_bytes: int):
+    """Atualiza a memória ocupada pelo modelo"""
+    MODEL_MEMORY.labels(model=model).set(num_bytes)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Gera o corpo do endpoint /metrics (agregando processos, se configurado)"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead():
+    """Remove os gauges 'live' deste processo (chamar no shutdown do worker)"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def reset_multiprocess_dir():
+    """Limpa os arquivos de métricas de execuções anteriores (antes de subir os workers)"""
+    directory = settings.metrics_multiproc_dir
+    if not directory:
+        return
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
@@ -0,0 +1,348 @@
+"""
+Pipeline de processamento de documentos em estágios explícitos
+
+OCR -> normalização -> simplificação -> composição -> síntese -> entrega
+
+Documentos rotineiros (intimação para audiência, citação, despacho de mero
+expediente) são simplificados por modelos parametrizados, sem passar pelo LLM.
+Documentos quase idênticos a um já simplificado (outra foto da mesma página,
+mesmo texto com outras datas) reaproveitam aquela simplificação. Sob
+sobrecarga, o LLM é chamado num nível de serviço reduzido ou substituído por
+uma resposta extrativa (core.degradation).
+
+Cada artefato (texto extraído, simplificação, texto final e áudio) é produzido
+uma única vez e compartilhado entre os canais de entrega (resposta HTTP e
+WhatsApp); o áudio, uma vez por formato (o WhatsApp recebe Opus/OGG).
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from ..services.ocr_worker import image_bytes_to_text, ImageSource
+from ..services.text_normalizer import NormalizationResult, normalize_legal_text
+from ..services.document_templates import TemplateMatch, extractive_simplification, match_template
+from ..services.near_duplicates import (
+    DocumentFingerprint, NearDuplicateMatch, find_near_duplicate, fingerprint_document, remember_simplification,
+)
+from ..services.audio_formats import OPUS, AudioFormat, SynthesizedAudio, deliverable_format, resolve_audio_format
+from ..services.providers import simplify_text, synthesize_speech
+from ..integrations.whatsapp_adapter import send_whatsapp_audio, send_whatsapp_text
+from ..storage.process_index import is_sealed
+from ..utils.utils import make_disclaimer, expiration_date
+from ..utils.cnj import extract_cnj_numbers
+from ..config.config import settings
+from .metrics import time_stage, track_queue, record_cache, record_normalization, record_served_tier, record_simplification
+from .degradation import ServiceTier, get_degradation_controller
+from .cancellation import CancellationToken
+from .profiling import run_profiled
+
+logger = logging.getLogger(__name__)
+
+
+class OCRFailed(Exception):
+    """Falha ao extrair texto do documento enviado"""
+
+
+@dataclass
+class DeliveryResult:
+    """Artefatos produzidos pelos estágios de síntese e entrega"""
+    audio_bytes: Optional[bytes] = None
+    audio_format: Optional[AudioFormat] = None
+    whatsapp_sent: bool = False
+    whatsapp_audio_sent: bool = False
+
+
+async def ocr_stage(contents: ImageSource) -> str:
+    """Extrai texto da imagem (bytes ou arquivo temporário do upload) sem bloquear o event loop"""
+    with track_queue("ocr"), time_stage("ocr"):
+        return await asyncio.to_thread(run_profiled, "ocr", image_bytes_to_text, contents)
+
+
+def normalize_stage(raw_text: str) -> NormalizationResult:
+    """Remove boilerplate e repetições do OCR, reduzindo os tokens enviados ao LLM"""
+    if not settings.text_normalization:
+        return NormalizationResult(raw_text, 0, 0, 0)
+    with time_stage("normalize"):
+        result = normalize_legal_text(raw_text)
+    record_normalization(result.original_tokens, result.normalized_tokens)
+    logger.info(
+        f"Normalização: {result.original_tokens} → {result.normalized_tokens} tokens estimados "
+        f"(-{result.reduction:.0%}), {result.removed_lines} linhas removidas"
+    )
+    return result
+
+
+def template_stage(text: str) -> Optional[TemplateMatch]:
+    """Caminho rápido: resposta por modelo quando o documento é rotineiro"""
+    if not settings.template_fast_path:
+        return None
+    with time_stage("template"):
+        match = match_template(text, settings.template_min_confidence)
+    if match:
+        logger.info(f"Documento respondido por modelo: {match.document_type} (confiança {match.confidence:.2f})")
+    return match
+
+
+async def near_duplicate_stage(
+    text: str, process_numbers: List[str]
+) -> Tuple[Optional[DocumentFingerprint], Optional[NearDuplicateMatch]]:
+    """Simplificação reaproveitável de um documento quase idêntico (consulta fora do event loop)"""
+    if not settings.near_duplicate_cache:
+        return None, None
+
+    def lookup():
+        fingerprint = fingerprint_document(text)
+        return fingerprint, find_near_duplicate(fingerprint, process_numbers)
+
+    try:
+        with time_stage("near_duplicate"):
+            fingerprint, match = await asyncio.to_thread(lookup)
+    except Exception as e:
+        logger.error(f"Erro no cache de quase-duplicatas: {e}")
+        return None, None
+    record_cache("near_duplicate", match is not None)
+    if match:
+        logger.info(f"Simplificação reaproveitada de documento quase idêntico ({match.kind}, similaridade {match.similarity:.0%})")
+    return fingerprint, match
+
+
+async def remember_stage(
+    fingerprint: Optional[DocumentFingerprint], raw_text: str, process_numbers: List[str], simplified: Dict[str, str]
+):
+    """Guarda a simplificação do LLM no cache de quase-duplicatas (best-effort; não guarda segredo de justiça)"""
+    if fingerprint is None or is_sealed(raw_text):
+        return
+    try:
+        await asyncio.to_thread(remember_simplification, fingerprint, process_numbers, simplified, expiration_date())
+    except Exception as e:
+        logger.error(f"Erro ao gravar no cache de quase-duplicatas: {e}")
+
+
+def tier_stage() -> ServiceTier:
+    """Nível de serviço para o próximo documento, conforme a carga do LLM"""
+    return get_degradation_controller().current()
+
+
+async def simplify_stage(
+    raw_text: str, cancel_token: Optional[CancellationToken] = None, tier: Optional[ServiceTier] = None
+) -> Dict[str, str]:
+    """Simplifica o texto jurídico extraído (a geração para se o token for cancelado)"""
+    with get_degradation_controller().track(), track_queue("llm"):
+        simplified = await simplify_text(
+            raw_text,
+            cancel_token=cancel_token,
+            max_new_tokens=tier.max_new_tokens if tier else None,
+            small_model=bool(tier and tier.small_model),
+        )
+    record_simplification("llm")
+    return simplified
+
+
+def fallback_stage(text: str) -> Tuple[Dict[str, str], Optional[TemplateMatch]]:
+    """Nível extractive (sem LLM): modelo de documento com confiança menor ou resumo extrativo"""
+    match = match_template(text, settings.degradation_template_min_confidence) if settings.template_fast_path else None
+    if match:
+        record_simplification("template", match.document_type)
+        return match.simplified, match
+    record_simplification("extractive")
+    return extractive_simplification(text), None
+
+
+def compose_stage(simplified: Dict[str, str]) -> str:
+    """Monta o texto final entregue ao usuário"""
+    return (
+        f"O que aconteceu:\n{simplified['what_happened']}\n\n"
+        f"O que significa:\n{simplified['what_it_means']}\n\n"
+        f"O que fazer agora:\n{simplified['what_to_do_now']}\n\n"
+        f"{make_disclaimer()}"
+    )
+
+
+async def synthesize_stage(payload_text: str, audio_format: Optional[str] = None) -> Optional[SynthesizedAudio]:
+    """Gera o áudio uma única vez (best-effort)"""
+    try:
+        with track_queue("tts"), time_stage("tts"):
+            audio = await synthesize_speech(payload_text, audio_format)
+        logger.info(f"Áudio gerado com sucesso: {len(audio.data)} bytes ({audio.format.name})")
+        return audio
+    except Exception as e:
+        logger.error(f'Erro ao gerar áudio: {e}')
+        return None
+
+
+async def whatsapp_text_stage(phone_number: str, payload_text: str) -> bool:
+    """Envia o texto via WhatsApp (best-effort)"""
+    try:
+        with time_stage("whatsapp_send"):
+            await send_whatsapp_text(phone_number, payload_text)
+        return True
+    except Exception as e:
+        logger.warning(f'Falha ao enviar mensagem WhatsApp: {e}')
+        return False
+
+
+async def whatsapp_audio_stage(phone_number: str, audio: Optional[SynthesizedAudio]) -> bool:
+    """Envia o áudio via WhatsApp (best-effort); Opus/OGG chega como mensagem de voz"""
+    if audio is None:
+        return False
+    try:
+        with time_stage("whatsapp_send"):
+            await send_whatsapp_audio(
+                phone_number, audio.data, f"explicacao.{audio.format.extension}", audio.format.media_type,
+            )
+        return True
+    except Exception as e:
+        logger.warning(f'Falha ao enviar áudio WhatsApp: {e}')
+        return False
+
+
+async def whatsapp_stage(
+    phone_number: str, payload_text: str, voice_note: Optional["asyncio.Future[Optional[SynthesizedAudio]]"],
+) -> Tuple[bool, bool]:
+    """Texto e, se pedido, o áudio pelo WhatsApp, nessa ordem: (texto enviado, áudio enviado)"""
+    text_sent = await whatsapp_text_stage(phone_number, payload_text)
+    if voice_note is None:
+        return text_sent, False
+    return text_sent, await whatsapp_audio_stage(phone_number, await voice_note)
+
+
+async def deliver_stage(
+    payload_text: str,
+    phone_number: Optional[str] = None,
+    as_audio: bool = False,
+    audio_format: Optional[str] = None,
+) -> DeliveryResult:
+    """
+    Executa síntese e entrega em paralelo
+
+    O envio do texto pelo WhatsApp não depende do áudio, então ambos rodam
+    concorrentemente. Cada canal recebe o áudio no seu formato: o pedido na
+    resposta HTTP e Opus/OGG (mensagem de voz) no WhatsApp. Se os dois
+    coincidem, o áudio é gerado uma vez e compartilhado.
+    """
+    audio_task = voice_task = None
+    if as_audio:
+        audio_task = asyncio.ensure_future(synthesize_stage(payload_text, audio_format))
+        if phone_number:
+            same_format = deliverable_format(resolve_audio_format(audio_format)) == deliverable_format(OPUS)
+            voice_task = audio_task if same_format else asyncio.ensure_future(synthesize_stage(payload_text, OPUS.name))
+
+    jobs = {}
+    if audio_task is not None:
+        jobs["audio"] = audio_task
+    if phone_number:
+        jobs["whatsapp"] = whatsapp_stage(phone_number, payload_text, voice_task)
+
+    if not jobs:
+        return DeliveryResult()
+
+    try:
+        results = dict(zip(jobs.keys(), await asyncio.gather(*jobs.values())))
+    finally:
+        if voice_task is not None and not voice_task.done():
+            voice_task.cancel()
+    audio = results.get("audio")
+    text_sent, audio_sent = results.get("whatsapp", (False, False))
+    return DeliveryResult(
+        audio_bytes=audio.data if audio else None,
+        audio_format=audio.format if audio else None,
+        whatsapp_sent=text_sent,
+        whatsapp_audio_sent=audio_sent,
+    )
+
+
+@dataclass
+class PipelineResult:
+    """Resultado completo do processamento de um documento"""
+    raw_text: str
+    simplified: Dict[str, str]
+    payload_text: str
+    delivery: DeliveryResult
+    normalization: Optional[NormalizationResult] = None
+    template: Optional[TemplateMatch] = None
+    near_duplicate: Optional[NearDuplicateMatch] = None
+    # Números CNJ (20 dígitos) encontrados no texto, usados para indexar o documento
+    process_numbers: List[str] = field(default_factory=list)
+    # Nível de serviço em que o documento foi atendido (core.degradation)
+    service_tier: str = "full"
+
+    @property
+    def generated_by(self) -> str:
+        """Origem da simplificação: 'template' (caminho rápido), 'near_duplicate' (cache) ou 'llm'"""
+        if self.template:
+            return "template"
+        if self.near_duplicate:
+            return "near_duplicate"
+        return "extractive" if self.service_tier == "extractive" else "llm"
+
+
+async def process_document(
+    contents: ImageSource,
+    phone_number: Optional[str] = None,
+    as_audio: bool = False,
+    cancel_token: Optional[CancellationToken] = None,
+    audio_format: Optional[str] = None,
+) -> PipelineResult:
+    """
+    Executa OCR -> normalização -> simplificação -> composição -> síntese/entrega
+
+    Entre os estágios o token é consultado: trabalho de uma requisição
+    abandonada não chega ao próximo estágio.
+    """
+    token = cancel_token or CancellationToken()
+    try:
+        raw_text = await ocr_stage(contents)
+    except Exception as e:
+        raise OCRFailed(str(e)) from e
+
+    return await process_text(
+        raw_text, phone_number=phone_number, as_audio=as_audio, cancel_token=token, audio_format=audio_format
+    )
+
+
+async def process_text(
+    raw_text: str,
+    phone_number: Optional[str] = None,
+    as_audio: bool = False,
+    cancel_token: Optional[CancellationToken] = None,
+    audio_format: Optional[str] = None,
+) -> PipelineResult:
+    """Pipeline a partir do texto já extraído (OCR ou documento obtido de um tribunal)"""
+    token = cancel_token or CancellationToken()
+    token.raise_if_cancelled()
+    normalization = normalize_stage(raw_text)
+    process_numbers = extract_cnj_numbers(raw_text)
+
+    near_duplicate = None
+    service_tier = "full"
+    template = template_stage(normalization.text)
+    if template:
+        simplified = template.simplified
+        record_simplification("template", template.document_type)
+    else:
+        fingerprint, near_duplicate = await near_duplicate_stage(normalization.text, process_numbers)
+        if near_duplicate:
+            simplified = near_duplicate.simplified
+            record_simplification("near_duplicate")
+        else:
+            token.raise_if_cancelled()
+            tier = tier_stage()
+            service_tier = tier.name
+            if not tier.use_llm:
+                simplified, template = fallback_stage(normalization.text)
+            else:
+                simplified = await simplify_stage(normalization.text, cancel_token=token, tier=tier)
+                if tier.name == "full":
+                    # Respostas degradadas não são reaproveitadas para outros documentos
+                    await remember_stage(fingerprint, raw_text, process_numbers, simplified)
+    record_served_tier(service_tier)
+    payload_text = compose_stage(simplified)
+
+    token.raise_if_cancelled()
+    delivery = await deliver_stage(payload_text, phone_number=phone_number, as_audio=as_audio, audio_format=audio_format)
+    return PipelineResult(
+        raw_text, simplified, payload_text, delivery, normalization, template, near_duplicate,
+        process_numbers=process_numbers, service_tier=service_tier,
+    )
@@ -0,0 +1,403 @@
+"""
+Profiling sob demanda, em produção, sem redeploy
+
+Três modos, controlados pelos endpoints /admin/profiling (X-Admin-Token):
+
+- Requisição: a requisição marcada pelo header `X-Profile` (com token
+  administrativo) ou sorteada pela taxa de amostragem é perfilada. O event loop
+  é capturado com pyinstrument (se instalado, entende corrotinas) ou cProfile;
+  os trechos bloqueantes que rodam em thread (OCR, LLM) ganham um cProfile
+  próprio. A resposta traz o header `X-Profile-Id`.
+- torch: as próximas N chamadas ao generate são capturadas pelo
+  torch.profiler e exportadas como trace do Chrome (chrome://tracing, Perfetto).
+- Event loop: mede o atraso do loop (métrica Prometheus) e, quando um passo de
+  corrotina segura o loop por mais que o limite, registra no log a pilha do
+  código que está bloqueando.
+
+As capturas ficam em `settings.profiling_dir`, limitado em número de arquivos
+e bytes (os mais antigos são apagados). O estado é por processo: com vários
+workers, cada um tem o seu.
+"""
+
+import asyncio
+import contextvars
+import cProfile
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+from ..config.config import settings
+from .metrics import record_loop_block, record_loop_lag
+
+try:
+    from pyinstrument import Profiler as AsyncProfiler
+except ImportError:  # pyinstrument é opcional; sem ele, cProfile no event loop
+    AsyncProfiler = None
+
+logger = logging.getLogger(__name__)
+
+_CAPTURE_NAME = re.compile(r"[A-Za-z0-9_.-]+")
+
+
+class CaptureStore:
+    """Diretório de capturas limitado em arquivos e bytes (apaga as mais antigas)"""
+
+    def __init__(self, directory: str, max_files: int, max_bytes: int):
+        self.directory = directory
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def new_path(self, kind: str, extension: str) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+        return os.path.join(self.directory, f"{kind}-{stamp}-{uuid.uuid4().hex[:6]}.{extension}")
+
+    def list(self) -> List[Dict[str, object]]:
+        """Capturas da mais recente para a mais antiga"""
+        if not os.path.isdir(self.directory):
+            return []
+        captures = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file():
+                stat = entry.stat()
+                captures.append({"name": entry.name, "bytes": stat.st_size, "modified": stat.st_mtime})
+        return sorted(captures, key=lambda c: c["modified"], reverse=True)
+
+    def enforce_limits(self):
+        with self._lock:
+            captures = self.list()
+            total = sum(c["bytes"] for c in captures)
+            while captures and (len(captures) > self.max_files or total > self.max_bytes):
+                oldest = captures.pop()
+                total -= oldest["bytes"]
+                try:
+                    os.remove(os.path.join(self.directory, oldest["name"]))
+                except OSError:
+                    pass
+
+    def resolve(self, name: str) -> Optional[str]:
+        """Caminho de uma captura pelo nome (sem permitir sair do diretório)"""
+        if not _CAPTURE_NAME.fullmatch(name) or name.startswith("."):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+
+_store: Optional[CaptureStore] = None
+
+
+def get_capture_store() -> CaptureStore:
+    global _store
+    if _store is None:
+        _store = CaptureStore(settings.profiling_dir, settings.profiling_max_files, settings.profiling_max_bytes)
+    return _store
+
+
+# ---------------------------------------------------------------------------
+# Requisições
+
+@dataclass
+class RequestProfile:
+    """Captura de uma requisição: arquivos gerados no event loop e nas threads"""
+    capture_id: str
+    trigger: str
+    files: List[str] = field(default_factory=list)
+
+
+_current: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar("request_profile", default=None)
+# Um cProfile por thread: no event loop, só uma requisição por vez é capturada com ele
+_loop_cprofile = threading.Lock()
+_sample_rate = settings.profiling_sample_rate
+
+
+def set_sample_rate(rate: float):
+    """Fração das requisições perfiladas (0 desliga a amostragem)"""
+    global _sample_rate
+    _sample_rate = min(1.0, max(0.0, rate))
+
+
+def should_sample() -> bool:
+    return _sample_rate > 0 and random.random() < _sample_rate
+
+
+_cprofile_unavailable_logged = False
+
+
+def _start_cprofile() -> Optional[cProfile.Profile]:
+    """
+    cProfile ligado, ou None se outro profiler já estiver ativo
+
+    No Python 3.12+ o cProfile usa sys.monitoring e `enable()` falha com
+    ValueError se houver outro profiler na mesma thread (depurador, coverage,
+    um cProfile aninhado). O trecho então roda sem profiling; o aviso sai uma vez.
+    """
+    global _cprofile_unavailable_logged
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:
+        if not _cprofile_unavailable_logged:
+            _cprofile_unavailable_logged = True
+            logger.warning(f"cProfile indisponível (outro profiler ativo); trechos seguem sem profiling: {e}")
+        return None
+    return profiler
+
+
+def _save_cprofile(profiler: cProfile.Profile, kind: str) -> str:
+    store = get_capture_store()
+    path = store.new_path(kind, "prof")
+    profiler.dump_stats(path)
+    store.enforce_limits()
+    return os.path.basename(path)
+
+
+@contextmanager
+def profile_request(trigger: str) -> Iterator[RequestProfile]:
+    """Perfila o bloco no event loop; trechos em thread entram via `profile_section`"""
+    profile = RequestProfile(uuid.uuid4().hex[:12], trigger)
+    reset = _current.set(profile)
+    async_profiler = cprofile = None
+    if AsyncProfiler is not None:
+        async_profiler = AsyncProfiler(async_mode="enabled")
+        async_profiler.start()
+    elif _loop_cprofile.acquire(blocking=False):
+        cprofile = _start_cprofile()
+        if cprofile is None:
+            _loop_cprofile.release()
+    start = time.perf_counter()
+    try:
+        yield profile
+    finally:
+        elapsed = time.perf_counter() - start
+        _current.reset(reset)
+        try:
+            store = get_capture_store()
+            if async_profiler is not None:
+                async_profiler.stop()
+                path = store.new_path(f"request-{profile.capture_id}", "html")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(async_profiler.output_html())
+                profile.files.append(os.path.basename(path))
+            elif cprofile is not None:
+                cprofile.disable()
+                profile.files.append(_save_cprofile(cprofile, f"request-{profile.capture_id}"))
+            store.enforce_limits()
+            logger.info(
+                f"Profiling da requisição {profile.capture_id} ({trigger}, {elapsed * 1000:.0f} ms): "
+                f"{', '.join(profile.files) or 'nenhuma captura'}"
+            )
+        except Exception as e:
+            logger.warning(f"Erro ao gravar o profiling da requisição {profile.capture_id}: {e}")
+        finally:
+            if cprofile is not None:
+                _loop_cprofile.release()
+
+
+@contextmanager
+def profile_section(name: str) -> Iterator[None]:
+    """cProfile de um trecho bloqueante (em thread) quando a requisição está sendo perfilada"""
+    profile = _current.get()
+    profiler = _start_cprofile() if profile is not None else None
+    if profiler is None:
+        yield
+        return
+    try:
+        yield
+    finally:
+        profiler.disable()
+        try:
+            profile.files.append(_save_cprofile(profiler, f"request-{profile.capture_id}-{name}"))
+        except Exception as e:
+            logger.warning(f"Erro ao gravar o profiling do trecho {name}: {e}")
+
+
+def run_profiled(name: str, func: Callable, *args):
+    """`func(*args)` dentro de `profile_section` (para asyncio.to_thread, que copia o contexto)"""
+    with profile_section(name):
+        return func(*args)
+
+
+# ---------------------------------------------------------------------------
+# torch.profiler
+
+_torch_calls = 0
+_torch_lock = threading.Lock()
+
+
+def arm_torch_profiler(calls: int):
+    """Captura as próximas `calls` chamadas ao generate (0 cancela)"""
+    global _torch_calls
+    with _torch_lock:
+        _torch_calls = max(0, calls)
+
+
+def torch_calls_remaining() -> int:
+    return _torch_calls
+
+
+def _take_torch_call() -> bool:
+    global _torch_calls
+    with _torch_lock:
+        if _torch_calls <= 0:
+            return False
+        _torch_calls -= 1
+        return True
+
+
+@contextmanager
+def torch_profile(label: str) -> Iterator[None]:
+    """Captura o bloco com torch.profiler se houver chamadas armadas; exporta trace do Chrome"""
+    if not _take_torch_call():
+        yield
+        return
+
+    import torch
+
+    activities = [torch.profiler.ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(torch.profiler.ProfilerActivity.CUDA)
+    profiler = torch.profiler.profile(activities=activities, record_shapes=True, profile_memory=True)
+    with profiler:
+        yield
+    try:
+        store = get_capture_store()
+        path = store.new_path(f"torch-{label}", "json")
+        profiler.export_chrome_trace(path)
+        store.enforce_limits()
+        logger.info(f"Trace do torch.profiler gravado: {os.path.basename(path)}")
+    except Exception as e:
+        logger.warning(f"Erro ao exportar o trace do torch.profiler: {e}")
+
+
+# ---------------------------------------------------------------------------
+# Event loop
+
+class LoopMonitor:
+    """
+    Atraso do event loop e detecção de chamadas bloqueantes
+
+    Uma tarefa no loop registra um batimento a cada `interval`; o atraso de
+    cada batimento vira métrica. Uma thread vigia os batimentos: se o loop
+    ficar parado por mais de `threshold`, a pilha da thread do loop (o passo
+    de corrotina que está bloqueando) é registrada no log, uma vez por bloqueio.
+    """
+
+    def __init__(self, interval: float, threshold: float):
+        self.interval = interval
+        self.threshold = threshold
+        self.blocks = 0
+        self._task: Optional[asyncio.Task] = None
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._heartbeat = time.monotonic()
+        self._loop_thread: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Inicia no event loop atual"""
+        if self.running:
+            return
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._beat())
+        self._watcher = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watcher.start()
+        logger.info(f"Monitor do event loop ativo (bloqueios acima de {self.threshold * 1000:.0f} ms)")
+
+    async def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._watcher is not None:
+            await asyncio.to_thread(self._watcher.join)
+            self._watcher = None
+
+    async def _beat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            record_loop_lag(max(0.0, loop.time() - expected))
+            self._heartbeat = time.monotonic()
+
+    def _watch(self):
+        reported = None  # batimento do bloqueio já registrado
+        while not self._stop.wait(min(self.interval, self.threshold / 2)):
+            heartbeat = self._heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled <= self.threshold:
+                if reported is not None and heartbeat != reported:
+                    logger.warning(f"Event loop liberado após {(heartbeat - reported - self.interval) * 1000:.0f} ms")
+                    reported = None
+                continue
+            if reported is not None:
+                continue
+            reported = heartbeat
+            self.blocks += 1
+            record_loop_block()
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "(pilha indisponível)\n"
+            logger.warning(f"Event loop bloqueado há {stalled * 1000:.0f} ms; pilha da thread do loop:\n{stack}")
+
+
+_monitor: Optional[LoopMonitor] = None
+
+
+def get_loop_monitor() -> Optional[LoopMonitor]:
+    return _monitor
+
+
+def start_loop_monitor(threshold_ms: Optional[float] = None) -> LoopMonitor:
+    """Inicia (ou reinicia com novo limite) o monitor no event loop atual"""
+    global _monitor
+    threshold = (threshold_ms or settings.loop_block_threshold_ms) / 1000
+    if _monitor is not None and _monitor.running:
+        _monitor.threshold = threshold
+        return _monitor
+    _monitor = LoopMonitor(settings.loop_monitor_interval_ms / 1000, threshold)
+    _monitor.start()
+    return _monitor
+
+
+async def stop_loop_monitor():
+    global _monitor
+    if _monitor is not None:
+        await _monitor.stop()
+        _monitor = None
+
+
+def loop_monitor_status() -> Dict[str, object]:
+    monitor = get_loop_monitor()
+    return {
+        "enabled": bool(monitor and monitor.running),
+        "threshold_ms": monitor.threshold * 1000 if monitor else settings.loop_block_threshold_ms,
+        "blocks_detected": monitor.blocks if monitor else 0,
+    }
+
+
+def profiling_status() -> Dict[str, object]:
+    """Estado dos três modos e capturas disponíveis (lê o diretório: chamar fora do event loop)"""
+    return {
+        "request_sample_rate": _sample_rate,
+        "request_profiler": "pyinstrument" if AsyncProfiler is not None else "cprofile",
+        "torch_calls_remaining": _torch_calls,
+        "loop_monitor": loop_monitor_status(),
+        "captures": get_capture_store().list(),
+    }
@@ -0,0 +1,100 @@
+"""
+Busca de documentos de processos em fontes externas (tribunais)
+
+`/process-number` consulta primeiro o índice local; só quando o processo não
+está indexado recorre ao fetcher configurado em `settings.court_fetcher`.
+Novas fontes (APIs de tribunais, DataJud etc.) implementam `CourtFetcher` e
+entram no registro `COURT_FETCHERS`; integrações reais exigem verificação
+legal/termos de uso de cada tribunal.
+
+Fetchers disponíveis:
+- "none": nenhuma fonte externa (padrão);
+- "local": arquivos `<20 dígitos>.txt` em `settings.court_fetcher_dir`
+  (substituto local para desenvolvimento e testes).
+"""
+
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Protocol
+
+from ..config.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FetchedDocument:
+    """Texto de um documento do processo obtido de uma fonte externa"""
+    process_number: str
+    text: str
+    source: str
+
+
+class CourtFetcher(Protocol):
+    """Fonte de documentos por número CNJ (20 dígitos, já validado)"""
+
+    name: str
+
+    async def fetch(self, process_number: str) -> Optional[FetchedDocument]:
+        ...
+
+
+class NullFetcher:
+    """Sem fonte externa: processos não indexados não são encontrados"""
+
+    name = "none"
+
+    async def fetch(self, process_number: str) -> Optional[FetchedDocument]:
+        return None
+
+
+class LocalDirectoryFetcher:
+    """Lê o texto do documento de `<diretório>/<número>.txt`"""
+
+    name = "local"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _read(self, process_number: str) -> Optional[str]:
+        path = os.path.join(self.directory, f"{process_number}.txt")
+        if not os.path.isfile(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    async def fetch(self, process_number: str) -> Optional[FetchedDocument]:
+        text = await asyncio.to_thread(self._read, process_number)
+        if not text:
+            return None
+        return FetchedDocument(process_number, text, self.name)
+
+
+COURT_FETCHERS: Dict[str, Callable[[], CourtFetcher]] = {
+    "none": NullFetcher,
+    "local": lambda: LocalDirectoryFetcher(settings.court_fetcher_dir),
+}
+
+_fetcher: Optional[CourtFetcher] = None
+
+
+def get_court_fetcher() -> CourtFetcher:
+    """Fetcher configurado (criado no primeiro uso)"""
+    global _fetcher
+    if _fetcher is None:
+        name = (settings.court_fetcher or "none").lower()
+        if name not in COURT_FETCHERS:
+            raise ValueError(
+                f"Fetcher de processos desconhecido: '{name}'. Opções: {', '.join(sorted(COURT_FETCHERS))}"
+            )
+        _fetcher = COURT_FETCHERS[name]()
+        logger.info(f"Fetcher de processos: {name}")
+    return _fetcher
+
+
+def set_court_fetcher(fetcher: Optional[CourtFetcher]):
+    """Substitui o fetcher (integrações externas ou substitutos em testes)"""
+    global _fetcher
+    _fetcher = fetcher
@@ -1,4 +1,3 @@
-import httpx
 from ..config.config import settings
 
 async def send_whatsapp_text(to_number: str, text: str):
@@ -9,6 +8,8 @@ async def send_whatsapp_text(to_number: str, text: str):
     if not settings.whatsapp_api_url:
         raise RuntimeError("WHATSAPP_API_URL not configured")
 
+    import httpx
+
     async with httpx.AsyncClient(timeout=30.0) as client:
         payload = {
             "to": to_number,
@@ -23,6 +24,39 @@ async def send_whatsapp_text(to_number: str, text: str):
         r.raise_for_status()
         return r.json()
 
-async def send_whatsapp_audio(to_number: str, audio_bytes: bytes, filename: str = "explanation.mp3"):
-    # Implement according to provider. Many require multipart/form-data upload or a hosted URL for media.
-    raise NotImplementedError("Implement provider-specific audio upload")
\ No newline at end of file
+def _media_url() -> str:
+    """Media upload endpoint: WHATSAPP_MEDIA_URL or WHATSAPP_API_URL with /messages replaced by /media"""
+    if settings.whatsapp_media_url:
+        return settings.whatsapp_media_url
+    base = settings.whatsapp_api_url.rstrip("/")
+    if base.endswith("/messages"):
+        return base[: -len("/messages")] + "/media"
+    raise RuntimeError("WHATSAPP_MEDIA_URL not configured")
+
+async def send_whatsapp_audio(to_number: str, audio_bytes: bytes, filename: str = "explanation.ogg", media_type: str = "audio/ogg"):
+    """
+    Uploads the audio as media and sends it as an audio message (Meta Cloud API flow).
+    Opus in OGG (audio/ogg) is shown as a voice note; MP3 arrives as an audio file.
+    """
+    if not settings.whatsapp_api_url:
+        raise RuntimeError("WHATSAPP_API_URL not configured")
+
+    import httpx
+
+    headers = {"Authorization": f"Bearer {settings.whatsapp_api_token}"}
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        r = await client.post(
+            _media_url(),
+            data={"messaging_product": "whatsapp", "type": media_type},
+            files={"file": (filename, audio_bytes, media_type)},
+            headers=headers,
+        )
+        r.raise_for_status()
+        payload = {
+            "to": to_number,
+            "type": "audio",
+            "audio": {"id": r.json()["id"]}
+        }
+        r = await client.post(settings.whatsapp_api_url, json=payload, headers={**headers, "Content-Type": "application/json"})
+        r.raise_for_status()
+        return r.json()
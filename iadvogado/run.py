@@ -23,16 +23,23 @@ if parent_dir not in sys.path:
 # Mudar para o diretório raiz para garantir imports corretos
 os.chdir(parent_dir)
 
+import logging
 import uvicorn
-from iadvogado.api.main import app
 from iadvogado.config.config import settings
+from iadvogado.core.metrics import reset_multiprocess_dir
+from iadvogado.api.static_assets import precompress
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    reset_multiprocess_dir()
+    precompress()  # gera/atualiza static/*.br e *.gz
     print(f"🚀 Iniciando IADvogado em http://{settings.fastapi_host}:{settings.fastapi_port}")
     print(f"📱 Chatbot disponível em http://localhost:{settings.fastapi_port}/")
     print(f"📚 API Docs: http://localhost:{settings.fastapi_port}/docs")
+    # App passado como string de import: necessário para o reload funcionar
+    # e mantém o processo supervisor leve (só os workers importam a API)
     uvicorn.run(
-        app,
+        "iadvogado.api.main:app",
         host=settings.fastapi_host,
         port=settings.fastapi_port,
         reload=True
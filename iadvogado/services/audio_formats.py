@@ -0,0 +1,112 @@
+"""
+Formatos de áudio da síntese de voz: MP3 e Opus/OGG
+
+Os provedores de TTS entregam MP3. Opus em OGG (o formato das mensagens de voz
+do WhatsApp) fica bem menor para fala em baixa taxa de bits. A conversão é
+feita pelo ffmpeg em streaming: os pedaços de MP3 entram no ffmpeg à medida
+que o provedor os gera, então a transcodificação se sobrepõe à síntese em vez
+de somar à latência. Sem ffmpeg instalado, o áudio é entregue em MP3.
+"""
+
+import asyncio
+import logging
+import shutil
+from dataclasses import dataclass
+from typing import AsyncIterable, Callable, Dict, List, Optional
+
+from ..config.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TranscodeError(Exception):
+    """Falha do ffmpeg ao converter o áudio"""
+
+
+@dataclass(frozen=True)
+class AudioFormat:
+    """Formato de saída: extensão do cache, media type e argumentos do encoder no ffmpeg"""
+    name: str
+    extension: str
+    media_type: str
+    encoder: Optional[Callable[[], List[str]]] = None  # None: formato nativo dos provedores
+
+
+def _opus_encoder() -> List[str]:
+    # VoIP: otimizado para fala; mono basta para voz
+    return ["-c:a", "libopus", "-b:a", settings.tts_opus_bitrate, "-application", "voip", "-ac", "1", "-f", "ogg"]
+
+
+MP3 = AudioFormat("mp3", "mp3", "audio/mpeg")
+OPUS = AudioFormat("opus", "ogg", "audio/ogg", _opus_encoder)
+
+AUDIO_FORMATS: Dict[str, AudioFormat] = {fmt.name: fmt for fmt in (MP3, OPUS)}
+AUDIO_EXTENSIONS = tuple(f".{fmt.extension}" for fmt in AUDIO_FORMATS.values())
+
+
+@dataclass
+class SynthesizedAudio:
+    """Áudio gerado e o formato em que foi entregue"""
+    data: bytes
+    format: AudioFormat
+
+
+def resolve_audio_format(name: Optional[str] = None) -> AudioFormat:
+    """Formato pelo nome (padrão: `settings.tts_audio_format`); ValueError se desconhecido"""
+    name = (name or settings.tts_audio_format or "mp3").lower()
+    if name not in AUDIO_FORMATS:
+        raise ValueError(f"Formato de áudio desconhecido: '{name}'. Opções: {', '.join(sorted(AUDIO_FORMATS))}")
+    return AUDIO_FORMATS[name]
+
+
+_transcoder_checked: Dict[str, bool] = {}
+
+
+def transcoder_available() -> bool:
+    path = settings.ffmpeg_path
+    if path not in _transcoder_checked:
+        _transcoder_checked[path] = shutil.which(path) is not None
+        if not _transcoder_checked[path]:
+            logger.warning(f"ffmpeg não encontrado ({path}): áudio será entregue em MP3")
+    return _transcoder_checked[path]
+
+
+def deliverable_format(fmt: AudioFormat) -> AudioFormat:
+    """O formato pedido, ou MP3 se ele exigir o ffmpeg e ele não estiver instalado"""
+    if fmt.encoder is not None and not transcoder_available():
+        return MP3
+    return fmt
+
+
+async def single_chunk(data: bytes) -> AsyncIterable[bytes]:
+    yield data
+
+
+async def transcode(chunks: AsyncIterable[bytes], fmt: AudioFormat) -> bytes:
+    """Converte um stream de MP3 para `fmt`, alimentando o ffmpeg enquanto os pedaços chegam"""
+    process = await asyncio.create_subprocess_exec(
+        settings.ffmpeg_path, "-hide_banner", "-loglevel", "error", "-f", "mp3", "-i", "pipe:0", "-vn",
+        *fmt.encoder(), "pipe:1",
+        stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+
+    async def feed():
+        try:
+            async for chunk in chunks:
+                process.stdin.write(chunk)
+                await process.stdin.drain()
+        finally:
+            process.stdin.close()
+
+    try:
+        _, output, errors = await asyncio.gather(feed(), process.stdout.read(), process.stderr.read())
+        returncode = await process.wait()
+    except BaseException:
+        # Falha na síntese, cancelamento ou ffmpeg encerrado antes da hora
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    if returncode != 0:
+        raise TranscodeError(f"ffmpeg saiu com código {returncode}: {errors.decode('utf-8', 'replace')[-300:]}")
+    return output
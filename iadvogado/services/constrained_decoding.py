@@ -0,0 +1,232 @@
+"""
+Decodificação restrita ao JSON de três chaves do IADvogado
+
+O modelo só pode gerar exatamente:
+
+    {"what_happened": "...", "what_it_means": "...", "what_to_do_now": "..."}
+
+- JsonSchemaLogitsProcessor mascara, a cada passo, os tokens que quebrariam o
+  formato (trechos fixos são forçados; dentro das strings não são permitidos
+  aspas, barra invertida nem caracteres de controle).
+- JsonObjectStoppingCriteria encerra a geração assim que o objeto fecha, sem
+  gastar tokens depois do '}'.
+- Se o limite de tokens for atingido antes, `JsonSchemaGuide.suffix()` devolve
+  o trecho que fecha o JSON, então o resultado sempre é parseável; o corte é
+  contado em iadvogado_llm_truncated_total (LlamaClient._parse_constrained).
+
+As máscaras são pré-computadas por estado e reaproveitadas entre requisições
+(TokenVocabulary fica em cache no LlamaClient).
+"""
+
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import torch
+from transformers import LogitsProcessor, StoppingCriteria
+
+logger = logging.getLogger(__name__)
+
+
+def schema_literals(keys: Sequence[str]) -> List[str]:
+    """Trechos fixos entre as strings livres: '{"k1": "', '", "k2": "', ..., '"}'"""
+    literals = [f'{{"{keys[0]}": "']
+    for key in keys[1:]:
+        literals.append(f'", "{key}": "')
+    literals.append('"}')
+    return literals
+
+
+class TokenVocabulary:
+    """Texto de cada token do vocabulário e máscaras de tokens permitidos"""
+
+    def __init__(self, tokenizer):
+        size = len(tokenizer)
+        special_ids = set(getattr(tokenizer, "all_special_ids", []) or [])
+        texts = tokenizer.batch_decode([[i] for i in range(size)], skip_special_tokens=False)
+
+        self.size = size
+        self.tokenizer_id = id(tokenizer)
+        self.eos_token_id = tokenizer.eos_token_id
+        self.texts: List[str] = texts
+        self.ids_by_text: Dict[str, List[int]] = {}
+        content = torch.zeros(size, dtype=torch.bool)
+
+        for token_id, text in enumerate(texts):
+            if token_id in special_ids or not text:
+                continue
+            self.ids_by_text.setdefault(text, []).append(token_id)
+            # Dentro da string: nada de aspas, barra invertida ou controle.
+            # Tokens de bytes parciais (UTF-8 incompleto) decodificam como U+FFFD e são conteúdo.
+            if '"' not in text and "\\" not in text and all(ch >= " " for ch in text):
+                content[token_id] = True
+
+        self.content_mask = content
+        self._masks: Dict[Tuple, torch.Tensor] = {}
+        self._device_masks: Dict[Tuple, torch.Tensor] = {}
+
+    def _prefix_ids(self, target: str) -> List[int]:
+        """Tokens cujo texto é prefixo não vazio de `target`"""
+        ids: List[int] = []
+        for end in range(1, len(target) + 1):
+            ids.extend(self.ids_by_text.get(target[:end], ()))
+        return ids
+
+    def mask(self, key: Tuple, target: Optional[str], with_content: bool) -> torch.Tensor:
+        """Máscara booleana (em cache) para um estado do autômato"""
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = self.content_mask.clone() if with_content else torch.zeros(self.size, dtype=torch.bool)
+            if target:
+                mask[self._prefix_ids(target)] = True
+            elif target is None and self.eos_token_id is not None:
+                mask[self.eos_token_id] = True
+            self._masks[key] = mask
+        return mask
+
+    def on_device(self, mask: torch.Tensor, device, vocab_size: int) -> torch.Tensor:
+        """Cópia da máscara no dispositivo e no tamanho dos logits (em cache)"""
+        key = (id(mask), str(device), vocab_size)
+        cached = self._device_masks.get(key)
+        if cached is None:
+            # O embedding pode ter mais posições que o tokenizer; as extras ficam bloqueadas
+            cached = torch.zeros(vocab_size, dtype=torch.bool)
+            size = min(vocab_size, mask.shape[0])
+            cached[:size] = mask[:size]
+            cached = cached.to(device)
+            self._device_masks[key] = cached
+        return cached
+
+
+class _RowState:
+    """Posição de uma sequência no autômato do JSON"""
+
+    __slots__ = ("segment", "offset", "in_string", "content_len", "done", "broken", "consumed")
+
+    def __init__(self):
+        self.segment = 0        # índice do trecho fixo atual (ou da string que o antecede)
+        self.offset = 0         # caracteres já emitidos do trecho fixo
+        self.in_string = False
+        self.content_len = 0
+        self.done = False
+        self.broken = False
+        self.consumed = 0       # tokens gerados já processados
+
+
+class JsonSchemaGuide:
+    """Estado compartilhado entre o logits processor e o stopping criteria"""
+
+    def __init__(self, vocabulary: TokenVocabulary, keys: Sequence[str], prompt_length: int):
+        self.vocabulary = vocabulary
+        self.literals = schema_literals(keys)
+        self.prompt_length = prompt_length
+        self.rows: Dict[int, _RowState] = {}
+
+    def _consume(self, state: _RowState, text: str):
+        for ch in text:
+            if state.done:
+                state.broken = True
+                return
+            if state.in_string:
+                if ch == '"':
+                    state.in_string = False
+                    state.segment += 1
+                    state.offset = 1
+                    self._maybe_finish_literal(state)
+                else:
+                    state.content_len += 1
+                continue
+
+            literal = self.literals[state.segment]
+            if ch != literal[state.offset]:
+                state.broken = True
+                return
+            state.offset += 1
+            self._maybe_finish_literal(state)
+
+    def _maybe_finish_literal(self, state: _RowState):
+        if state.offset < len(self.literals[state.segment]):
+            return
+        if state.segment == len(self.literals) - 1:
+            state.done = True
+        else:
+            state.in_string = True
+            state.content_len = 0
+
+    def sync(self, input_ids: torch.LongTensor):
+        """Processa os tokens gerados desde a última chamada"""
+        for row in range(input_ids.shape[0]):
+            state = self.rows.setdefault(row, _RowState())
+            start = self.prompt_length + state.consumed
+            new_ids = input_ids[row, start:].tolist()
+            state.consumed += len(new_ids)
+            # Em lotes, linhas já encerradas recebem padding até o fim da geração
+            if state.broken or state.done:
+                continue
+            for token_id in new_ids:
+                text = self.vocabulary.texts[token_id] if token_id < self.vocabulary.size else ""
+                self._consume(state, text)
+
+    def allowed(self, row: int) -> Optional[torch.Tensor]:
+        """Máscara de tokens permitidos para a sequência (None = sem restrição)"""
+        state = self.rows.get(row)
+        if state is None or state.broken:
+            return None
+        if state.done:
+            return self.vocabulary.mask(("done",), None, with_content=False)
+        if state.in_string:
+            # A string precisa de pelo menos um caractere antes de fechar
+            closing = self.literals[state.segment + 1] if state.content_len else ""
+            return self.vocabulary.mask(("str", state.segment, bool(state.content_len)), closing, with_content=True)
+        remaining = self.literals[state.segment][state.offset:]
+        return self.vocabulary.mask(("lit", state.segment, state.offset), remaining, with_content=False)
+
+    def is_done(self, row: int) -> bool:
+        state = self.rows.get(row)
+        return bool(state and state.done)
+
+    def is_broken(self, row: int = 0) -> bool:
+        state = self.rows.get(row)
+        return bool(state and state.broken)
+
+    def suffix(self, row: int = 0) -> str:
+        """Texto que fecha o JSON caso a geração pare antes do '}'"""
+        state = self.rows.get(row) or _RowState()
+        if state.done:
+            return ""
+        if state.in_string:
+            return "".join(self.literals[state.segment + 1:])
+        return self.literals[state.segment][state.offset:] + "".join(self.literals[state.segment + 1:])
+
+
+class JsonSchemaLogitsProcessor(LogitsProcessor):
+    """Aplica a máscara do autômato aos logits de cada passo"""
+
+    def __init__(self, guide: JsonSchemaGuide):
+        self.guide = guide
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        self.guide.sync(input_ids)
+        vocab_size = scores.shape[-1]
+        for row in range(scores.shape[0]):
+            allowed = self.guide.allowed(row)
+            if allowed is None:
+                continue
+            if not bool(allowed.any()):
+                logger.warning("Decodificação restrita sem tokens válidos; liberando a sequência")
+                self.guide.rows[row].broken = True
+                continue
+            device_mask = self.guide.vocabulary.on_device(allowed, scores.device, vocab_size)
+            scores[row] = scores[row].masked_fill(~device_mask, float("-inf"))
+        return scores
+
+
+class JsonObjectStoppingCriteria(StoppingCriteria):
+    """Encerra a geração assim que o objeto JSON de nível superior fecha"""
+
+    def __init__(self, guide: JsonSchemaGuide):
+        self.guide = guide
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        self.guide.sync(input_ids)
+        done = [self.guide.is_done(row) for row in range(input_ids.shape[0])]
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
@@ -0,0 +1,354 @@
+"""
+Caminho rápido por modelos de documento: evita o LLM em documentos rotineiros
+
+Intimações para audiência, citações e despachos de mero expediente têm
+explicação praticamente fixa; só mudam datas, horários, prazos e a vara. Um
+classificador por palavras-chave (expressões pré-compiladas com pesos) identifica
+o tipo do documento e, se a confiança for suficiente e os campos obrigatórios
+forem encontrados, a resposta é montada a partir de um modelo parametrizado em
+milissegundos. Documentos com decisões de mérito, liminares, penhoras etc. nunca
+entram no caminho rápido e seguem para o LLM.
+"""
+
+import re
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Callable, Dict, List, Optional, Pattern, Tuple
+
+MONTHS = (
+    "janeiro", "fevereiro", "março", "abril", "maio", "junho",
+    "julho", "agosto", "setembro", "outubro", "novembro", "dezembro",
+)
+
+_FLAGS = re.IGNORECASE
+
+# Conteúdo que exige leitura cuidadosa: sempre vai para o LLM
+_NEEDS_MODEL = re.compile(
+    r"\bjulgo\s+(procedente|improcedente|extint)|\bcondeno\b|\bsenten[çc]a\b|\bac[óo]rd[ãa]o\b"
+    r"|\bpenhora|\bbloqueio\b|\bdespejo\b|\bpris[ãa]o\b|\bliminar\b|\btutela\s+(de\s+urg[êe]ncia|antecipada)"
+    r"|\bmulta\b|\bhomologo\b",
+    _FLAGS,
+)
+
+_DATE_NUMERIC = re.compile(r"\b(\d{1,2})/(\d{1,2})/(\d{2,4})\b")
+_DATE_LONG = re.compile(r"\b(\d{1,2})º?\s+de\s+(" + "|".join(MONTHS).replace("ç", "[çc]") + r")\s+de\s+(\d{4})\b", _FLAGS)
+_TIME = re.compile(r"\b([01]?\d|2[0-3])\s*(?:h|:|horas?)\s*([0-5]\d)?\b(?!/)", _FLAGS)
+_HEARING = re.compile(r"\baudi[êe]ncia\b", _FLAGS)
+# Designação da audiência ("designo audiência...", "audiência ... designada para")
+_HEARING_DESIGNATION = re.compile(
+    r"\baudi[êe]ncia\b[^.]{0,80}\b(?:re)?designad[ao]\b|\b(?:re)?design(?:o|ou)\b[^.]{0,40}\baudi[êe]ncia\b", _FLAGS
+)
+_HEARING_KIND = re.compile(
+    r"\baudi[êe]ncia\s+(?:de\s+)?(concilia[çc][ãa]o|media[çc][ãa]o|instru[çc][ãa]o(?:\s+e\s+julgamento)?|una)\b", _FLAGS
+)
+_DEADLINE = re.compile(
+    r"\bprazo\s*(?:legal\s*)?(?:de|:)?\s*(\d{1,3})\s*(?:\([^)]{1,30}\))?\s*(dias?\s+[úu]teis|dias?|horas)\b", _FLAGS
+)
+_COURT = re.compile(r"\b(\d{1,2}\s*[ªºa°]?\s*Vara\b[^,.;:\n]{0,60}|Juizado\s+Especial\b[^,.;:\n]{0,60})", _FLAGS)
+
+# Janelas de busca da data a partir da designação e da menção à audiência
+_DESIGNATION_WINDOW = 150
+_HEARING_WINDOW = 250
+
+
+@dataclass
+class DocumentTemplate:
+    """
+    Tipo de documento: indicadores com peso, exclusões, âncoras, campos obrigatórios e modelo de resposta
+
+    Se houver âncoras, ao menos uma precisa aparecer (a forma operativa do ato,
+    como "cite-se"); sem ela, indicadores acessórios não bastam.
+    """
+    name: str
+    indicators: Tuple[Tuple[Pattern[str], float], ...]
+    render: Callable[[Dict[str, str]], Dict[str, str]]
+    excludes: Tuple[Pattern[str], ...] = ()
+    anchors: Tuple[Pattern[str], ...] = ()
+    required: Tuple[str, ...] = ()
+
+    def score(self, text: str) -> float:
+        if any(pattern.search(text) for pattern in self.excludes):
+            return 0.0
+        if self.anchors and not any(pattern.search(text) for pattern in self.anchors):
+            return 0.0
+        return min(1.0, sum(weight for pattern, weight in self.indicators if pattern.search(text)))
+
+
+@dataclass
+class TemplateMatch:
+    """Resposta gerada por modelo (sem LLM)"""
+    document_type: str
+    confidence: float
+    fields: Dict[str, str]
+    simplified: Dict[str, str] = field(default_factory=dict)
+
+
+def _to_date(day: str, month: int, year: str) -> Optional[date]:
+    year = year if len(year) == 4 else f"20{year}"
+    try:
+        return date(int(year), month, int(day))
+    except ValueError:
+        return None
+
+
+def _format_date(value: date) -> str:
+    return f"{value.day} de {MONTHS[value.month - 1]} de {value.year}"
+
+
+def _dates(text: str, start: int, end: int) -> List[Tuple[int, int, date]]:
+    """Datas válidas (numéricas ou por extenso) em text[start:end]: (início, fim, data), em ordem"""
+    found = []
+    for match in _DATE_NUMERIC.finditer(text, start, end):
+        value = _to_date(match.group(1), int(match.group(2)), match.group(3))
+        if value:
+            found.append((match.start(), match.end(), value))
+    for match in _DATE_LONG.finditer(text, start, end):
+        month = MONTHS.index(match.group(2).lower().replace("marco", "março")) + 1
+        value = _to_date(match.group(1), month, match.group(3))
+        if value:
+            found.append((match.start(), match.end(), value))
+    return sorted(found)
+
+
+def _find_hearing_date(text: str, today: date) -> Optional[Tuple[int, date]]:
+    """
+    Data da audiência: (fim do trecho, data)
+
+    Prefere a data ligada à designação ("designo audiência para...", "audiência
+    ... designada para") e ignora datas passadas, que costumam ser a data do
+    documento, da distribuição ou de uma audiência anterior. Sem designação,
+    usa a primeira data futura próxima da menção à audiência.
+    """
+    windows = [(m.end(), m.end() + _DESIGNATION_WINDOW) for m in _HEARING_DESIGNATION.finditer(text)]
+    windows += [(m.start(), m.start() + _HEARING_WINDOW) for m in _HEARING.finditer(text)]
+    for start, end in windows:
+        for _, date_end, value in _dates(text, start, end):
+            if value >= today:
+                return date_end, value
+    return None
+
+
+def extract_fields(text: str, today: Optional[date] = None) -> Dict[str, str]:
+    """Extrai data/hora da audiência, tipo de audiência, prazo e vara"""
+    fields: Dict[str, str] = {}
+
+    found = _find_hearing_date(text, today or date.today())
+    if found:
+        end, value = found
+        fields["date"] = _format_date(value)
+        time_match = _TIME.search(text, end, end + 40)
+        if time_match:
+            hour, minute = time_match.group(1), time_match.group(2) or "00"
+            fields["time"] = f"{int(hour)}h{minute}"
+    kind = _HEARING_KIND.search(text)
+    if kind:
+        fields["hearing_kind"] = kind.group(1).lower()
+
+    deadline = _DEADLINE.search(text)
+    if deadline:
+        unit = deadline.group(2).lower()
+        amount = int(deadline.group(1))
+        if unit.startswith("dia"):
+            unit = ("dia" if amount == 1 else "dias") + (" úteis" if "teis" in unit else "")
+        fields["deadline"] = f"{amount} {unit}"
+
+    court = _COURT.search(text)
+    if court:
+        fields["court"] = " ".join(court.group(1).split())
+    return fields
+
+
+def _when(fields: Dict[str, str]) -> str:
+    when = fields.get("date", "")
+    if "time" in fields:
+        when += f", às {fields['time']}"
+    return when
+
+
+def _render_hearing(fields: Dict[str, str]) -> Dict[str, str]:
+    kind = fields.get("hearing_kind")
+    court = f", na {fields['court']}" if "court" in fields else ""
+    if kind and kind.startswith(("concilia", "media")):
+        meaning = (
+            f"A audiência de {kind} é um encontro em que as partes tentam chegar a um acordo, "
+            "com a ajuda de um conciliador, antes de o juiz decidir o caso."
+        )
+    elif kind and kind.startswith("instru"):
+        meaning = (
+            "Na audiência de instrução o juiz ouve as partes e as testemunhas para colher "
+            "as provas do processo."
+        )
+    else:
+        meaning = "A Justiça está chamando você para comparecer a um ato do processo na data marcada."
+    return {
+        "what_happened": f"Você recebeu uma intimação para uma audiência{f' de {kind}' if kind else ''} marcada para {_when(fields)}{court}.",
+        "what_it_means": meaning + " Faltar sem justificativa pode trazer consequências para o seu processo.",
+        "what_to_do_now": (
+            f"Anote a data: {_when(fields)}. Chegue com antecedência levando documento com foto e "
+            "os papéis relacionados ao caso. Se tiver advogado, avise-o; se não tiver, procure a "
+            "Defensoria Pública antes da audiência."
+        ),
+    }
+
+
+def _render_summons(fields: Dict[str, str]) -> Dict[str, str]:
+    deadline = f" de {fields['deadline']}" if "deadline" in fields else ""
+    court = f" na {fields['court']}" if "court" in fields else ""
+    hearing = (
+        f" Também foi marcada uma audiência para {_when(fields)}, e você deve comparecer."
+        if "date" in fields else ""
+    )
+    return {
+        "what_happened": f"Você recebeu uma citação: existe um processo contra você{court} e esta é a comunicação oficial disso.{hearing}",
+        "what_it_means": (
+            f"A partir de agora corre um prazo{deadline} para você apresentar sua defesa (contestação). "
+            "Se não se defender a tempo, o juiz pode considerar verdadeiro o que a outra parte disse."
+        ),
+        "what_to_do_now": (
+            f"Procure um advogado ou a Defensoria Pública o quanto antes, levando este documento. "
+            f"Não deixe o prazo{deadline} passar."
+        ),
+    }
+
+
+def _render_routine_order(fields: Dict[str, str]) -> Dict[str, str]:
+    deadline = f" Foi aberto um prazo de {fields['deadline']} para manifestação." if "deadline" in fields else ""
+    return {
+        "what_happened": "O juiz deu um andamento de rotina no processo (despacho de mero expediente).",
+        "what_it_means": (
+            "É uma ordem apenas para organizar o processo, como pedir documentos ou dar ciência às partes; "
+            f"ela não decide quem tem razão.{deadline}"
+        ),
+        "what_to_do_now": (
+            "Em geral você não precisa fazer nada sozinho. Se tem advogado ou é atendido pela Defensoria, "
+            "eles acompanham o processo; em caso de dúvida, entre em contato com eles."
+        ),
+    }
+
+
+def _p(pattern: str) -> Pattern[str]:
+    return re.compile(pattern, _FLAGS)
+
+
+# Só formas operativas da citação: "cite-se", "fica o réu citado" ou CITAÇÃO como
+# título. Um "citado" de passagem ("o réu, devidamente citado") não conta
+_SUMMONS = (
+    _p(r"\bcite(m)?-se\b|\bfica(m)?\s+(?:[^\s.,;:]+\s+){0,4}?citad[oa]s?\b"),
+    re.compile(r"^[ \t]*(?:MANDADO\s+DE\s+|CARTA\s+DE\s+)?CITA[ÇC][ÃA]O\b[^\n]{0,60}$", re.MULTILINE),
+)
+
+TEMPLATES: Tuple[DocumentTemplate, ...] = (
+    DocumentTemplate(
+        name="intimacao_audiencia",
+        indicators=(
+            (_p(r"\bintima[çc][ãa]o\b|\bintime-se\b|\bintimad[oa]s?\b"), 0.4),
+            (_HEARING_DESIGNATION, 0.4),
+            (_HEARING_KIND, 0.2),
+            (_p(r"\bcomparecer\b|\bcomparecimento\b"), 0.2),
+        ),
+        # Citação com audiência é tratada pelo modelo de citação
+        excludes=_SUMMONS,
+        required=("date",),
+        render=_render_hearing,
+    ),
+    DocumentTemplate(
+        name="citacao",
+        indicators=(
+            (_SUMMONS[0], 0.5),
+            (_SUMMONS[1], 0.5),
+            (_p(r"\bcontesta[çc][ãa]o\b|\bcontestar\b|\bapresentar\s+(defesa|resposta)\b"), 0.3),
+            (_p(r"\brevelia\b|\bpresumir[-\s]se[-\s]?[ãa]o\s+verdadeir"), 0.2),
+            (_DEADLINE, 0.1),
+        ),
+        anchors=_SUMMONS,
+        render=_render_summons,
+    ),
+    DocumentTemplate(
+        name="despacho_mero_expediente",
+        indicators=(
+            (_p(r"\bdespacho\b|\bvistos\b"), 0.3),
+            (_p(
+                r"\bjunte-se\b|\bmanifeste(m)?-se\b|\bd[êe]-se\s+vista\b|\bvista\s+[àa]s?\s+partes?\b|\baguarde-se\b"
+                r"|\bcumpra-se\b|\bci[êe]ncia\s+[àa]s?\s+partes\b|\bconclusos\b|\bdiga\s+a\s+parte\b|\bespecifiquem\b"
+            ), 0.5),
+            (_p(r"\bmero\s+expediente\b"), 0.4),
+        ),
+        excludes=_SUMMONS + (_HEARING,),
+        render=_render_routine_order,
+    ),
+)
+
+# Distância mínima entre o melhor e o segundo tipo para considerar a classificação segura
+_MIN_MARGIN = 0.2
+
+
+def classify(text: str) -> List[Tuple[str, float]]:
+    """Pontuação de cada tipo de documento, da maior para a menor"""
+    if _NEEDS_MODEL.search(text):
+        return []
+    scores = [(template.name, template.score(text)) for template in TEMPLATES]
+    return sorted((item for item in scores if item[1] > 0), key=lambda item: item[1], reverse=True)
+
+
+def match_template(text: str, min_confidence: float, today: Optional[date] = None) -> Optional[TemplateMatch]:
+    """Resposta por modelo se o documento for rotineiro e classificado com segurança; senão None"""
+    scores = classify(text)
+    if not scores:
+        return None
+    name, confidence = scores[0]
+    runner_up = scores[1][1] if len(scores) > 1 else 0.0
+    if confidence < min_confidence or confidence - runner_up < _MIN_MARGIN:
+        return None
+
+    template = next(t for t in TEMPLATES if t.name == name)
+    fields = extract_fields(text, today)
+    if any(required not in fields for required in template.required):
+        return None
+    return TemplateMatch(name, confidence, fields, template.render(fields))
+
+
+# Trechos que costumam carregar a ordem ou o ato principal do documento
+_KEY_SENTENCE = _p(
+    r"\bintim|\bcita|\bcite-se\b|\bdesign|\bdetermin|\bdefiro\b|\bindefiro\b|\bdecido\b|\bjulgo\b|\bcondeno\b"
+    r"|\bprazo\b|\bcomparec|\bapresent|\bpagamento\b|\bpague\b|\bmanifest"
+)
+_SENTENCE_SPLIT = re.compile(r"(?<=[.;!?])\s+(?=[A-ZÀ-Ú])|\n+")  # "art. 334" não quebra
+_EXTRACT_SENTENCES = 2
+_EXTRACT_SENTENCE_CHARS = 300
+
+
+def _clip(sentence: str) -> str:
+    if len(sentence) <= _EXTRACT_SENTENCE_CHARS:
+        return sentence
+    return sentence[:_EXTRACT_SENTENCE_CHARS].rsplit(" ", 1)[0] + "…"
+
+
+def extractive_simplification(text: str) -> Dict[str, str]:
+    """
+    Resposta extrativa, sem LLM, para qualquer documento (sobrecarga do serviço)
+
+    Reproduz os trechos com a ordem principal do documento e os campos
+    extraídos (audiência, prazo, vara); não interpreta o conteúdo.
+    """
+    sentences = [" ".join(s.split()) for s in _SENTENCE_SPLIT.split(text)]
+    key = [_clip(s) for s in sentences if len(s) > 20 and _KEY_SENTENCE.search(s)]
+    excerpt = " ".join(key[:_EXTRACT_SENTENCES]) or _clip(" ".join(text.split()))
+
+    fields = extract_fields(text)
+    facts = []
+    if "date" in fields:
+        facts.append(f"O documento menciona uma audiência em {_when(fields)}.")
+    if "deadline" in fields:
+        facts.append(f"Há um prazo de {fields['deadline']} indicado no documento.")
+    court = f" Informe a {fields['court']} e o número do processo." if "court" in fields else ""
+    return {
+        "what_happened": f"Trecho principal do documento: \"{excerpt}\"",
+        "what_it_means": " ".join(facts + [
+            "Este é um resumo automático feito em horário de grande procura, sem a explicação completa; "
+            "envie o documento novamente mais tarde para recebê-la."
+        ]),
+        "what_to_do_now": (
+            ("Não deixe o prazo passar. " if "deadline" in fields else "")
+            + "Procure a Defensoria Pública ou um advogado levando este documento." + court
+        ),
+    }
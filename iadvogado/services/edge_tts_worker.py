@@ -8,15 +8,21 @@ import asyncio
 import logging
 import hashlib
 import os
+import threading
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List
+from typing import AsyncIterator, Optional, Dict, List
 from ..config.config import settings
+from ..core.metrics import record_cache
+from .audio_formats import AUDIO_EXTENSIONS, MP3, resolve_audio_format, transcode
 
 logger = logging.getLogger(__name__)
 
 class EdgeTTSWorker:
     """Worker para conversão de texto em áudio usando Edge TTS"""
     
+    # Aceita `audio_format` e transcodifica durante a síntese (ver services.audio_formats)
+    streams_audio_formats = True
+    
     def __init__(self):
         self.voice = settings.tts_voice
         self.rate = settings.tts_rate
@@ -26,13 +32,11 @@ class EdgeTTSWorker:
         self.cache_enabled = settings.tts_cache_enabled
         self.cache_ttl = settings.tts_cache_ttl
         
-        # Configurar diretório de cache
+        # Configurar diretório de cache (criado na primeira gravação)
         self.cache_dir = "audio_cache"
-        if self.cache_enabled:
-            os.makedirs(self.cache_dir, exist_ok=True)
-            logger.info(f"Cache de áudio habilitado: {self.cache_dir}")
         
-        # Métricas de performance
+        # Métricas de performance (histogramas por estágio ficam em core.metrics)
+        self._metrics_lock = threading.Lock()
         self.metrics = {
             "total_requests": 0,
             "cache_hits": 0,
@@ -43,14 +47,17 @@ class EdgeTTSWorker:
         
         logger.info(f"EdgeTTSWorker inicializado - Voz: {self.voice}, SSML: {self.use_ssml}, Cache: {self.cache_enabled}")
     
-    def _get_cache_key(self, text: str, voice: str, rate: str, volume: str, pitch: str) -> str:
+    def _get_cache_key(self, text: str, voice: str, rate: str, volume: str, pitch: str, audio_format: str = "mp3") -> str:
         """Gera chave única para cache baseada nos parâmetros"""
         content = f"{text}|{voice}|{rate}|{volume}|{pitch}"
+        if audio_format != "mp3":
+            # MP3 mantém a chave original: o cache existente continua válido
+            content += f"|{audio_format}"
         return hashlib.md5(content.encode('utf-8')).hexdigest()
     
-    def _get_cache_file_path(self, cache_key: str) -> str:
+    def _get_cache_file_path(self, cache_key: str, extension: str = "mp3") -> str:
         """Retorna caminho completo do arquivo de cache"""
-        return os.path.join(self.cache_dir, f"{cache_key}.mp3")
+        return os.path.join(self.cache_dir, f"{cache_key}.{extension}")
     
     def _is_cache_valid(self, cache_file: str) -> bool:
         """Verifica se o arquivo de cache ainda é válido"""
@@ -68,7 +75,7 @@ class EdgeTTSWorker:
         
         total_size = 0
         for filename in os.listdir(self.cache_dir):
-            if filename.endswith('.mp3'):
+            if filename.endswith(AUDIO_EXTENSIONS):
                 filepath = os.path.join(self.cache_dir, filename)
                 total_size += os.path.getsize(filepath)
         
@@ -81,7 +88,7 @@ class EdgeTTSWorker:
         
         expired_files = []
         for filename in os.listdir(self.cache_dir):
-            if filename.endswith('.mp3'):
+            if filename.endswith(AUDIO_EXTENSIONS):
                 filepath = os.path.join(self.cache_dir, filename)
                 if not self._is_cache_valid(filepath):
                     expired_files.append(filepath)
@@ -120,7 +127,8 @@ class EdgeTTSWorker:
         voice: Optional[str] = None,
         rate: Optional[str] = None,
         volume: Optional[str] = None,
-        pitch: Optional[str] = None
+        pitch: Optional[str] = None,
+        audio_format: str = "mp3",
     ) -> bytes:
         """
         Converte texto em áudio usando Edge TTS com cache
@@ -131,13 +139,14 @@ class EdgeTTSWorker:
             rate: Velocidade da fala (opcional)
             volume: Volume do áudio (opcional)
             pitch: Tom da voz (opcional)
+            audio_format: "mp3" (padrão) ou "opus" (OGG, transcodificado pelo ffmpeg)
         
         Returns:
-            bytes: Áudio em formato MP3
+            bytes: Áudio no formato pedido
         """
         import time
         start_time = time.time()
-        self.metrics["total_requests"] += 1
+        total_requests = self._count("total_requests")
         
         try:
             # Usar parâmetros fornecidos ou padrões
@@ -145,50 +154,56 @@ class EdgeTTSWorker:
             rate = rate or self.rate
             volume = volume or self.volume
             pitch = pitch or self.pitch
+            fmt = resolve_audio_format(audio_format)
             
-            # Verificar cache primeiro
+            # Verificar cache primeiro (um arquivo por formato)
             if self.cache_enabled:
-                cache_key = self._get_cache_key(text, voice, rate, volume, pitch)
-                cache_file = self._get_cache_file_path(cache_key)
+                cache_key = self._get_cache_key(text, voice, rate, volume, pitch, fmt.name)
+                cache_file = self._get_cache_file_path(cache_key, fmt.extension)
                 
                 if self._is_cache_valid(cache_file):
                     logger.info(f"Cache hit para texto de {len(text)} caracteres")
-                    self.metrics["cache_hits"] += 1
+                    self._count("cache_hits")
+                    record_cache("tts", hit=True)
                     
                     with open(cache_file, 'rb') as f:
                         audio_data = f.read()
                     
                     # Atualizar métricas
                     generation_time = time.time() - start_time
-                    self.metrics["avg_generation_time"] = (
-                        (self.metrics["avg_generation_time"] * (self.metrics["total_requests"] - 1) + generation_time) 
-                        / self.metrics["total_requests"]
-                    )
+                    self._record_generation_time(generation_time)
                     
                     logger.info(f"Áudio carregado do cache: {len(audio_data)} bytes")
                     return audio_data
                 else:
                     logger.info(f"Cache miss para texto de {len(text)} caracteres")
-                    self.metrics["cache_misses"] += 1
+                    self._count("cache_misses")
+                    record_cache("tts", hit=False)
             
-            logger.info(f"Gerando áudio - Voz: {voice}, Rate: {rate}, Volume: {volume}, Pitch: {pitch}")
+            logger.info(f"Gerando áudio - Voz: {voice}, Rate: {rate}, Volume: {volume}, Pitch: {pitch}, Formato: {fmt.name}")
             
             # Gerar áudio
             if self.use_ssml:
                 ssml = self.create_ssml_for_legal_text(text, voice)
-                audio_data = await self._generate_audio_from_ssml(ssml, voice)
+                communicate = edge_tts.Communicate(ssml, voice)
+            else:
+                communicate = edge_tts.Communicate(text, voice, rate=rate, volume=volume, pitch=pitch)
+            if fmt is MP3:
+                audio_data = b"".join([chunk async for chunk in self._stream_audio(communicate)])
             else:
-                audio_data = await self._generate_audio_from_text(text, voice, rate, volume, pitch)
+                # O Edge só entrega MP3: o ffmpeg converte os pedaços à medida que chegam
+                audio_data = await transcode(self._stream_audio(communicate), fmt)
             
             # Salvar no cache se habilitado
             if self.cache_enabled:
                 try:
+                    os.makedirs(self.cache_dir, exist_ok=True)
                     with open(cache_file, 'wb') as f:
                         f.write(audio_data)
                     logger.debug(f"Áudio salvo no cache: {cache_file}")
                     
                     # Limpar cache expirado periodicamente
-                    if self.metrics["total_requests"] % 10 == 0:
+                    if total_requests % 10 == 0:
                         self._clean_expired_cache()
                         
                 except Exception as e:
@@ -196,11 +211,7 @@ class EdgeTTSWorker:
             
             # Atualizar métricas
             generation_time = time.time() - start_time
-            self.metrics["avg_generation_time"] = (
-                (self.metrics["avg_generation_time"] * (self.metrics["total_requests"] - 1) + generation_time) 
-                / self.metrics["total_requests"]
-            )
-            self.metrics["total_cache_size"] = self._get_cache_size()
+            self._record_generation_time(generation_time)
             
             logger.info(f"Áudio gerado com sucesso: {len(audio_data)} bytes em {generation_time:.2f}s")
             return audio_data
@@ -209,27 +220,22 @@ class EdgeTTSWorker:
             logger.error(f"Erro ao gerar áudio: {e}")
             raise
     
+    @staticmethod
+    async def _stream_audio(communicate) -> AsyncIterator[bytes]:
+        """Pedaços de MP3 à medida que o Edge os envia"""
+        async for chunk in communicate.stream():
+            if chunk["type"] == "audio":
+                yield chunk["data"]
+    
     async def _generate_audio_from_text(self, text: str, voice: str, rate: str, volume: str, pitch: str) -> bytes:
         """Gera áudio a partir de texto simples"""
         communicate = edge_tts.Communicate(text, voice, rate=rate, volume=volume, pitch=pitch)
-        
-        audio_data = b""
-        async for chunk in communicate.stream():
-            if chunk["type"] == "audio":
-                audio_data += chunk["data"]
-        
-        return audio_data
+        return b"".join([chunk async for chunk in self._stream_audio(communicate)])
     
     async def _generate_audio_from_ssml(self, ssml: str, voice: str) -> bytes:
         """Gera áudio a partir de SSML"""
         communicate = edge_tts.Communicate(ssml, voice)
-        
-        audio_data = b""
-        async for chunk in communicate.stream():
-            if chunk["type"] == "audio":
-                audio_data += chunk["data"]
-        
-        return audio_data
+        return b"".join([chunk async for chunk in self._stream_audio(communicate)])
     
     def create_ssml_for_legal_text(self, text: str, voice: str = None) -> str:
         """
@@ -282,10 +288,26 @@ class EdgeTTSWorker:
             logger.error(f"Erro ao testar voz {voice}: {e}")
             return False
     
+    def _count(self, key: str) -> int:
+        """Incrementa um contador das métricas e retorna o novo valor"""
+        with self._metrics_lock:
+            self.metrics[key] += 1
+            return self.metrics[key]
+    
+    def _record_generation_time(self, generation_time: float):
+        """Atualiza a média de tempo de geração (a distribuição fica no /metrics)"""
+        with self._metrics_lock:
+            total = max(1, self.metrics["total_requests"])
+            self.metrics["avg_generation_time"] += (
+                generation_time - self.metrics["avg_generation_time"]
+            ) / total
+    
     def get_metrics(self) -> Dict:
         """Retorna métricas de performance do TTS"""
-        self.metrics["total_cache_size"] = self._get_cache_size()
-        return self.metrics.copy()
+        cache_size = self._get_cache_size()
+        with self._metrics_lock:
+            self.metrics["total_cache_size"] = cache_size
+            return self.metrics.copy()
     
     def clear_cache(self) -> int:
         """Limpa todo o cache e retorna número de arquivos removidos"""
@@ -294,7 +316,7 @@ class EdgeTTSWorker:
         
         removed_count = 0
         for filename in os.listdir(self.cache_dir):
-            if filename.endswith('.mp3'):
+            if filename.endswith(AUDIO_EXTENSIONS):
                 filepath = os.path.join(self.cache_dir, filename)
                 try:
                     os.remove(filepath)
@@ -314,7 +336,7 @@ class EdgeTTSWorker:
         file_count = 0
         
         if os.path.exists(self.cache_dir):
-            file_count = len([f for f in os.listdir(self.cache_dir) if f.endswith('.mp3')])
+            file_count = len([f for f in os.listdir(self.cache_dir) if f.endswith(AUDIO_EXTENSIONS)])
         
         return {
             "enabled": True,
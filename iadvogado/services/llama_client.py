@@ -1,23 +1,84 @@
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
-from typing import Dict
+from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig, LogitsProcessorList, StoppingCriteria, StoppingCriteriaList
+from typing import Dict, List, Optional
+import asyncio
 import json
 import re
+import time
 from ..config.config import settings
+from ..core.metrics import observe_stage, record_generation, record_truncation, set_model_memory
+from ..core.cancellation import CancellationToken, RequestCancelled
+from ..core.profiling import torch_profile
+from .model_artifacts import get_artifact
+from .constrained_decoding import (
+    JsonObjectStoppingCriteria,
+    JsonSchemaGuide,
+    JsonSchemaLogitsProcessor,
+    TokenVocabulary,
+)
 import logging
 import os
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class LlamaClient:
+REQUIRED_KEYS = ('what_happened', 'what_it_means', 'what_to_do_now')
+
+class GenerationTimer(StoppingCriteria):
+    """
+    Mede prefill e decode sem alterar a geração
+
+    O generate chama os stopping criteria após cada token gerado; a primeira
+    chamada marca o fim do prefill (primeiro token pronto).
+    """
+
     def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+    def split(self, end: float):
+        """Retorna (prefill, decode) em segundos"""
+        first = self.first_token_at or end
+        return first - self.start, end - first
+
+class CancellationCriteria(StoppingCriteria):
+    """Interrompe a geração no próximo passo quando a requisição é cancelada"""
+
+    def __init__(self, token: CancellationToken):
+        self.token = token
+
+    def __call__(self, input_ids, scores, **kwargs):
+        stop = self.token.cancelled
+        return torch.full((input_ids.shape[0],), stop, dtype=torch.bool, device=input_ids.device)
+
+def bnb_quantization_config(mode: Optional[str]) -> Optional[BitsAndBytesConfig]:
+    """Quantização bitsandbytes (4bit ou 8bit), na carga ou na preparação do artefato"""
+    if mode == "4bit":
+        return BitsAndBytesConfig(
+            load_in_4bit=True,
+            bnb_4bit_quant_type="nf4",
+            bnb_4bit_compute_dtype=torch.float16,
+            bnb_4bit_use_double_quant=True,
+        )
+    elif mode == "8bit":
+        return BitsAndBytesConfig(
+            load_in_8bit=True,
+        )
+    return None
+
+class LlamaClient:
+    def __init__(self, model_name: Optional[str] = None):
+        self.model_name = model_name or settings.llama_model_name
         self.model = None
         self.tokenizer = None
         self.device = self._get_device()
         self.model_loaded = False
         self.load_error = None
+        self._vocabulary = None  # Máscaras da decodificação restrita (por tokenizer)
         # Não carrega o modelo imediatamente - lazy loading
         # self._load_model()  # Removido - será carregado quando necessário
     
@@ -34,19 +95,7 @@ class LlamaClient:
         """Configura quantização para economizar memória"""
         if not settings.llama_use_quantization:
             return None
-            
-        if settings.llama_quantization_config == "4bit":
-            return BitsAndBytesConfig(
-                load_in_4bit=True,
-                bnb_4bit_quant_type="nf4",
-                bnb_4bit_compute_dtype=torch.float16,
-                bnb_4bit_use_double_quant=True,
-            )
-        elif settings.llama_quantization_config == "8bit":
-            return BitsAndBytesConfig(
-                load_in_8bit=True,
-            )
-        return None
+        return bnb_quantization_config(settings.llama_quantization_config)
     
     def _ensure_model_loaded(self):
         """Garante que o modelo está carregado (lazy loading)"""
@@ -61,7 +110,11 @@ class LlamaClient:
     def _load_model(self):
         """Carrega o modelo Llama 3.1 8B"""
         try:
-            logger.info(f"Carregando modelo {settings.llama_model_name}...")
+            logger.info(f"Carregando modelo {self.model_name}...")
+            
+            if settings.model_artifacts_dir:
+                # Somente o diretório preparado: sem token nem rede
+                return self._load_from_artifact()
             
             # Verificar token do Hugging Face
             hf_token = (
@@ -92,7 +145,7 @@ class LlamaClient:
                 tokenizer_kwargs["token"] = hf_token
             
             self.tokenizer = AutoTokenizer.from_pretrained(
-                settings.llama_model_name,
+                self.model_name,
                 **tokenizer_kwargs
             )
             
@@ -115,7 +168,7 @@ class LlamaClient:
                 model_kwargs["device_map"] = {"": self.device}
             
             self.model = AutoModelForCausalLM.from_pretrained(
-                settings.llama_model_name,
+                self.model_name,
                 **model_kwargs
             )
             
@@ -124,6 +177,7 @@ class LlamaClient:
                 self.tokenizer.pad_token = self.tokenizer.eos_token
             
             logger.info(f"Modelo carregado com sucesso no dispositivo: {self.device}")
+            set_model_memory(self.model_name, self.model.get_memory_footprint())
             self.model_loaded = True
             return True
             
@@ -159,13 +213,49 @@ class LlamaClient:
             
             raise RuntimeError(f"Não foi possível carregar o modelo: {error_msg}")
     
+    def _load_from_artifact(self):
+        """
+        Carrega o artefato local conferido (ver model_artifacts)
+        
+        Na CPU o modelo fica no dtype do artefato e sem device_map: os
+        tensores são os próprios arquivos safetensors mapeados (mmap), sem
+        cópia, compartilhados pelo page cache entre os processos.
+        """
+        start = time.perf_counter()
+        artifact = get_artifact(self.model_name)
+        self.tokenizer = AutoTokenizer.from_pretrained(artifact.path, local_files_only=True)
+        
+        model_kwargs = {"local_files_only": True, "torch_dtype": "auto"}
+        if artifact.quantization:
+            # Já quantizado na preparação: a configuração vem do config.json do artefato
+            model_kwargs["device_map"] = "auto"
+        elif self.device != "cpu":
+            quantization_config = self._get_quantization_config()
+            if quantization_config:
+                model_kwargs["quantization_config"] = quantization_config
+                model_kwargs["device_map"] = "auto"
+            else:
+                model_kwargs["device_map"] = {"": self.device}
+        
+        self.model = AutoModelForCausalLM.from_pretrained(artifact.path, **model_kwargs)
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        
+        logger.info(
+            f"Modelo {self.model_name}@{artifact.revision[:12]} carregado do artefato local "
+            f"em {time.perf_counter() - start:.1f}s no dispositivo: {self.device} ({self.model.dtype})"
+        )
+        set_model_memory(self.model_name, self.model.get_memory_footprint())
+        self.model_loaded = True
+        return True
+    
     def _create_prompt(self, text: str) -> str:
         """Cria prompt otimizado para simplificação de texto jurídico"""
         prompt = f"""<|begin_of_text|><|start_header_id|>system<|end_header_id|>
 
 Você é um assistente especializado em traduzir documentos jurídicos brasileiros para linguagem clara e acessível. Sua tarefa é simplificar textos jurídicos complexos em três blocos específicos.
 
-Responda APENAS com um JSON válido contendo as seguintes chaves:
+Responda APENAS com um JSON válido, em uma única linha, contendo as seguintes chaves:
 - "what_happened": Resumo do que aconteceu no processo/documento
 - "what_it_means": Explicação do que isso significa em linguagem simples
 - "what_to_do_now": Orientações sobre próximos passos
@@ -179,8 +269,40 @@ Simplifique este texto jurídico:
 """
         return prompt
     
-    def simplify_text(self, text: str) -> Dict[str, str]:
-        """Simplifica texto jurídico usando Llama 3.1"""
+    def with_model(self, model_name: str) -> "LlamaClient":
+        """Outro cliente, com outro modelo (carregado sob demanda)"""
+        return LlamaClient(model_name)
+    
+    @property
+    def ready(self) -> bool:
+        return self.model_loaded
+    
+    def warmup(self):
+        """Carrega o modelo antes da primeira requisição"""
+        self._ensure_model_loaded()
+    
+    def simplify_text(
+        self, text: str, cancel_token: Optional[CancellationToken] = None, max_new_tokens: Optional[int] = None
+    ) -> Dict[str, str]:
+        """
+        Simplifica texto jurídico usando Llama 3.1
+        
+        Com `cancel_token`, a geração é interrompida no passo seguinte ao
+        cancelamento e RequestCancelled é levantada. `max_new_tokens` limita a
+        geração abaixo de `settings.llama_max_tokens` (degradação sob carga).
+        """
+        return self.simplify_batch([text], cancel_token, max_new_tokens)[0]
+    
+    def simplify_batch(
+        self, texts: List[str], cancel_token: Optional[CancellationToken] = None, max_new_tokens: Optional[int] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Simplifica vários textos numa única chamada ao generate (usado pelo /batch)
+        
+        Os prompts são preenchidos à esquerda, de forma que todos terminam na
+        mesma posição; a decodificação restrita acompanha cada linha do lote
+        separadamente e o lote termina quando todas fecharam o JSON.
+        """
         try:
             # Carregar modelo se ainda não foi carregado (lazy loading)
             if not self.model_loaded:
@@ -189,53 +311,126 @@ Simplifique este texto jurídico:
             # Verificar se o modelo está disponível
             if self.model is None or self.tokenizer is None:
                 logger.warning("Modelo não disponível, usando fallback")
-                return self._fallback_response(text)
+                return [self._fallback_response(text) for text in texts]
             
-            prompt = self._create_prompt(text)
+            prompts = [self._create_prompt(text) for text in texts]
             
             # Tokenizar entrada
+            tokenize_start = time.perf_counter()
+            # padding_side por chamada: o tokenizer é compartilhado entre gerações concorrentes
             inputs = self.tokenizer(
-                prompt, 
+                prompts if len(prompts) > 1 else prompts[0],
                 return_tensors="pt", 
                 truncation=True, 
                 max_length=2048,
-                padding=True
+                padding=True,
+                padding_side="left",
             )
             
             # Mover para o dispositivo correto
             if self.device != "cpu":
                 inputs = {k: v.to(self.device) for k, v in inputs.items()}
             
+            observe_stage("tokenize", time.perf_counter() - tokenize_start)
+            
             # Gerar resposta
-            with torch.no_grad():
+            prompt_tokens = inputs['input_ids'].shape[1]
+            timer = GenerationTimer()
+            stopping_criteria = StoppingCriteriaList([timer])
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+                stopping_criteria.append(CancellationCriteria(cancel_token))
+            logits_processor = LogitsProcessorList()
+            guide = None
+            if settings.llama_constrained_decoding:
+                # Restringe a saída ao JSON de três chaves e para quando o objeto fecha
+                guide = JsonSchemaGuide(self._get_vocabulary(), REQUIRED_KEYS, prompt_tokens)
+                logits_processor.append(JsonSchemaLogitsProcessor(guide))
+                stopping_criteria.append(JsonObjectStoppingCriteria(guide))
+            
+            with torch.no_grad(), torch_profile("generate"):
                 outputs = self.model.generate(
                     **inputs,
-                    max_new_tokens=settings.llama_max_tokens,
+                    max_new_tokens=max_new_tokens or settings.llama_max_tokens,
                     temperature=settings.llama_temperature,
                     do_sample=True,
                     pad_token_id=self.tokenizer.eos_token_id,
                     eos_token_id=self.tokenizer.eos_token_id,
+                    logits_processor=logits_processor,
+                    stopping_criteria=stopping_criteria,
                 )
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            prefill_time, decode_time = timer.split(time.perf_counter())
+            generated = outputs[:, prompt_tokens:]
+            # Linhas que terminaram antes são completadas com eos: não contam como geradas
+            new_tokens = int((generated != self.tokenizer.eos_token_id).sum())
+            observe_stage("prefill", prefill_time)
+            observe_stage("decode", decode_time)
+            record_generation(int(inputs['attention_mask'].sum()), new_tokens, decode_time)
             
-            # Decodificar resposta
-            response = self.tokenizer.decode(
-                outputs[0][inputs['input_ids'].shape[1]:], 
-                skip_special_tokens=True
-            ).strip()
-            
-            # Tentar extrair JSON da resposta
-            parsed_response = self._parse_response(response)
-            
-            return parsed_response
+            results = []
+            for row, text in enumerate(texts):
+                # Decodificar resposta
+                response = self.tokenizer.decode(generated[row], skip_special_tokens=True).strip()
+                
+                if guide is not None and not guide.is_broken(row):
+                    results.append(self._parse_constrained(response, guide.suffix(row), text))
+                else:
+                    # Tentar extrair JSON da resposta
+                    results.append(self._parse_response(response))
+            return results
             
+        except RequestCancelled:
+            raise
         except RuntimeError as e:
             # Erro de carregamento do modelo
             logger.error(f"Erro ao simplificar texto: {e}")
-            return self._fallback_response(text)
+            return [self._fallback_response(text) for text in texts]
         except Exception as e:
             logger.error(f"Erro ao simplificar texto: {e}")
             # Fallback para resposta estruturada manual
-            return self._fallback_response(text)
+            return [self._fallback_response(text) for text in texts]
+    
+    def _get_vocabulary(self) -> TokenVocabulary:
+        """Vocabulário da decodificação restrita (construído uma vez por tokenizer)"""
+        if self._vocabulary is None or self._vocabulary.tokenizer_id != id(self.tokenizer):
+            start = time.perf_counter()
+            self._vocabulary = TokenVocabulary(self.tokenizer)
+            logger.info(f"Vocabulário da decodificação restrita pronto em {time.perf_counter() - start:.2f}s")
+        return self._vocabulary
+    
+    def _parse_constrained(self, response: str, suffix: str, text: str) -> Dict[str, str]:
+        """
+        Lê a saída da decodificação restrita
+        
+        A saída segue o formato por construção; `suffix` fecha o JSON quando o
+        limite de tokens interrompe a geração. O corte é contado na métrica
+        iadvogado_llm_truncated_total e registrado no log; o campo cortado
+        termina em "…" e campos vazios usam o fallback.
+        """
+        try:
+            parsed = json.loads(response + suffix)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Saída restrita inválida ({e}), usando parse tolerante")
+            return self._parse_response(response)
+        
+        values = {key: (parsed.get(key) or '').strip() for key in REQUIRED_KEYS}
+        if suffix:
+            record_truncation()
+            if suffix.startswith('"'):
+                # Cortado dentro de uma string: é o último campo preenchido
+                cut = next((key for key in reversed(REQUIRED_KEYS) if values[key]), None)
+                if cut:
+                    values[cut] += "…"
+            missing = [key for key in REQUIRED_KEYS if not values[key]]
+            logger.warning(
+                "Resposta do LLM cortada pelo limite de tokens; "
+                f"campos com texto padrão: {', '.join(missing) or 'nenhum'}"
+            )
+        
+        fallback = self._fallback_response(text)
+        return {key: values[key] or fallback[key] for key in REQUIRED_KEYS}
     
     def _parse_response(self, response: str) -> Dict[str, str]:
         """Tenta extrair JSON da resposta do modelo"""
@@ -250,8 +445,7 @@ Simplifique este texto jurídico:
                 parsed = json.loads(json_str)
                 
                 # Validar se tem as chaves necessárias
-                required_keys = ['what_happened', 'what_it_means', 'what_to_do_now']
-                if all(key in parsed for key in required_keys):
+                if all(key in parsed for key in REQUIRED_KEYS):
                     return {
                         'what_happened': parsed['what_happened'].strip(),
                         'what_it_means': parsed['what_it_means'].strip(),
@@ -315,6 +509,6 @@ Simplifique este texto jurídico:
 llama_client = LlamaClient()
 
 # Função de compatibilidade com o código existente
-async def simplify_text(text: str) -> Dict[str, str]:
-    """Função assíncrona para compatibilidade com o código existente"""
-    return llama_client.simplify_text(text)
+async def simplify_text(text: str, cancel_token: Optional[CancellationToken] = None) -> Dict[str, str]:
+    """Função assíncrona para compatibilidade com o código existente (executa em thread)"""
+    return await asyncio.to_thread(llama_client.simplify_text, text, cancel_token)
@@ -1,10 +1,15 @@
-import os
-from typing import Dict
+"""
+Cliente OpenAI para IADvogado
+Provedor alternativo de LLM, assíncrono e não bloqueante (AsyncOpenAI)
+"""
+
+import json
+import logging
+import re
+from typing import Dict, Optional
 from ..config.config import settings
 
-# This client uses OpenAI as example. You can swap to another LLM provider.
-import openai
-openai.api_key = settings.openai_api_key
+logger = logging.getLogger(__name__)
 
 SYSTEM_PROMPT = (
     "Você é um assistente que traduz documentos jurídicos brasileiros para linguagem clara e acessível. "
@@ -12,47 +17,90 @@ SYSTEM_PROMPT = (
     "Seja objetivo, use frases curtas e linguagem simples, voltada para leigos e com exemplos quando útil. "
 )
 
+REQUIRED_KEYS = ('what_happened', 'what_it_means', 'what_to_do_now')
 
-async def simplify_text(text: str) -> Dict[str, str]:
-    # Build a prompt that asks for a JSON-like output to make parsing trivial
-    prompt = (
-        "Receba o texto jurídico abaixo e retorne um JSON com as chaves: what_happened, what_it_means, what_to_do_now.\n\n"
-        f"TEXTO: {text}\n\n"
-        "Lembre-se de ser conciso e claro."
-    )
-
-    response = openai.ChatCompletion.create(
-        model="gpt-4o",  # placeholder — change to allowed model
-        messages=[
-            {"role": "system", "content": SYSTEM_PROMPT},
-            {"role": "user", "content": prompt},
-        ],
-        max_tokens=500,
-        temperature=0.2,
-    )
-
-    # Try to parse output. We expect either JSON or plain text divided in sections.
-    raw = response.choices[0].message.content.strip()
-    # Best effort parsing — production should be more robust (schema validation)
-    # Try to extract JSON
-    import json
-    try:
-        parsed = json.loads(raw)
+
+class OpenAIClient:
+    """Cliente assíncrono para a API de chat da OpenAI"""
+
+    def __init__(self, model_name: Optional[str] = None):
+        self.model_name = model_name or settings.openai_model
+        self._client = None
+
+    # Sem modelo local para carregar
+    ready = True
+
+    def with_model(self, model_name: str) -> "OpenAIClient":
+        """Outro cliente, com outro modelo da API"""
+        return OpenAIClient(model_name)
+
+    def _get_client(self):
+        """Cria o cliente AsyncOpenAI sob demanda (import tardio)"""
+        if self._client is None:
+            if not settings.openai_api_key:
+                raise RuntimeError("OPENAI_API_KEY não configurada")
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(api_key=settings.openai_api_key)
+        return self._client
+
+    async def simplify_text(self, text: str, cancel_token=None, max_new_tokens: Optional[int] = None) -> Dict[str, str]:
+        """
+        Simplifica texto jurídico usando a API da OpenAI
+
+        O cancelamento chega pela própria task (CancelledError aborta a chamada HTTP).
+        """
+        prompt = (
+            "Receba o texto jurídico abaixo e retorne um JSON com as chaves: what_happened, what_it_means, what_to_do_now.\n\n"
+            f"TEXTO: {text}\n\n"
+            "Lembre-se de ser conciso e claro."
+        )
+
+        try:
+            response = await self._get_client().chat.completions.create(
+                model=self.model_name,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                max_tokens=max_new_tokens or settings.llama_max_tokens,
+                temperature=settings.llama_temperature,
+                response_format={"type": "json_object"},
+            )
+        except Exception as e:
+            logger.error(f"Erro ao simplificar texto com OpenAI: {e}")
+            return self._fallback_response(text)
+
+        raw = (response.choices[0].message.content or "").strip()
+        return self._parse_response(raw)
+
+    def _parse_response(self, raw: str) -> Dict[str, str]:
+        """Extrai as três seções da resposta (JSON ou texto livre)"""
+        try:
+            json_match = re.search(r'\{.*\}', raw, re.DOTALL)
+            parsed = json.loads(json_match.group() if json_match else raw)
+            return {key: str(parsed.get(key, '')).strip() for key in REQUIRED_KEYS}
+        except Exception:
+            # Fallback: divide o texto em três partes aproximadamente iguais
+            third = len(raw) // 3
+            return {
+                'what_happened': raw[:third].strip(),
+                'what_it_means': raw[third:2 * third].strip(),
+                'what_to_do_now': raw[2 * third:].strip(),
+            }
+
+    def _fallback_response(self, text: str) -> Dict[str, str]:
+        """Resposta de fallback quando a API falha"""
         return {
-            'what_happened': parsed.get('what_happened', ''),
-            'what_it_means': parsed.get('what_it_means', ''),
-            'what_to_do_now': parsed.get('what_to_do_now', ''),
+            'what_happened': f"Documento jurídico analisado: {text[:100]}...",
+            'what_it_means': "Este é um documento jurídico que requer análise profissional. Recomenda-se consultar um advogado para interpretação adequada.",
+            'what_to_do_now': "Procure a Defensoria Pública ou um advogado para orientação específica sobre este caso."
         }
-    except Exception:
-        # Fallback: split by headings
-        parts = {'what_happened': '', 'what_it_means': '', 'what_to_do_now': ''}
-        lowered = raw.lower()
-        # naive splits
-        import re
-        h_match = re.split(r"what (happened|happens|ocorreu)|o que aconteceu", raw, flags=re.I)
-        # fallback: divide into three roughly equal parts
-        third = len(raw) // 3
-        parts['what_happened'] = raw[:third].strip()
-        parts['what_it_means'] = raw[third:2*third].strip()
-        parts['what_to_do_now'] = raw[2*third:].strip()
-        return parts
\ No newline at end of file
+
+
+# Instância global do cliente (o SDK da OpenAI só é importado no primeiro uso)
+openai_client = OpenAIClient()
+
+
+async def simplify_text(text: str) -> Dict[str, str]:
+    """Função de compatibilidade com o código existente"""
+    return await openai_client.simplify_text(text)
@@ -0,0 +1,322 @@
+"""
+Artefatos locais do modelo: preparação única e carga offline por mmap
+
+Preparação (uma vez por versão do modelo, a única etapa com rede):
+    python -m iadvogado.services.model_artifacts prepare [--model NOME] [--revision REV]
+        [--dtype bfloat16|float16|float32] [--quantize 4bit|8bit] [--source DIR] [--force]
+
+resolve a revisão no Hugging Face para um commit, baixa esse snapshot (ou usa
+um diretório local com `--source`), opcionalmente quantiza com bitsandbytes
+(exige GPU) e grava em `MODEL_ARTIFACTS_DIR/<org>--<modelo>/` os pesos em
+safetensors no dtype escolhido, o tokenizer e um `manifest.json` com o modelo,
+o commit, o dtype e o tamanho e o sha256 de cada arquivo.
+
+Com `MODEL_ARTIFACTS_DIR` definido, o LlamaClient carrega apenas desse
+diretório: sem token, sem `trust_remote_code` e sem acesso à rede. Na CPU os
+pesos ficam no dtype gravado (bf16 ocupa metade do float32) e os tensores
+apontam direto para os arquivos mapeados em memória (mmap): a carga não lê o
+modelo inteiro e processos na mesma máquina compartilham as páginas pelo page
+cache do sistema.
+
+No startup o manifesto é conferido: versão do formato, nome do modelo,
+revisão fixada (`LLAMA_MODEL_REVISION`) e presença e tamanho dos arquivos; com
+`MODEL_ARTIFACTS_VERIFY_HASH=true` também o sha256 (lê todos os pesos). Para
+conferir os hashes sob demanda:
+    python -m iadvogado.services.model_artifacts verify [--model NOME]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from ..config.config import settings
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+DTYPES = ("bfloat16", "float16", "float32")
+QUANTIZATIONS = ("4bit", "8bit")
+# Do snapshot só interessam configuração, tokenizer e pesos (os .bin só se não houver safetensors)
+_DOWNLOAD_PATTERNS = ["*.json", "*.safetensors", "tokenizer*", "*.model", "*.tiktoken"]
+_MAX_SHARD_SIZE = "2GB"
+
+
+class ArtifactError(Exception):
+    """Artefato ausente, corrompido ou de outra versão"""
+
+
+@dataclass
+class ModelArtifact:
+    """Diretório preparado de um modelo e o que o manifesto registra"""
+    model_name: str
+    path: str
+    revision: str
+    requested_revision: Optional[str] = None
+    dtype: str = "bfloat16"
+    quantization: Optional[str] = None
+    files: Dict[str, Dict] = field(default_factory=dict)
+
+    def pinned_to(self, revision: str) -> bool:
+        """A revisão fixada é o commit gravado (ou um prefixo dele) ou a ref usada na preparação"""
+        return self.revision.startswith(revision) or revision == self.requested_revision
+
+
+def artifact_path(model_name: str, root: Optional[str] = None) -> str:
+    """Diretório do artefato de um modelo (mesma convenção do cache do Hugging Face)"""
+    root = root or settings.model_artifacts_dir
+    if not root:
+        raise ArtifactError("MODEL_ARTIFACTS_DIR não definido")
+    return os.path.join(root, model_name.replace("/", "--"))
+
+
+def pinned_revision(model_name: str) -> Optional[str]:
+    """Revisão fixada na configuração (só para o modelo principal)"""
+    return settings.llama_model_revision if model_name == settings.llama_model_name else None
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(8 * 1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_manifest(path: str) -> ModelArtifact:
+    manifest_file = os.path.join(path, MANIFEST_NAME)
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise ArtifactError(f"Artefato não preparado em {path}: rode `python -m iadvogado.services.model_artifacts prepare`")
+    except (OSError, json.JSONDecodeError) as e:
+        raise ArtifactError(f"Manifesto ilegível em {manifest_file}: {e}")
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise ArtifactError(
+            f"Artefato em {path} no formato {manifest.get('format_version')} (esperado {FORMAT_VERSION}): prepare novamente"
+        )
+    return ModelArtifact(
+        model_name=manifest["model_name"],
+        path=path,
+        revision=manifest["revision"],
+        requested_revision=manifest.get("requested_revision"),
+        dtype=manifest["dtype"],
+        quantization=manifest.get("quantization"),
+        files=manifest["files"],
+    )
+
+
+def verify_artifact(model_name: str, path: Optional[str] = None, full_hash: bool = False) -> ModelArtifact:
+    """
+    Confere o artefato contra o manifesto e a configuração
+
+    Levanta ArtifactError se o modelo ou a revisão fixada não batem, ou se
+    algum arquivo falta ou mudou de tamanho (e, com `full_hash`, de sha256).
+    """
+    artifact = read_manifest(path or artifact_path(model_name))
+    if artifact.model_name != model_name:
+        raise ArtifactError(f"Artefato em {artifact.path} é de {artifact.model_name}, esperado {model_name}")
+    pin = pinned_revision(model_name)
+    if pin and not artifact.pinned_to(pin):
+        raise ArtifactError(
+            f"Artefato de {model_name} na revisão {artifact.revision[:12]}, mas LLAMA_MODEL_REVISION={pin}: prepare essa revisão"
+        )
+
+    for name, expected in artifact.files.items():
+        file_path = os.path.join(artifact.path, name)
+        if not os.path.isfile(file_path):
+            raise ArtifactError(f"Arquivo ausente no artefato de {model_name}: {name}")
+        if os.path.getsize(file_path) != expected["size"]:
+            raise ArtifactError(f"Tamanho diferente do manifesto no artefato de {model_name}: {name}")
+        if full_hash and _sha256(file_path) != expected["sha256"]:
+            raise ArtifactError(f"sha256 diferente do manifesto no artefato de {model_name}: {name}")
+    return artifact
+
+
+_verified: Dict[str, ModelArtifact] = {}
+
+
+def get_artifact(model_name: str) -> ModelArtifact:
+    """Artefato conferido do modelo (a conferência roda uma vez por processo)"""
+    if model_name not in _verified:
+        start = time.perf_counter()
+        artifact = verify_artifact(model_name, full_hash=settings.model_artifacts_verify_hash)
+        logger.info(
+            f"Artefato {model_name}@{artifact.revision[:12]} ({artifact.dtype}"
+            f"{', ' + artifact.quantization if artifact.quantization else ''}) conferido em {time.perf_counter() - start:.2f}s"
+        )
+        if not pinned_revision(model_name) and model_name == settings.llama_model_name:
+            logger.warning(f"LLAMA_MODEL_REVISION não definido: usando a revisão {artifact.revision[:12]} do artefato sem fixá-la")
+        _verified[model_name] = artifact
+    return _verified[model_name]
+
+
+def check_artifacts() -> List[ModelArtifact]:
+    """Confere no startup os artefatos dos modelos configurados (principal e menor)"""
+    models = [settings.llama_model_name]
+    if settings.llm_small_model:
+        models.append(settings.llm_small_model)
+    return [get_artifact(model) for model in models]
+
+
+def _download(model_name: str, revision: Optional[str], token: Optional[str]):
+    """Baixa o snapshot no commit resolvido; retorna (diretório, commit)"""
+    from huggingface_hub import HfApi, snapshot_download
+
+    info = HfApi(token=token).model_info(model_name, revision=revision, files_metadata=False)
+    patterns = list(_DOWNLOAD_PATTERNS)
+    if not any(sibling.rfilename.endswith(".safetensors") for sibling in info.siblings or []):
+        patterns.append("*.bin")
+    logger.info(f"Baixando {model_name}@{info.sha[:12]}...")
+    return snapshot_download(model_name, revision=info.sha, token=token, allow_patterns=patterns), info.sha
+
+
+def _convert(source: str, target: str, dtype: str, quantize: Optional[str]):
+    """Carrega o snapshot no dtype pedido e grava pesos em safetensors e o tokenizer em `target`"""
+    import torch
+    from transformers import AutoModelForCausalLM, AutoTokenizer
+
+    from .llama_client import bnb_quantization_config
+
+    model_kwargs = {"torch_dtype": getattr(torch, dtype), "local_files_only": True}
+    if quantize:
+        if not torch.cuda.is_available():
+            raise ArtifactError("Pré-quantização (bitsandbytes) exige GPU; prepare sem --quantize")
+        model_kwargs["quantization_config"] = bnb_quantization_config(quantize)
+        model_kwargs["device_map"] = "auto"
+    model = AutoModelForCausalLM.from_pretrained(source, **model_kwargs)
+    model.save_pretrained(target, safe_serialization=True, max_shard_size=_MAX_SHARD_SIZE)
+    AutoTokenizer.from_pretrained(source, local_files_only=True).save_pretrained(target)
+
+
+def _write_manifest(target: str, model_name: str, revision: str, requested: Optional[str], dtype: str, quantize: Optional[str]):
+    import torch
+    import transformers
+
+    files = {}
+    for root, _, names in os.walk(target):
+        for name in sorted(names):
+            file_path = os.path.join(root, name)
+            files[os.path.relpath(file_path, target).replace(os.sep, "/")] = {"size": os.path.getsize(file_path), "sha256": _sha256(file_path)}
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "model_name": model_name,
+        "revision": revision,
+        "requested_revision": requested,
+        "dtype": dtype,
+        "quantization": quantize,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "torch_version": torch.__version__,
+        "transformers_version": transformers.__version__,
+        "files": files,
+    }
+    with open(os.path.join(target, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+
+def prepare_artifact(
+    model_name: Optional[str] = None,
+    revision: Optional[str] = None,
+    dtype: Optional[str] = None,
+    quantize: Optional[str] = None,
+    source: Optional[str] = None,
+    root: Optional[str] = None,
+    force: bool = False,
+) -> ModelArtifact:
+    """
+    Prepara o artefato local de um modelo (etapa com rede, fora do servidor)
+
+    Se já existir um artefato íntegro do mesmo modelo, revisão, dtype e
+    quantização, nada é refeito (a menos que `force`). O novo diretório é
+    montado ao lado e trocado no fim: processos em execução continuam com os
+    arquivos antigos mapeados até recarregarem.
+    """
+    model_name = model_name or settings.llama_model_name
+    revision = revision or pinned_revision(model_name)
+    dtype = dtype or settings.model_artifacts_dtype
+    if dtype not in DTYPES:
+        raise ArtifactError(f"dtype desconhecido: '{dtype}'. Opções: {', '.join(DTYPES)}")
+    if quantize and quantize not in QUANTIZATIONS:
+        raise ArtifactError(f"Quantização desconhecida: '{quantize}'. Opções: {', '.join(QUANTIZATIONS)}")
+    target = artifact_path(model_name, root)
+
+    if not force and os.path.exists(os.path.join(target, MANIFEST_NAME)):
+        try:
+            existing = verify_artifact(model_name, target)
+        except ArtifactError as e:
+            logger.warning(f"Artefato existente inválido, preparando de novo: {e}")
+        else:
+            if (not revision or existing.pinned_to(revision)) and (existing.dtype, existing.quantization) == (dtype, quantize):
+                logger.info(f"Artefato de {model_name}@{existing.revision[:12]} já preparado em {target}")
+                return existing
+
+    if source:
+        snapshot, commit = source, revision or "local"
+    else:
+        token = os.getenv("HUGGING_FACE_HUB_TOKEN") or os.getenv("HF_TOKEN") or settings.hugging_face_hub_token
+        snapshot, commit = _download(model_name, revision, token)
+
+    os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+    partial, previous = target + ".partial", target + ".previous"
+    shutil.rmtree(partial, ignore_errors=True)
+    start = time.perf_counter()
+    try:
+        _convert(snapshot, partial, dtype, quantize)
+        _write_manifest(partial, model_name, commit, revision, dtype, quantize)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(target):
+        os.replace(target, previous)
+    os.replace(partial, target)
+    shutil.rmtree(previous, ignore_errors=True)
+    _verified.pop(model_name, None)
+    logger.info(f"Artefato de {model_name}@{commit[:12]} ({dtype}) preparado em {target} em {time.perf_counter() - start:.0f}s")
+    return read_manifest(target)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m iadvogado.services.model_artifacts", description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    prepare = commands.add_parser("prepare", help="baixa e converte o modelo para o diretório local")
+    prepare.add_argument("--model", help="padrão: LLAMA_MODEL_NAME")
+    prepare.add_argument("--revision", help="commit, tag ou branch (padrão: LLAMA_MODEL_REVISION)")
+    prepare.add_argument("--dtype", choices=DTYPES, help="padrão: MODEL_ARTIFACTS_DTYPE")
+    prepare.add_argument("--quantize", choices=QUANTIZATIONS, help="pré-quantiza com bitsandbytes (exige GPU)")
+    prepare.add_argument("--source", help="snapshot já baixado (diretório local), sem acessar a rede")
+    prepare.add_argument("--dir", help="padrão: MODEL_ARTIFACTS_DIR")
+    prepare.add_argument("--force", action="store_true", help="prepara de novo mesmo se já existir")
+
+    verify = commands.add_parser("verify", help="confere o manifesto e o sha256 de todos os arquivos")
+    verify.add_argument("--model", help="padrão: LLAMA_MODEL_NAME")
+    verify.add_argument("--dir", help="padrão: MODEL_ARTIFACTS_DIR")
+
+    args = parser.parse_args(argv)
+    model_name = args.model or settings.llama_model_name
+    try:
+        if args.command == "prepare":
+            artifact = prepare_artifact(model_name, args.revision, args.dtype, args.quantize, args.source, args.dir, args.force)
+        else:
+            artifact = verify_artifact(model_name, artifact_path(model_name, args.dir), full_hash=True)
+    except ArtifactError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return 1
+    print(f"✅ {artifact.model_name}@{artifact.revision[:12]} ({artifact.dtype}) em {artifact.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    sys.exit(main())
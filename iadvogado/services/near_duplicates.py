@@ -0,0 +1,174 @@
+"""
+Cache de quase-duplicatas: reaproveita simplificações de documentos parecidos
+
+Duas fotos da mesma página nunca geram o mesmo texto no OCR, e documentos do
+mesmo modelo de tribunal mudam só em datas e números. Um hash exato não
+reconhece nenhum dos dois casos; aqui cada documento (texto já normalizado)
+recebe um SimHash de 64 bits sobre trigramas de palavras, com os números
+mascarados, e a busca é feita no índice de `storage.near_duplicate_index`.
+
+Um candidato só é reaproveitado quando é seguro:
+- mesmo esqueleto (texto idêntico fora os números): os números que mudaram
+  são trocados na simplificação, desde que a troca seja inequívoca e nenhuma
+  data que mudou apareça por extenso (nome de mês ou dia da semana);
+- esqueleto diferente (ruído de OCR): só com os mesmos números CNJ, isto é, o
+  mesmo processo.
+Em ambos os casos, todo número citado na simplificação final precisa existir
+no novo documento; caso contrário o documento segue para o LLM.
+"""
+
+import hashlib
+import logging
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from ..storage.near_duplicate_index import FINGERPRINT_BITS, NearDuplicateEntry, get_near_duplicate_index
+
+logger = logging.getLogger(__name__)
+
+# Datas, horas, valores e números de processo são um token só: 15/03/2025, 14h30, 1.500,00
+_NUMBER = re.compile(r"\d+(?:[.,/:h-]\d+)*")
+_DIGITS = re.compile(r"\d+")
+_WORD = re.compile(r"\w+")
+_DATE_WORDS = re.compile(
+    r"\b(janeiro|fevereiro|mar[çc]o|abril|maio|junho|julho|agosto|setembro|outubro|novembro|dezembro|"
+    r"segunda|ter[çc]a|quarta|quinta|sexta|s[áa]bado|domingo)\b",
+    re.IGNORECASE,
+)
+_NUMBER_MASK = " 0 "
+SHINGLE_SIZE = 3
+# Textos muito curtos têm fingerprints pouco confiáveis
+MIN_TOKENS = 30
+# Respostas de fallback dos clientes LLM (modelo indisponível) não entram no cache
+_FALLBACK_PREFIX = "Documento jurídico analisado:"
+
+
+@dataclass
+class DocumentFingerprint:
+    """SimHash do texto, hash do esqueleto (sem números) e os números, na ordem"""
+    simhash: int
+    skeleton: str
+    numbers: List[str]
+    tokens: int
+
+
+@dataclass
+class NearDuplicateMatch:
+    """Simplificação reaproveitada de um documento parecido"""
+    simplified: Dict[str, str]
+    distance: int
+    kind: str  # "same_text", "patched" (números trocados) ou "same_process" (variação de OCR)
+    patched: List[str] = field(default_factory=list)  # números substituídos na simplificação
+
+    @property
+    def similarity(self) -> float:
+        return 1 - self.distance / FINGERPRINT_BITS
+
+
+def _feature_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(tokens: List[str], shingle_size: int = SHINGLE_SIZE) -> int:
+    """SimHash de 64 bits dos trigramas de palavras (cada trigrama distinto pesa 1)"""
+    if len(tokens) < shingle_size:
+        shingles = {" ".join(tokens)}
+    else:
+        shingles = {" ".join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)}
+    hashes = [_feature_hash(shingle) for shingle in shingles]
+    threshold = len(hashes) / 2
+    value = 0
+    for bit in range(FINGERPRINT_BITS):
+        mask = 1 << bit
+        if sum(1 for h in hashes if h & mask) > threshold:
+            value |= mask
+    return value
+
+
+def fingerprint_document(text: str) -> DocumentFingerprint:
+    numbers = _NUMBER.findall(text)
+    tokens = [token.casefold() for token in _WORD.findall(_NUMBER.sub(_NUMBER_MASK, text))]
+    skeleton = hashlib.blake2b(" ".join(tokens).encode("utf-8"), digest_size=16).hexdigest()
+    return DocumentFingerprint(simhash(tokens), skeleton, numbers, len(tokens))
+
+
+def _components(numbers: List[str]) -> Set[str]:
+    """Números inteiros e cada grupo de dígitos (15/03/2025 -> 15/03/2025, 15, 03, 2025)"""
+    values = set(numbers)
+    for number in numbers:
+        values.update(_DIGITS.findall(number))
+    return values
+
+
+def patch_numbers(simplified: Dict[str, str], old: List[str], new: List[str]) -> Optional[Tuple[Dict[str, str], List[str]]]:
+    """
+    Troca na simplificação os números que mudaram entre os documentos (mesmas posições)
+
+    Retorna a simplificação e os números substituídos, ou None se não for
+    seguro: um número antigo que virou valores diferentes em posições
+    diferentes, ou uma data alterada que a simplificação pode ter escrito por
+    extenso.
+    """
+    targets: Dict[str, Set[str]] = defaultdict(set)
+    for before, after in zip(old, new):
+        targets[before].add(after)
+    changed = {before: next(iter(after)) for before, after in targets.items() if len(after) == 1 and before not in after}
+    ambiguous = {before for before, after in targets.items() if len(after) > 1}
+
+    text = " ".join(simplified.values())
+    used = set(_NUMBER.findall(text))
+    if used & ambiguous:
+        return None
+    if _DATE_WORDS.search(text) and any("/" in before for before in changed):
+        return None
+    patched = {key: _NUMBER.sub(lambda m: changed.get(m.group(), m.group()), value) for key, value in simplified.items()}
+    return patched, sorted(used & changed.keys())
+
+
+def _supported(simplified: Dict[str, str], numbers: List[str]) -> bool:
+    """Todo número citado na simplificação existe no documento"""
+    available = _components(numbers)
+    return all(number in available for value in simplified.values() for number in _NUMBER.findall(value))
+
+
+def find_near_duplicate(fingerprint: DocumentFingerprint, process_numbers: List[str]) -> Optional[NearDuplicateMatch]:
+    """Simplificação reaproveitável de um documento já visto, ou None"""
+    if fingerprint.tokens < MIN_TOKENS:
+        return None
+    index = get_near_duplicate_index()
+    for candidate, distance in index.candidates(fingerprint.simhash):
+        entry = index.get(candidate)
+        if entry is None:
+            continue
+        if entry.skeleton == fingerprint.skeleton:
+            result = patch_numbers(entry.simplified, entry.numbers, fingerprint.numbers)
+            if result is None:
+                continue
+            simplified, patched = result
+            kind = "patched" if patched else "same_text"
+        elif process_numbers and set(process_numbers) == set(entry.process_numbers):
+            simplified, patched, kind = entry.simplified, [], "same_process"
+        else:
+            continue
+        if _supported(simplified, fingerprint.numbers):
+            return NearDuplicateMatch(simplified, distance, kind, patched)
+    return None
+
+
+def remember_simplification(
+    fingerprint: DocumentFingerprint,
+    process_numbers: List[str],
+    simplified: Dict[str, str],
+    retention_until: datetime,
+) -> bool:
+    """Guarda a simplificação gerada pelo LLM para documentos parecidos"""
+    if fingerprint.tokens < MIN_TOKENS:
+        return False
+    if not all(value.strip() for value in simplified.values()) or simplified.get("what_happened", "").startswith(_FALLBACK_PREFIX):
+        return False
+    entry = NearDuplicateEntry(fingerprint.simhash, fingerprint.skeleton, fingerprint.numbers, list(process_numbers), simplified)
+    get_near_duplicate_index().add(entry, retention_until)
+    return True
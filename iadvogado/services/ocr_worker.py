@@ -1,11 +1,60 @@
-from PIL import Image
-import pytesseract
 import io
+from functools import lru_cache
+from typing import BinaryIO, List, Union
+from ..config.config import settings
 
 # Simple OCR wrapper. For production consider using external OCR services for better accuracy.
+# PIL e pytesseract são importados na primeira chamada para não pesar no start da API.
 
-def image_bytes_to_text(image_bytes: bytes) -> str:
-    image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
-    # You can add preprocessing here
-    text = pytesseract.image_to_string(image, lang='por')
-    return text
\ No newline at end of file
+ImageSource = Union[bytes, BinaryIO]
+
+@lru_cache(maxsize=1)
+def upload_image_formats() -> List[str]:
+    """Formatos que o cliente pode usar ao recodificar a foto, em ordem de preferência"""
+    from PIL import features
+
+    return (["image/webp"] if features.check("webp") else []) + ["image/jpeg"]
+
+
+def load_image_for_ocr(source: ImageSource, max_side: int | None = None):
+    """
+    Decodifica a imagem já na resolução usada pelo OCR
+
+    JPEGs são decodificados em escala reduzida (draft mode: 1/2, 1/4 ou 1/8
+    direto no DCT) e em tons de cinza, sem materializar a foto em tamanho
+    cheio. Outros formatos são reduzidos com `thumbnail` (reduce + resample).
+    Todos saem em tons de cinza ("L"), que é o que o tesseract usa.
+    """
+    from PIL import Image
+
+    max_side = max_side or settings.ocr_max_image_side
+    fp = io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+    image = Image.open(fp)
+
+    if max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        target = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        if image.format == "JPEG":
+            # Só tem efeito antes do load(); escolhe a maior redução que ainda cobre `target`
+            image.draft("L", target)
+        image.thumbnail((max_side, max_side), reducing_gap=2.0)
+    elif image.format == "JPEG":
+        image.draft("L", image.size)
+
+    if image.mode != "L":
+        # WebP e PNG vêm em RGB(A) ou paleta; converter depois de reduzir custa menos
+        converted = image.convert("L")
+        image.close()
+        image = converted
+    return image
+
+
+def image_bytes_to_text(image_bytes: ImageSource) -> str:
+    """Extrai texto de bytes ou de um arquivo (ex.: upload em arquivo temporário)"""
+    import pytesseract
+
+    image = load_image_for_ocr(image_bytes)
+    try:
+        return pytesseract.image_to_string(image, lang='por')
+    finally:
+        image.close()
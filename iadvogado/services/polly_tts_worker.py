@@ -0,0 +1,58 @@
+"""
+Amazon Polly Worker para IADvogado
+Provedor alternativo de TTS; as chamadas ao boto3 rodam em thread separada
+"""
+
+import asyncio
+import logging
+from typing import Dict
+from ..config.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PollyTTSWorker:
+    """Worker para conversão de texto em áudio usando Amazon Polly"""
+
+    def __init__(self):
+        self.voice = settings.polly_voice
+        self.region = settings.aws_region
+        self._client = None
+
+    def _get_client(self):
+        """Cria o cliente boto3 sob demanda (import tardio)"""
+        if self._client is None:
+            import boto3
+            self._client = boto3.client("polly", region_name=self.region)
+        return self._client
+
+    def _synthesize(self, text: str) -> bytes:
+        """Síntese síncrona (executada fora do event loop)"""
+        response = self._get_client().synthesize_speech(
+            Text=text,
+            OutputFormat="mp3",
+            VoiceId=self.voice,
+            Engine="neural",
+            LanguageCode="pt-BR",
+        )
+        with response["AudioStream"] as stream:
+            return stream.read()
+
+    async def text_to_speech_bytes(self, text: str) -> bytes:
+        """Converte texto em áudio MP3 sem bloquear o event loop"""
+        audio_data = await asyncio.to_thread(self._synthesize, text)
+        logger.info(f"Áudio Polly gerado: {len(audio_data)} bytes")
+        return audio_data
+
+    def get_metrics(self) -> Dict:
+        return {}
+
+    def get_cache_info(self) -> Dict:
+        return {"enabled": False}
+
+    def clear_cache(self) -> int:
+        return 0
+
+
+# Instância global do worker (boto3 só é importado no primeiro uso)
+polly_tts_worker = PollyTTSWorker()
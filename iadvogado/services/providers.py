@@ -0,0 +1,179 @@
+"""
+Registro de provedores de LLM e TTS
+
+O provedor é escolhido a partir de `settings.llm_provider` / `settings.tts_provider`
+e o módulo correspondente só é importado quando selecionado. Assim, dependências
+pesadas (torch, transformers, edge_tts, openai, boto3) não são carregadas por
+processos que não as utilizam.
+"""
+
+import asyncio
+import importlib
+import inspect
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from ..config.config import settings
+from ..core.cancellation import CancellationToken
+from ..core.profiling import run_profiled
+from .audio_formats import MP3, SynthesizedAudio, deliverable_format, resolve_audio_format, single_chunk, transcode
+
+logger = logging.getLogger(__name__)
+
+# nome do provedor -> (módulo em iadvogado.services, instância global)
+LLM_PROVIDERS: Dict[str, Tuple[str, str]] = {
+    "llama": ("llama_client", "llama_client"),
+    "openai": ("llm_client", "openai_client"),
+}
+
+TTS_PROVIDERS: Dict[str, Tuple[str, str]] = {
+    "edge": ("edge_tts_worker", "edge_tts_worker"),
+    "google": ("tts_worker", "google_tts_worker"),
+    "amazon": ("polly_tts_worker", "polly_tts_worker"),
+}
+
+_instances: Dict[Tuple[str, str], Any] = {}
+_small_clients: Dict[Tuple[str, str], Any] = {}
+_inference_slots: Optional[asyncio.Semaphore] = None
+
+
+def _resolve(registry: Dict[str, Tuple[str, str]], kind: str, name: str) -> Any:
+    """Importa (uma única vez) e retorna a instância do provedor"""
+    name = (name or "").lower()
+    if name not in registry:
+        raise ValueError(
+            f"Provedor de {kind} desconhecido: '{name}'. "
+            f"Opções: {', '.join(sorted(registry))}"
+        )
+
+    key = (kind, name)
+    if key not in _instances:
+        module_name, attr = registry[name]
+        module = importlib.import_module(f".{module_name}", package=__package__)
+        _instances[key] = getattr(module, attr)
+        logger.info(f"Provedor de {kind} carregado: {name}")
+    return _instances[key]
+
+
+def get_llm_client(name: str | None = None) -> Any:
+    """Retorna o cliente LLM configurado (ou o informado)"""
+    return _resolve(LLM_PROVIDERS, "LLM", name or settings.llm_provider)
+
+
+def get_small_llm_client() -> Optional[Any]:
+    """Cliente do modelo menor (`settings.llm_small_model`) usado sob sobrecarga, se configurado"""
+    if not settings.llm_small_model:
+        return None
+    key = (settings.llm_provider, settings.llm_small_model)
+    if key not in _small_clients:
+        _small_clients[key] = get_llm_client().with_model(settings.llm_small_model)
+        logger.info(f"Modelo menor para degradação: {settings.llm_small_model}")
+    return _small_clients[key]
+
+
+def small_llm_ready() -> bool:
+    """Modelo menor configurado e já carregado (não é carregado no meio de um pico)"""
+    client = get_small_llm_client()
+    return client is not None and client.ready
+
+
+async def warmup_small_llm():
+    """Carrega o modelo menor em thread (startup), para que esteja pronto no primeiro pico"""
+    client = get_small_llm_client()
+    if client is None or client.ready:
+        return
+    try:
+        await asyncio.to_thread(client.warmup)
+    except Exception as e:
+        logger.error(f"Não foi possível carregar o modelo menor ({settings.llm_small_model}): {e}")
+
+
+def get_tts_worker(name: str | None = None) -> Any:
+    """Retorna o worker TTS configurado (ou o informado)"""
+    return _resolve(TTS_PROVIDERS, "TTS", name or settings.tts_provider)
+
+
+def _get_inference_slots() -> asyncio.Semaphore:
+    global _inference_slots
+    if _inference_slots is None:
+        _inference_slots = asyncio.Semaphore(max(1, settings.llm_concurrency))
+    return _inference_slots
+
+
+def _token_budget(max_new_tokens: Optional[int]) -> Optional[int]:
+    """Orçamento reduzido nunca acima do configurado"""
+    return min(max_new_tokens, settings.llama_max_tokens) if max_new_tokens else None
+
+
+async def simplify_text(
+    text: str,
+    cancel_token: Optional[CancellationToken] = None,
+    max_new_tokens: Optional[int] = None,
+    small_model: bool = False,
+) -> Dict[str, str]:
+    """
+    Simplifica texto usando o provedor de LLM configurado
+
+    Clientes síncronos (Llama local) rodam em thread, fora do event loop, com
+    no máximo `settings.llm_concurrency` gerações simultâneas. Requisições
+    canceladas enquanto aguardam a vez saem da fila sem chegar ao modelo.
+    `max_new_tokens` e `small_model` vêm do nível de serviço (core.degradation).
+    """
+    client = (small_model and get_small_llm_client()) or get_llm_client()
+    max_new_tokens = _token_budget(max_new_tokens)
+    if inspect.iscoroutinefunction(client.simplify_text):
+        return await client.simplify_text(text, cancel_token=cancel_token, max_new_tokens=max_new_tokens)
+
+    async with _get_inference_slots():
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        return await asyncio.to_thread(run_profiled, "llm", client.simplify_text, text, cancel_token, max_new_tokens)
+
+
+async def simplify_batch(
+    texts: List[str],
+    cancel_token: Optional[CancellationToken] = None,
+    max_new_tokens: Optional[int] = None,
+    small_model: bool = False,
+) -> List[Dict[str, str]]:
+    """
+    Simplifica um lote de textos (pipeline do /batch)
+
+    Clientes com `simplify_batch` síncrono (Llama local) geram o lote numa única
+    chamada, ocupando uma vaga de inferência; os demais recebem os textos em
+    paralelo, um por chamada.
+    """
+    client = (small_model and get_small_llm_client()) or get_llm_client()
+    max_new_tokens = _token_budget(max_new_tokens)
+    batch = getattr(client, "simplify_batch", None)
+    if batch is None or inspect.iscoroutinefunction(batch):
+        return list(await asyncio.gather(
+            *(simplify_text(text, cancel_token, max_new_tokens, small_model) for text in texts)
+        ))
+
+    async with _get_inference_slots():
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()
+        return await asyncio.to_thread(run_profiled, "llm", batch, texts, cancel_token, max_new_tokens)
+
+
+async def text_to_speech_bytes(text: str) -> bytes:
+    """Converte texto em áudio usando o provedor de TTS configurado"""
+    return await get_tts_worker().text_to_speech_bytes(text)
+
+
+async def synthesize_speech(text: str, audio_format: Optional[str] = None) -> SynthesizedAudio:
+    """
+    Converte texto em áudio no formato pedido (padrão: `settings.tts_audio_format`)
+
+    O Edge transcodifica durante a síntese e guarda cada formato no cache; os
+    demais provedores entregam MP3, convertido depois. Sem ffmpeg, o áudio
+    sai em MP3 e `SynthesizedAudio.format` indica isso.
+    """
+    fmt = deliverable_format(resolve_audio_format(audio_format))
+    worker = get_tts_worker()
+    if getattr(worker, "streams_audio_formats", False):
+        return SynthesizedAudio(await worker.text_to_speech_bytes(text, audio_format=fmt.name), fmt)
+    audio = await worker.text_to_speech_bytes(text)
+    if fmt is not MP3:
+        audio = await transcode(single_chunk(audio), fmt)
+    return SynthesizedAudio(audio, fmt)
@@ -0,0 +1,180 @@
+"""
+Normalização do texto jurídico extraído pelo OCR antes de ir para o LLM
+
+A saída bruta do tesseract traz cabeçalhos e rodapés repetidos em cada página,
+timbres, palavras hifenizadas na quebra de linha, blocos de assinatura e códigos
+de validação eletrônica (PJe, e-SAJ). Tudo isso custa tokens de prefill e pode
+empurrar o conteúdo real para além do truncamento do prompt.
+
+Etapas (todas com expressões pré-compiladas, em uma passada por linha):
+1. limpeza de caracteres (hífen condicional, NBSP, ligaduras);
+2. junção de palavras hifenizadas na quebra de linha (exceto pronomes
+   enclíticos: "Intime-\nse" vira "Intime-se");
+3. remoção de boilerplate conhecido de PJe/e-SAJ;
+4. remoção de cabeçalhos e rodapés repetidos: linhas nas bordas de uma página
+   (páginas separadas por form feed) que também aparecem nas bordas de outra;
+   fica a primeira ocorrência, e repetições no corpo ("Intime-se.", nomes das
+   partes) são mantidas;
+5. colapso de espaços e linhas em branco.
+"""
+
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional, Pattern, Set, Tuple
+
+_CHAR_REPLACEMENTS = str.maketrans({
+    "\u00ad": "",   # hífen condicional
+    "\u00a0": " ",  # NBSP
+    "\u200b": "",   # zero-width space
+    "\ufb01": "fi",
+    "\ufb02": "fl",
+    "\u2010": "-",
+    "\u2011": "-",
+})
+
+# Quebra de página do tesseract
+_PAGE_BREAK = "\f"
+# "intima-\nção" -> "intimação" (só quando a linha seguinte continua em minúscula)
+_HYPHENATED_BREAK = re.compile(r"(\w)-[ \t]*\n[ \t]*([a-zà-ÿ]\w*)")
+# Pronomes átonos depois do hífen ("Intime-se", "Cite-o", "intimá-lo"): o hífen
+# fica. Num fragmento ambíguo ("análi-\nse") sobra um hífen, nunca uma palavra colada
+_CLITICS = frozenset(
+    ("o", "a", "os", "as", "lo", "la", "los", "las", "no", "na", "nos", "nas", "me", "te", "se", "lhe", "lhes", "vos")
+)
+_SPACES = re.compile(r"[ \t\u2000-\u200a\u202f\u3000]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+# Linhas sem nenhuma letra ou dígito (traços, linhas de assinatura, ruído do OCR)
+_NOISE_LINE = re.compile(r"^[\W_]*$")
+
+# Boilerplate dos sistemas processuais: a linha inteira é descartada
+BOILERPLATE_PATTERNS: Tuple[str, ...] = (
+    # PJe
+    r"^(documento )?assinado eletronicamente (por|em)\b",
+    r"^https?://\S*pje\S*",
+    r"\bconsultadocumento/listview\.seam\b",
+    r"^n[úu]mero do documento:?\s*\d+",
+    r"^num\.?\s*\d+\s*-\s*p[áa]g\.?\s*\d+",
+    r"^id\.?\s*[0-9a-f]{6,}\s*-?\s*p[áa]g",
+    # e-SAJ
+    r"^este documento [ée] c[óo]pia do original",
+    r"^para conferir o original,? acesse",
+    r"\bpastadigital/pg/abrirconferenciadocumento\b",
+    r"^(documento )?assinado digitalmente",
+    r"^fls?\.\s*\d+\s*$",
+    # Comuns
+    # Rodapés que citam a MP 2.200-2/2001 ou a Lei 11.419/2006 como fundamento da assinatura
+    r"^(documento )?(assinado|certificado)\b.*\b(2\.200-2/2001|11\.419/2006)\b",
+    r"^c[óo]digo (de )?(valida[çc][ãa]o|verifica[çc][ãa]o|do documento)\b",
+    r"^(p[áa]gina|p[áa]g\.?)\s*\d+\s*(de|/)\s*\d+\s*$",
+    r"^\(?assinatura (eletr[ôo]nica|digital)\)?\s*$",
+)
+# Uma única alternação: cada linha é testada numa só busca
+_BOILERPLATE: Pattern[str] = re.compile("|".join(f"(?:{p})" for p in BOILERPLATE_PATTERNS), re.IGNORECASE)
+
+# Linhas repetidas com até este tamanho são tratadas como cabeçalho/rodapé
+_MAX_REPEATED_LINE = 160
+# Linhas de conteúdo no início e no fim de cada página onde ficam cabeçalho e rodapé
+_PAGE_EDGE_LINES = 4
+# Estimativa de tokens: palavras e sinais isolados (próxima de um BPE em português)
+_TOKEN_ESTIMATE = re.compile(r"\w+|[^\w\s]")
+
+
+@dataclass
+class NormalizationResult:
+    """Texto normalizado e a redução obtida"""
+    text: str
+    original_tokens: int
+    normalized_tokens: int
+    removed_lines: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.normalized_tokens
+
+    @property
+    def reduction(self) -> float:
+        """Fração dos tokens removida (0.0 a 1.0)"""
+        return self.tokens_saved / self.original_tokens if self.original_tokens else 0.0
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa barata do número de tokens (não carrega o tokenizer do modelo)"""
+    return len(_TOKEN_ESTIMATE.findall(text))
+
+
+def _join_hyphenated(match: "re.Match[str]") -> str:
+    start, rest = match.groups()
+    if rest in _CLITICS:
+        return f"{start}-{rest}"
+    return start + rest
+
+
+def _page_edges(lines: List[Optional[str]]) -> Set[int]:
+    """Índices das primeiras e últimas linhas de conteúdo da página"""
+    content = [i for i, line in enumerate(lines) if line]
+    return set(content[:_PAGE_EDGE_LINES] + content[-_PAGE_EDGE_LINES:])
+
+
+def normalize_lines(text: str) -> Tuple[List[str], int]:
+    """Aplica as etapas de limpeza e retorna (linhas mantidas, linhas removidas)"""
+    text = text.translate(_CHAR_REPLACEMENTS).replace("\r\n", "\n").replace("\r", "\n")
+    text = _HYPHENATED_BREAK.sub(_join_hyphenated, text)
+
+    # Por página: "" para linha em branco, None para ruído/boilerplate, senão a linha
+    pages: List[List[Optional[str]]] = []
+    removed = 0
+    for page in text.split(_PAGE_BREAK):
+        lines: List[Optional[str]] = []
+        for raw_line in page.split("\n"):
+            line = _SPACES.sub(" ", raw_line).strip()
+            if line and (_NOISE_LINE.match(line) or _BOILERPLATE.search(line)):
+                removed += 1
+                line = None
+            lines.append(line)
+        pages.append(lines)
+
+    # Cabeçalho/rodapé: linha curta que aparece nas bordas de mais de uma página.
+    # Numeração de página fica para os padrões acima: datas e valores em linhas
+    # parecidas não podem ser confundidos
+    edges = [_page_edges(lines) for lines in pages]
+    edge_counts = Counter(
+        key
+        for lines, indexes in zip(pages, edges)
+        for key in {lines[i].casefold() for i in indexes if len(lines[i]) <= _MAX_REPEATED_LINE}
+    )
+    repeated = {key for key, count in edge_counts.items() if count > 1}
+
+    kept: List[str] = []
+    seen = set()
+    for lines, indexes in zip(pages, edges):
+        for i, line in enumerate(lines):
+            if line is None:
+                continue
+            key = line.casefold()
+            if i in indexes and key in repeated:
+                if key in seen:
+                    removed += 1
+                    continue
+                seen.add(key)
+            # Linha em branco marca parágrafo; o colapso acontece no final
+            kept.append(line)
+        # A quebra de página também separa parágrafos
+        kept.append("")
+    return kept, removed
+
+
+def normalize_legal_text(text: str) -> NormalizationResult:
+    """Normaliza o texto do OCR; se nada sobrar, mantém o original"""
+    lines, removed = normalize_lines(text)
+    normalized = _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+    if not normalized:
+        normalized = text.strip()
+        removed = 0
+
+    return NormalizationResult(
+        text=normalized,
+        original_tokens=estimate_tokens(text),
+        normalized_tokens=estimate_tokens(normalized),
+        removed_lines=removed,
+    )
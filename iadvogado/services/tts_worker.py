@@ -1,9 +1,55 @@
-from gtts import gTTS
+"""
+Google TTS (gTTS) Worker para IADvogado
+Provedor alternativo de TTS; a síntese bloqueante roda em thread separada
+"""
+
+import asyncio
 import io
+import logging
+from typing import Dict
+
+logger = logging.getLogger(__name__)
+
+
+class GoogleTTSWorker:
+    """Worker para conversão de texto em áudio usando gTTS"""
+
+    def __init__(self, lang: str = 'pt', tld: str = 'com.br'):
+        self.lang = lang
+        self.tld = tld
+        self.voice = f"gtts-{lang}-{tld}"
+
+    def _synthesize(self, text: str) -> bytes:
+        """Síntese síncrona (executada fora do event loop)"""
+        from gtts import gTTS
+
+        tts = gTTS(text, lang=self.lang, tld=self.tld)
+        b = io.BytesIO()
+        tts.write_to_fp(b)
+        return b.getvalue()
+
+    async def text_to_speech_bytes(self, text: str) -> bytes:
+        """Converte texto em áudio MP3 sem bloquear o event loop"""
+        audio_data = await asyncio.to_thread(self._synthesize, text)
+        logger.info(f"Áudio gTTS gerado: {len(audio_data)} bytes")
+        return audio_data
+
+    def get_metrics(self) -> Dict:
+        return {}
+
+    def get_cache_info(self) -> Dict:
+        return {"enabled": False}
+
+    def clear_cache(self) -> int:
+        return 0
+
+
+# Instância global do worker (gTTS só é importado no primeiro uso)
+google_tts_worker = GoogleTTSWorker()
+
 
-def text_to_speech_bytes(text: str, lang: str = 'pt') -> bytes:
-    tts = gTTS(text, lang=lang)
-    b = io.BytesIO()
-    tts.write_to_fp(b)
-    b.seek(0)
-    return b.read()
\ No newline at end of file
+async def text_to_speech_bytes(text: str, lang: str = 'pt') -> bytes:
+    """Função de compatibilidade com o código existente"""
+    if lang == google_tts_worker.lang:
+        return await google_tts_worker.text_to_speech_bytes(text)
+    return await GoogleTTSWorker(lang=lang).text_to_speech_bytes(text)
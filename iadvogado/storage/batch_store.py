@@ -0,0 +1,104 @@
+"""
+Resultados de lotes (/batch) já concluídos, para retomar lotes interrompidos
+
+Cada documento concluído é gravado com a chave (batch_id, hash do conteúdo).
+Ao reenviar o mesmo lote com o mesmo batch_id, os documentos já concluídos são
+devolvidos daqui sem OCR nem LLM; os que falharam são processados de novo. Arquivo SQLite local (WAL), compartilhado
+pelos workers da mesma máquina; os registros expiram com a retenção de dados.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from ..config.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class BatchStore:
+    """Resultados por lote e documento"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS batch_results (
+                batch_id TEXT NOT NULL,
+                document_key TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                retention_until TEXT NOT NULL,
+                PRIMARY KEY (batch_id, document_key)
+            )"""
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def completed(self, batch_id: str) -> Dict[str, dict]:
+        """Resultados já concluídos com sucesso do lote, por chave do documento (falhas são reprocessadas)"""
+        rows = self._connect().execute(
+            "SELECT document_key, result FROM batch_results WHERE batch_id = ? AND retention_until > ?",
+            (batch_id, datetime.now(timezone.utc).isoformat()),
+        )
+        results = ((key, json.loads(result)) for key, result in rows)
+        return {key: result for key, result in results if result.get("status") == "ok"}
+
+    def save(self, batch_id: str, document_key: str, result: dict, retention_until: datetime):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO batch_results (batch_id, document_key, result, created_at, retention_until) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (batch_id, document_key, json.dumps(result, ensure_ascii=False),
+                 datetime.now(timezone.utc).isoformat(), retention_until.isoformat()),
+            )
+        self._writes += 1
+        if self._writes % 500 == 0:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        with self._connect() as conn:
+            deleted = conn.execute(
+                "DELETE FROM batch_results WHERE retention_until <= ?", (datetime.now(timezone.utc).isoformat(),)
+            ).rowcount
+        if deleted:
+            logger.info(f"Lotes: {deleted} resultado(s) expirado(s) removido(s)")
+        return deleted
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_store: Optional[BatchStore] = None
+_store_lock = threading.Lock()
+
+
+def get_batch_store() -> BatchStore:
+    """Store do processo (criado no primeiro uso)"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BatchStore(settings.batch_store_path)
+        return _store
+
+
+def close_batch_store():
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.close()
+            _store = None
@@ -0,0 +1,219 @@
+"""
+Índice de quase-duplicatas (SimHash de 64 bits) das simplificações já geradas
+
+Busca por distância de Hamming com LSH em bandas: o fingerprint é dividido em
+`max_distance + 1` bandas e, pelo princípio da casa dos pombos, qualquer
+fingerprint a até `max_distance` bits de distância coincide em pelo menos uma
+banda inteira. Cada banda é uma tabela hash (valor da banda -> fingerprints),
+então a consulta só examina os baldes das bandas do documento, e não o índice
+inteiro; a inserção é O(bandas).
+
+Em memória ficam apenas os fingerprints (8 bytes por banda, em arrays) e o id
+do registro mais recente de cada fingerprint; o conteúdo (simplificação,
+números do documento) fica num arquivo SQLite local (WAL), carregado no
+primeiro uso e lido só para os candidatos. Registros gravados por outros
+workers da mesma máquina entram no índice a cada `REFRESH_SECONDS`.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from ..config.config import settings
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_BITS = 64
+REFRESH_SECONDS = 5.0
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS near_duplicates (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fingerprint INTEGER NOT NULL,
+        skeleton TEXT NOT NULL,
+        numbers TEXT NOT NULL,
+        process_numbers TEXT NOT NULL,
+        simplified TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        retention_until TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS near_duplicates_retention ON near_duplicates (retention_until)",
+)
+
+
+def _to_signed(value: int) -> int:
+    """SQLite guarda inteiros de 64 bits com sinal"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+@dataclass
+class NearDuplicateEntry:
+    """Documento já simplificado: esqueleto do texto, números e simplificação"""
+    fingerprint: int
+    skeleton: str
+    numbers: List[str]
+    process_numbers: List[str]
+    simplified: Dict[str, str]
+
+
+class NearDuplicateIndex:
+    """SimHash -> simplificação, com busca por distância de Hamming"""
+
+    def __init__(self, path: str, max_distance: int):
+        self.path = path
+        self.max_distance = max(0, min(max_distance, FINGERPRINT_BITS // 2 - 1))
+        self._bands = self._band_layout(self.max_distance + 1)
+        self._buckets: List[Dict[int, array]] = [{} for _ in self._bands]
+        self._rows: Dict[int, int] = {}  # fingerprint -> id do registro mais recente
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._last_id = 0
+        self._refreshed = 0.0
+        self._writes = 0
+
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            conn.execute(statement)
+        start = time.perf_counter()
+        self.refresh()
+        logger.info(f"Índice de quase-duplicatas: {len(self._rows)} documentos carregados em {time.perf_counter() - start:.2f}s")
+
+    @staticmethod
+    def _band_layout(count: int) -> List[Tuple[int, int]]:
+        """(deslocamento, máscara) de cada banda; a última fica com os bits restantes"""
+        width = FINGERPRINT_BITS // count
+        layout = []
+        for band in range(count):
+            bits = width if band < count - 1 else FINGERPRINT_BITS - width * (count - 1)
+            layout.append((band * width, (1 << bits) - 1))
+        return layout
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def _insert(self, row_id: int, fingerprint: int):
+        """Chamar com o lock"""
+        if fingerprint not in self._rows:
+            for (shift, mask), buckets in zip(self._bands, self._buckets):
+                key = (fingerprint >> shift) & mask
+                bucket = buckets.get(key)
+                if bucket is None:
+                    buckets[key] = bucket = array("Q")
+                bucket.append(fingerprint)
+        self._rows[fingerprint] = row_id
+        self._last_id = max(self._last_id, row_id)
+
+    def refresh(self):
+        """Carrega registros gravados desde a última leitura (inclusive por outros workers)"""
+        rows = self._connect().execute(
+            "SELECT id, fingerprint FROM near_duplicates WHERE id > ? AND retention_until > ? ORDER BY id",
+            (self._last_id, datetime.now(timezone.utc).isoformat()),
+        ).fetchall()
+        with self._lock:
+            for row_id, fingerprint in rows:
+                self._insert(row_id, _to_unsigned(fingerprint))
+            self._refreshed = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, entry: NearDuplicateEntry, retention_until: datetime) -> int:
+        with self._connect() as conn:
+            row_id = conn.execute(
+                "INSERT INTO near_duplicates (fingerprint, skeleton, numbers, process_numbers, simplified, "
+                "created_at, retention_until) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (_to_signed(entry.fingerprint), entry.skeleton, json.dumps(entry.numbers),
+                 json.dumps(entry.process_numbers), json.dumps(entry.simplified, ensure_ascii=False),
+                 datetime.now(timezone.utc).isoformat(), retention_until.isoformat()),
+            ).lastrowid
+        with self._lock:
+            self._insert(row_id, entry.fingerprint)
+        self._writes += 1
+        if self._writes % 500 == 0:
+            self.purge_expired()
+        return row_id
+
+    def candidates(self, fingerprint: int) -> List[Tuple[int, int]]:
+        """(fingerprint, distância) dos documentos a até `max_distance` bits, do mais próximo ao mais distante"""
+        if time.monotonic() - self._refreshed > REFRESH_SECONDS:
+            self.refresh()
+        found: Dict[int, int] = {}
+        with self._lock:
+            for (shift, mask), buckets in zip(self._bands, self._buckets):
+                for candidate in buckets.get((fingerprint >> shift) & mask, ()):
+                    if candidate in found or candidate not in self._rows:
+                        continue
+                    distance = (candidate ^ fingerprint).bit_count()
+                    if distance <= self.max_distance:
+                        found[candidate] = distance
+        return sorted(found.items(), key=lambda match: match[1])
+
+    def get(self, fingerprint: int) -> Optional[NearDuplicateEntry]:
+        """Registro mais recente do fingerprint, se ainda dentro da retenção"""
+        row_id = self._rows.get(fingerprint)
+        if row_id is None:
+            return None
+        row = self._connect().execute(
+            "SELECT skeleton, numbers, process_numbers, simplified FROM near_duplicates "
+            "WHERE id = ? AND retention_until > ?",
+            (row_id, datetime.now(timezone.utc).isoformat()),
+        ).fetchone()
+        if row is None:
+            # Expirado: sai do índice em memória (o balde é limpo na próxima carga)
+            with self._lock:
+                if self._rows.get(fingerprint) == row_id:
+                    del self._rows[fingerprint]
+            return None
+        skeleton, numbers, process_numbers, simplified = row
+        return NearDuplicateEntry(fingerprint, skeleton, json.loads(numbers), json.loads(process_numbers), json.loads(simplified))
+
+    def purge_expired(self) -> int:
+        with self._connect() as conn:
+            deleted = conn.execute(
+                "DELETE FROM near_duplicates WHERE retention_until <= ?", (datetime.now(timezone.utc).isoformat(),)
+            ).rowcount
+        if deleted:
+            logger.info(f"Índice de quase-duplicatas: {deleted} registro(s) expirado(s) removido(s)")
+        return deleted
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+_index: Optional[NearDuplicateIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    """Índice do processo (carregado no primeiro uso)"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = NearDuplicateIndex(settings.near_duplicate_path, settings.near_duplicate_max_distance)
+        return _index
+
+
+def close_near_duplicate_index():
+    global _index
+    with _index_lock:
+        if _index is not None:
+            _index.close()
+            _index = None
@@ -0,0 +1,211 @@
+"""
+Índice local de documentos por número de processo (CNJ)
+
+Cada documento processado é indexado pelo seu número CNJ principal (o
+primeiro do texto, o do cabeçalho; números citados no corpo são de outros
+processos), junto com a simplificação entregue. `/process-number` responde com
+uma consulta indexada, sem OCR nem LLM. Documentos enviados por usuários
+(`/upload`, `/batch`) só são servidos ao mesmo `user_id` (ou telefone); os
+obtidos de fontes do tribunal (court fetchers) são públicos. O `user_id` e o
+telefone vêm do cliente e não são autenticados: o escopo evita misturar os
+documentos de usuários diferentes, mas não é controle de acesso. O índice é um arquivo SQLite local (WAL),
+compartilhado pelos workers da mesma máquina; registros expiram junto com a
+retenção de dados (`data_retention_days`).
+
+Documentos em segredo de justiça não são indexados.
+"""
+
+import json
+import logging
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from ..config.config import settings
+
+logger = logging.getLogger(__name__)
+
+_SEALED = re.compile(r"segredo\s+de\s+justi[çc]a", re.IGNORECASE)
+# Origens de documentos enviados por usuários: privados de quem enviou
+USER_SOURCES = ("upload", "batch")
+
+_SCHEMA = (
+    """CREATE TABLE IF NOT EXISTS documents (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        process_number TEXT NOT NULL,
+        user_id TEXT,
+        simplified TEXT NOT NULL,
+        payload_text TEXT NOT NULL,
+        generated_by TEXT NOT NULL,
+        document_type TEXT,
+        source TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        retention_until TEXT NOT NULL
+    )""",
+    "CREATE INDEX IF NOT EXISTS documents_process_number ON documents (process_number, created_at)",
+    "CREATE INDEX IF NOT EXISTS documents_retention ON documents (retention_until)",
+)
+
+
+@dataclass
+class IndexedDocument:
+    """Simplificação já entregue para um número de processo"""
+    process_number: str
+    simplified: Dict[str, str]
+    payload_text: str
+    generated_by: str
+    document_type: Optional[str]
+    source: str
+    created_at: str
+
+
+class ProcessIndex:
+    """Documentos simplificados indexados por número CNJ (20 dígitos)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            conn.execute(statement)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def add(
+        self,
+        process_number: str,
+        simplified: Dict[str, str],
+        payload_text: str,
+        retention_until: datetime,
+        user_id: Optional[str] = None,
+        generated_by: str = "llm",
+        document_type: Optional[str] = None,
+        source: str = "upload",
+    ) -> int:
+        """Indexa o documento no número do processo (`user_id`: dono do documento enviado); devolve o id do registro"""
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO documents (process_number, user_id, simplified, payload_text, generated_by, "
+                "document_type, source, created_at, retention_until) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (process_number, user_id, json.dumps(simplified, ensure_ascii=False), payload_text, generated_by,
+                 document_type, source, datetime.now(timezone.utc).isoformat(), retention_until.isoformat()),
+            )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.purge_expired()
+        return cursor.lastrowid
+
+    def lookup(self, process_number: str, user_id: Optional[str] = None) -> Optional[IndexedDocument]:
+        """
+        Documento mais recente (e ainda dentro da retenção) do processo visível para `user_id`
+
+        Documentos enviados por usuários só aparecem para o mesmo `user_id`;
+        sem ele, só os obtidos de fontes do tribunal.
+        """
+        placeholders = ", ".join("?" for _ in USER_SOURCES)
+        row = self._connect().execute(
+            "SELECT process_number, simplified, payload_text, generated_by, document_type, source, created_at "
+            "FROM documents WHERE process_number = ? AND retention_until > ? "
+            f"AND (source NOT IN ({placeholders}) OR (user_id IS NOT NULL AND user_id = ?)) "
+            "ORDER BY created_at DESC LIMIT 1",
+            (process_number, datetime.now(timezone.utc).isoformat(), *USER_SOURCES, user_id),
+        ).fetchone()
+        if row is None:
+            return None
+        number, simplified, payload_text, generated_by, document_type, source, created_at = row
+        return IndexedDocument(number, json.loads(simplified), payload_text, generated_by, document_type, source, created_at)
+
+    def count(self, process_number: str) -> int:
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM documents WHERE process_number = ? AND retention_until > ?",
+            (process_number, datetime.now(timezone.utc).isoformat()),
+        ).fetchone()[0]
+
+    def purge_expired(self) -> int:
+        with self._connect() as conn:
+            deleted = conn.execute(
+                "DELETE FROM documents WHERE retention_until <= ?", (datetime.now(timezone.utc).isoformat(),)
+            ).rowcount
+        if deleted:
+            logger.info(f"Índice de processos: {deleted} registro(s) expirado(s) removido(s)")
+        return deleted
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def is_sealed(text: str) -> bool:
+    """Documento sob segredo de justiça (não deve ser servido por número)"""
+    return bool(_SEALED.search(text))
+
+
+_index: Optional[ProcessIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_process_index() -> ProcessIndex:
+    """Índice do processo (criado no primeiro uso)"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ProcessIndex(settings.process_index_path)
+        return _index
+
+
+def close_process_index():
+    global _index
+    with _index_lock:
+        if _index is not None:
+            _index.close()
+            _index = None
+
+
+def index_document(
+    process_numbers: List[str],
+    raw_text: str,
+    simplified: Dict[str, str],
+    payload_text: str,
+    retention_until: datetime,
+    user_id: Optional[str] = None,
+    generated_by: str = "llm",
+    document_type: Optional[str] = None,
+    source: str = "upload",
+) -> Optional[int]:
+    """
+    Indexa um documento processado pelo número principal (best-effort: falhas só geram log)
+
+    Devolve o id do registro, ou None se o documento não foi indexado.
+
+    `process_numbers` vem na ordem do texto: o primeiro é o do cabeçalho; os
+    demais são processos citados e não recebem esta simplificação. Documentos
+    de usuários sem `user_id` não são indexados (ninguém poderia consultá-los).
+    """
+    if not process_numbers:
+        return None
+    if source in USER_SOURCES and not user_id:
+        return None
+    if is_sealed(raw_text):
+        logger.info("Documento em segredo de justiça: não indexado por número de processo")
+        return None
+    try:
+        return get_process_index().add(
+            process_numbers[0], simplified, payload_text, retention_until,
+            user_id=user_id, generated_by=generated_by, document_type=document_type, source=source,
+        )
+    except Exception as e:
+        logger.error(f"Erro ao indexar documento por número de processo: {e}")
+        return None
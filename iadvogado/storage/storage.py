@@ -1,39 +1,59 @@
 # Minimal storage via Supabase (storing original text, simplified result metadata)
-from supabase import create_client
 from ..config.config import settings
-from datetime import datetime
+from ..core.metrics import time_stage
+from datetime import datetime, timezone
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Criar cliente Supabase apenas se configurado
+# Cliente Supabase criado em init_storage() (lifespan da API) e não no import
 supabase = None
-if settings.supabase_url and settings.supabase_key:
+_initialized = False
+
+def init_storage():
+    """Cria o cliente Supabase apenas se configurado (idempotente)"""
+    global supabase, _initialized
+    if _initialized:
+        return supabase
+    _initialized = True
+
+    if not (settings.supabase_url and settings.supabase_key):
+        logger.warning("Supabase não configurado (supabase_url/supabase_key não fornecidos)")
+        return None
+
     try:
+        from supabase import create_client
         supabase = create_client(settings.supabase_url, settings.supabase_key)
         logger.info("Supabase cliente inicializado")
     except Exception as e:
         logger.warning(f"Erro ao inicializar Supabase: {e}")
-else:
-    logger.warning("Supabase não configurado (supabase_url/supabase_key não fornecidos)")
+    return supabase
+
+def close_storage():
+    """Descarta o cliente Supabase (shutdown da API)"""
+    global supabase, _initialized
+    supabase = None
+    _initialized = False
 
 async def save_processing_record(user_id: str | None, raw_text: str, simplified: dict, retention_until: datetime):
-    if not supabase:
+    client = init_storage()
+    if not client:
         logger.debug("Supabase não disponível, pulando salvamento")
         return None
-    
+
     try:
         data = {
             "user_id": user_id,
             "raw_text": raw_text,
             "simplified": simplified,
             "retention_until": retention_until.isoformat(),
-            "created_at": datetime.utcnow().isoformat(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
         }
         # Assumes you created a table `processes` with JSON column `simplified` in Supabase
-        res = supabase.table('processes').insert(data).execute()
+        with time_stage("storage"):
+            res = client.table('processes').insert(data).execute()
         logger.debug("Registro salvo no Supabase")
         return res
     except Exception as e:
         logger.error(f"Erro ao salvar no Supabase: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,44 @@
+"""
+Números de processo no padrão CNJ (Resolução 65/2008): NNNNNNN-DD.AAAA.J.TR.OOOO
+
+DD são dígitos verificadores (módulo 97, ISO 7064). Números extraídos do OCR só
+são aceitos se os dígitos conferirem, o que descarta leituras erradas.
+"""
+
+import re
+from typing import List, Optional
+
+# Tolera separadores trocados ou ausentes e espaços inseridos pelo OCR
+_CNJ_PATTERN = re.compile(
+    r"(?<!\d)(\d{7})\s?[-–.]?\s?(\d{2})\s?\.?\s?(\d{4})\s?\.?\s?(\d)\s?\.?\s?(\d{2})\s?\.?\s?(\d{4})(?!\d)"
+)
+_NON_DIGITS = re.compile(r"\D")
+
+
+def check_digits(number: str) -> str:
+    """Dígitos verificadores de um número de 20 dígitos (ignora os DD informados)"""
+    base = number[:7] + number[9:] + "00"
+    return f"{98 - int(base) % 97:02d}"
+
+
+def normalize_cnj(value: str) -> Optional[str]:
+    """Número com 20 dígitos e dígitos verificadores válidos, ou None"""
+    digits = _NON_DIGITS.sub("", value or "")
+    if len(digits) != 20 or digits[7:9] != check_digits(digits):
+        return None
+    return digits
+
+
+def format_cnj(digits: str) -> str:
+    """20 dígitos -> NNNNNNN-DD.AAAA.J.TR.OOOO"""
+    return f"{digits[:7]}-{digits[7:9]}.{digits[9:13]}.{digits[13]}.{digits[14:16]}.{digits[16:]}"
+
+
+def extract_cnj_numbers(text: str) -> List[str]:
+    """Números CNJ válidos encontrados no texto (20 dígitos, sem repetição, na ordem)"""
+    found: List[str] = []
+    for match in _CNJ_PATTERN.finditer(text):
+        digits = normalize_cnj("".join(match.groups()))
+        if digits and digits not in found:
+            found.append(digits)
+    return found
@@ -1,5 +1,5 @@
 import io
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from ..config.config import settings
 
 def make_disclaimer() -> str:
@@ -9,4 +9,4 @@ def make_disclaimer() -> str:
     )
 
 def expiration_date() -> datetime:
-    return datetime.utcnow() + timedelta(days=settings.data_retention_days)
\ No newline at end of file
+    return datetime.now(timezone.utc) + timedelta(days=settings.data_retention_days)
\ No newline at end of file
@@ -11,15 +11,22 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 if script_dir not in sys.path:
     sys.path.insert(0, script_dir)
 
+import logging
 import uvicorn
-from iadvogado.api.main import app
 from iadvogado.config.config import settings
+from iadvogado.core.metrics import reset_multiprocess_dir
+from iadvogado.api.static_assets import precompress
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    reset_multiprocess_dir()
+    precompress()  # gera/atualiza static/*.br e *.gz
     print(f"🚀 Iniciando IADvogado em http://{settings.fastapi_host}:{settings.fastapi_port}")
     print(f"📱 Chatbot disponível em http://localhost:{settings.fastapi_port}/")
+    # App passado como string de import: necessário para o reload funcionar
+    # e mantém o processo supervisor leve (só os workers importam a API)
     uvicorn.run(
-        app,
+        "iadvogado.api.main:app",
         host=settings.fastapi_host,
         port=settings.fastapi_port,
         reload=True
@@ -0,0 +1,57 @@
+// Prepara a foto do documento antes do upload, fora da thread da página:
+// decodifica (respeitando a orientação EXIF), reduz ao lado máximo usado pelo
+// OCR do servidor, converte para tons de cinza e recodifica (WebP ou JPEG).
+//
+// Mensagem: { id, file, maxSide, grayscale, quality, formats }
+// Resposta: { id, blob, width, height } ou { id, error }
+
+function toGrayscale(ctx, width, height) {
+    const image = ctx.getImageData(0, 0, width, height);
+    const pixels = image.data;
+    for (let i = 0; i < pixels.length; i += 4) {
+        // Luma BT.601, a mesma do convert("L") do Pillow
+        const y = (pixels[i] * 299 + pixels[i + 1] * 587 + pixels[i + 2] * 114) / 1000;
+        pixels[i] = pixels[i + 1] = pixels[i + 2] = y;
+    }
+    ctx.putImageData(image, 0, 0);
+}
+
+async function encode(canvas, formats, quality) {
+    for (const type of formats) {
+        const blob = await canvas.convertToBlob({ type, quality });
+        // Navegadores sem o codificador pedido devolvem PNG: tenta o próximo formato
+        if (blob.type === type) {
+            return blob;
+        }
+    }
+    return canvas.convertToBlob({ type: 'image/jpeg', quality });
+}
+
+async function prepare({ file, maxSide, grayscale, quality, formats }) {
+    const bitmap = await createImageBitmap(file, { imageOrientation: 'from-image' });
+    const scale = Math.min(1, maxSide / Math.max(bitmap.width, bitmap.height));
+    const width = Math.max(1, Math.round(bitmap.width * scale));
+    const height = Math.max(1, Math.round(bitmap.height * scale));
+
+    const canvas = new OffscreenCanvas(width, height);
+    const ctx = canvas.getContext('2d', { willReadFrequently: grayscale });
+    ctx.imageSmoothingEnabled = true;
+    ctx.imageSmoothingQuality = 'high';
+    ctx.drawImage(bitmap, 0, 0, width, height);
+    bitmap.close();
+
+    if (grayscale) {
+        toGrayscale(ctx, width, height);
+    }
+    const blob = await encode(canvas, formats, quality);
+    return { blob, width, height };
+}
+
+self.onmessage = async (event) => {
+    const { id } = event.data;
+    try {
+        self.postMessage({ id, ...(await prepare(event.data)) });
+    } catch (error) {
+        self.postMessage({ id, error: String(error && error.message || error) });
+    }
+};
@@ -0,0 +1,111 @@
+"""
+Controle de admissão: token bucket por chave, limite global e IP atrás de proxy
+"""
+
+import asyncio
+
+import pytest
+
+from iadvogado.config.config import settings
+from iadvogado.core import admission
+from iadvogado.core.admission import (
+    BACKEND_UNAVAILABLE, OVERLOADED, RATE_LIMITED, AdmissionController, AdmissionRejected, MemoryBucketStore,
+    SQLiteBucketStore, client_ip,
+)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryBucketStore()
+    return SQLiteBucketStore(str(tmp_path / "admission.db"))
+
+
+def _admit(controller, keys, cost=1.0, hold_slot=False):
+    return asyncio.run(controller.admit(keys, cost, hold_slot=hold_slot))
+
+
+def test_burst_then_refill(store, clock):
+    controller = AdmissionController(store, capacity=2, rate_per_minute=60, max_inflight=10)
+    _admit(controller, ["ip:a"])
+    _admit(controller, ["ip:a"])
+    with pytest.raises(AdmissionRejected) as rejected:
+        _admit(controller, ["ip:a"])
+    assert rejected.value.reason == RATE_LIMITED
+    assert rejected.value.key == "ip:a"
+    assert rejected.value.retry_after == pytest.approx(1.0)
+
+    clock[0] += 1.0  # 1 ficha por segundo
+    _admit(controller, ["ip:a"])
+
+
+def test_all_or_nothing_across_keys(store, clock):
+    controller = AdmissionController(store, capacity=2, rate_per_minute=60, max_inflight=10)
+    _admit(controller, ["user:u"], cost=2)
+    with pytest.raises(AdmissionRejected):
+        _admit(controller, ["ip:a", "user:u"])
+    # A recusa pela chave do usuário não consumiu o balde do IP
+    _admit(controller, ["ip:a"], cost=2)
+
+
+def test_cost_and_independent_keys(store, clock):
+    controller = AdmissionController(store, capacity=3, rate_per_minute=60, max_inflight=10)
+    _admit(controller, ["ip:a"], cost=2)
+    with pytest.raises(AdmissionRejected):
+        _admit(controller, ["ip:a"], cost=2)
+    _admit(controller, ["ip:b"], cost=3)
+
+
+def test_global_inflight_limit(clock):
+    controller = AdmissionController(MemoryBucketStore(), capacity=10, rate_per_minute=60, max_inflight=1)
+    held = _admit(controller, ["ip:a"], hold_slot=True)
+    with pytest.raises(AdmissionRejected) as rejected:
+        _admit(controller, ["ip:b"], hold_slot=True)
+    assert rejected.value.reason == OVERLOADED
+    held.release()
+    _admit(controller, ["ip:b"], hold_slot=True).release()
+    assert controller.inflight == 0
+
+
+def test_backend_failure_fails_closed(clock):
+    class BrokenStore:
+        blocking = True
+
+        def take(self, *args):
+            raise OSError("database is locked")
+
+    controller = AdmissionController(BrokenStore(), capacity=10, rate_per_minute=60, max_inflight=1)
+    with pytest.raises(AdmissionRejected) as rejected:
+        _admit(controller, ["ip:a"], hold_slot=True)
+    assert rejected.value.reason == BACKEND_UNAVAILABLE
+    assert controller.inflight == 0
+
+
+def test_rate_must_be_positive():
+    with pytest.raises(ValueError):
+        AdmissionController(MemoryBucketStore(), capacity=1, rate_per_minute=0)
+    with pytest.raises(ValueError):
+        type(settings)(admission_rate_per_minute=0)
+
+
+def test_client_ip_ignores_header_by_default(monkeypatch):
+    monkeypatch.setattr(settings, "admission_client_ip_header", None)
+    assert client_ip("127.0.0.1", {"X-Forwarded-For": "203.0.113.9"}) == "127.0.0.1"
+
+
+def test_client_ip_behind_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(settings, "admission_client_ip_header", "X-Forwarded-For")
+    monkeypatch.setattr(settings, "admission_trusted_proxies", "127.0.0.1,10.0.0.0/8")
+    headers = {"X-Forwarded-For": "198.51.100.1, 203.0.113.9, 10.1.2.3"}
+    # O salto mais à direita fora dos proxies é o cliente; o da esquerda pode ser forjado
+    assert client_ip("127.0.0.1", headers) == "203.0.113.9"
+    # Conexão direta (não vem de proxy confiável): o header é ignorado
+    assert client_ip("198.51.100.7", headers) == "198.51.100.7"
+    assert client_ip("127.0.0.1", {}) == "127.0.0.1"
@@ -0,0 +1,65 @@
+"""
+Expansão das entradas do lote (/batch): arquivos soltos e membros de ZIP
+"""
+
+import asyncio
+import io
+import zipfile
+
+import pytest
+
+from iadvogado.core.batch import BatchInputError, expand_inputs
+
+MB = 1024 * 1024
+
+
+def _zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def _expand(files, max_documents=10, max_bytes=MB, max_total_bytes=10 * MB):
+    async def collect():
+        return [item async for item in expand_inputs(files, max_documents, max_bytes, max_total_bytes)]
+    return asyncio.run(collect())
+
+
+def test_plain_files_and_zip_members_in_order():
+    archive = _zip({"a.png": b"A", "__MACOSX/._a.png": b"x", ".DS_Store": b"x", "dir/b.png": b"B"})
+    entries = _expand([("solto.jpg", io.BytesIO(b"S")), ("lote.zip", archive)])
+    assert entries == [("solto.jpg", b"S"), ("a.png", b"A"), ("dir/b.png", b"B")]
+
+
+def test_member_count_is_checked_before_reading():
+    archive = _zip({f"{i}.png": b"x" for i in range(5)})
+    with pytest.raises(BatchInputError, match="4 documentos"):
+        _expand([("lote.zip", archive)], max_documents=4)
+
+
+def test_member_count_includes_previous_files():
+    archive = _zip({"a.png": b"x", "b.png": b"x"})
+    with pytest.raises(BatchInputError, match="documentos"):
+        _expand([("solto.jpg", io.BytesIO(b"S")), ("lote.zip", archive)], max_documents=2)
+
+
+def test_member_over_size_limit():
+    archive = _zip({"grande.png": b"\0" * (MB + 1)})
+    with pytest.raises(BatchInputError, match="grande.png"):
+        _expand([("lote.zip", archive)])
+
+
+def test_total_uncompressed_bytes_are_capped():
+    # Membros muito compressíveis: o ZIP é pequeno, o conteúdo descomprimido não
+    archive = _zip({f"{i}.png": b"\0" * MB for i in range(4)})
+    assert len(archive.getvalue()) < MB // 10
+    with pytest.raises(BatchInputError, match="descomprimidos"):
+        _expand([("lote.zip", archive)], max_total_bytes=3 * MB)
+
+
+def test_invalid_zip():
+    with pytest.raises(BatchInputError, match="ZIP inválido"):
+        _expand([("lote.zip", io.BytesIO(b"PK\x03\x04corrompido"))])
@@ -0,0 +1,70 @@
+"""
+Classificador de modelos de documento (caminho rápido sem LLM)
+"""
+
+from datetime import date
+
+from iadvogado.services.document_templates import classify, extract_fields, match_template
+
+TODAY = date(2025, 3, 1)
+
+
+def _types(text):
+    return [name for name, _ in classify(text)]
+
+
+def test_passing_citado_is_not_a_summons():
+    text = (
+        "Fica a parte autora intimada para, no prazo de 15 dias, manifestar-se sobre a "
+        "contestação apresentada pelo réu, devidamente citado."
+    )
+    assert "citacao" not in _types(text)
+    assert match_template(text, 0.4, TODAY) is None
+
+
+def test_passing_citado_does_not_exclude_hearing_notice():
+    text = (
+        "INTIMAÇÃO. Fica a parte autora intimada da audiência de conciliação designada para "
+        "20/03/2025, às 14h30, na 2ª Vara Cível. O réu, devidamente citado, também deverá comparecer."
+    )
+    match = match_template(text, 0.7, TODAY)
+    assert match is not None
+    assert match.document_type == "intimacao_audiencia"
+    assert match.fields["date"] == "20 de março de 2025"
+    assert match.fields["time"] == "14h30"
+
+
+def test_passing_citacao_does_not_exclude_routine_order():
+    text = "Vistos. Junte-se aos autos o aviso de recebimento da carta de citação. Cumpra-se."
+    assert _types(text)[0] == "despacho_mero_expediente"
+
+
+def test_operative_summons_forms():
+    assert _types("Cite-se o réu para, no prazo de 15 dias, apresentar contestação.")[0] == "citacao"
+    assert _types("Pelo presente, fica o réu citado para apresentar contestação.")[0] == "citacao"
+    assert _types("MANDADO DE CITAÇÃO\nProcesso 0001234-56.2024.8.26.0100\nPrazo de 15 dias.")[0] == "citacao"
+
+
+def test_supporting_words_alone_do_not_make_a_summons():
+    text = "Sob pena de revelia, a contestação deve ser apresentada no prazo de 15 dias."
+    assert "citacao" not in _types(text)
+
+
+def test_hearing_date_prefers_designation_over_document_date():
+    text = (
+        "São Paulo, 10/02/2025. Em audiência realizada em 05/02/2025 as partes não fizeram acordo. "
+        "Designo audiência de instrução e julgamento para 12 de maio de 2025, às 9h."
+    )
+    fields = extract_fields(text, TODAY)
+    assert fields["date"] == "12 de maio de 2025"
+    assert fields["time"] == "9h00"
+
+
+def test_past_hearing_date_is_ignored():
+    text = "A audiência de conciliação designada para 10/01/2025 foi cancelada."
+    assert "date" not in extract_fields(text, TODAY)
+
+
+def test_invalid_dates_are_skipped():
+    text = "Audiência designada para 31/02/2025, remarcada: designo audiência para 15/04/2025."
+    assert extract_fields(text, TODAY)["date"] == "15 de abril de 2025"
@@ -0,0 +1,129 @@
+"""
+Cache de quase-duplicatas: índice SimHash (LSH em bandas) e reaproveitamento seguro
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from iadvogado.services import near_duplicates
+from iadvogado.services.near_duplicates import (
+    fingerprint_document, find_near_duplicate, patch_numbers, remember_simplification,
+)
+from iadvogado.storage.near_duplicate_index import NearDuplicateEntry, NearDuplicateIndex
+
+NUMBER = "1001234-54.2024.8.26.0100"
+DOCUMENT = (
+    f"Processo nº {NUMBER}. Fica a parte autora intimada para comparecer à audiência de conciliação "
+    "designada para o dia 15/03/2099, às 14h30, na sala de audiências da 2ª Vara Cível do Foro Central, "
+    "devendo apresentar documentos pessoais e comprovante de residência, sob pena de extinção do feito. "
+    "As partes deverão comparecer acompanhadas de seus advogados ou defensores públicos. O não comparecimento "
+    "injustificado do autor implicará a extinção do processo, e o do réu será considerado ato atentatório à "
+    "dignidade da justiça, sancionado com multa de até dois por cento da vantagem econômica pretendida. Os "
+    "documentos que comprovem as alegações das partes deverão ser apresentados até a data da audiência, sob pena "
+    "de preclusão. Havendo interesse na produção de prova oral, as partes deverão arrolar testemunhas no prazo "
+    "legal, indicando nome completo, profissão e endereço, para posterior intimação pelo cartório."
+)
+SIMPLIFIED = {
+    "what_happened": "Você foi intimado para uma audiência de conciliação em 15/03/2099, às 14h30.",
+    "what_it_means": "É uma tentativa de acordo antes de o juiz decidir.",
+    "what_to_do_now": "Compareça com documento com foto e comprovante de residência.",
+}
+
+
+def _future():
+    return datetime.now(timezone.utc) + timedelta(days=30)
+
+
+def _flip(value, bits):
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    index = NearDuplicateIndex(str(tmp_path / "near.db"), max_distance=4)
+    monkeypatch.setattr(near_duplicates, "get_near_duplicate_index", lambda: index)
+    yield index
+    index.close()
+
+
+def _entry(fingerprint):
+    return NearDuplicateEntry(fingerprint, "esqueleto", [], [], {"what_happened": str(fingerprint)})
+
+
+def test_band_search_matches_brute_force(tmp_path):
+    rng = random.Random(7)
+    index = NearDuplicateIndex(str(tmp_path / "near.db"), max_distance=4)
+    base = rng.getrandbits(64)
+    stored = [base] + [_flip(base, rng.sample(range(64), k)) for k in (1, 3, 4, 5, 8)]
+    stored += [rng.getrandbits(64) for _ in range(200)]
+    for fingerprint in stored:
+        index.add(_entry(fingerprint), _future())
+
+    expected = sorted(
+        ((fp, (fp ^ base).bit_count()) for fp in set(stored) if (fp ^ base).bit_count() <= 4),
+        key=lambda match: match[1],
+    )
+    assert index.candidates(base) == expected
+    assert [distance for _, distance in expected] == [0, 1, 3, 4]
+
+
+def test_entries_persist_and_expire(tmp_path):
+    path = str(tmp_path / "near.db")
+    first = NearDuplicateIndex(path, max_distance=2)
+    first.add(_entry(42), _future())
+    first.add(_entry(7), datetime.now(timezone.utc) - timedelta(seconds=1))
+
+    second = NearDuplicateIndex(path, max_distance=2)
+    assert second.get(42).simplified == {"what_happened": "42"}
+    assert second.get(7) is None
+    assert first.get(7) is None  # expirado depois de entrar na memória
+    assert second.purge_expired() == 1
+
+
+def test_same_text_is_reused(index):
+    fingerprint = fingerprint_document(DOCUMENT)
+    assert remember_simplification(fingerprint, [NUMBER], SIMPLIFIED, _future())
+    match = find_near_duplicate(fingerprint_document(DOCUMENT), [NUMBER])
+    assert match.kind == "same_text"
+    assert match.distance == 0
+    assert match.simplified == SIMPLIFIED
+
+
+def test_changed_numbers_are_patched(index):
+    remember_simplification(fingerprint_document(DOCUMENT), [NUMBER], SIMPLIFIED, _future())
+    other = DOCUMENT.replace("15/03/2099", "22/04/2099").replace("14h30", "9h15")
+    match = find_near_duplicate(fingerprint_document(other), [NUMBER])
+    assert match.kind == "patched"
+    assert "22/04/2099, às 9h15" in match.simplified["what_happened"]
+    assert match.patched == ["14h30", "15/03/2099"]
+
+
+def test_date_written_out_blocks_patching():
+    simplified = {"what_happened": "Audiência em 15 de março (15/03/2099)."}
+    assert patch_numbers(simplified, ["15/03/2099"], ["22/04/2099"]) is None
+
+
+def test_ambiguous_number_blocks_patching():
+    simplified = {"what_happened": "Prazo de 15 dias."}
+    assert patch_numbers(simplified, ["15", "15"], ["10", "20"]) is None
+
+
+def test_different_process_is_not_reused(index):
+    remember_simplification(fingerprint_document(DOCUMENT), [NUMBER], SIMPLIFIED, _future())
+    # Ruído de OCR muda o esqueleto: só vale para o mesmo processo
+    noisy = DOCUMENT.replace("audiências", "audiencias")
+    assert find_near_duplicate(fingerprint_document(noisy), ["99999999999999999999"]) is None
+    match = find_near_duplicate(fingerprint_document(noisy), [NUMBER])
+    assert match is not None and match.kind == "same_process"
+    assert 0 < match.distance <= index.max_distance
+
+
+def test_short_and_fallback_texts_are_not_cached(index):
+    assert not remember_simplification(fingerprint_document("Texto curto."), [], SIMPLIFIED, _future())
+    fallback = dict(SIMPLIFIED, what_happened="Documento jurídico analisado: ...")
+    assert not remember_simplification(fingerprint_document(DOCUMENT), [], fallback, _future())
+    assert len(index) == 0
@@ -0,0 +1,63 @@
+"""
+Normalização do texto do OCR antes do LLM
+"""
+
+from iadvogado.services.text_normalizer import normalize_legal_text
+
+
+def _text(raw):
+    return normalize_legal_text(raw).text
+
+
+def test_hyphenated_words_are_joined():
+    assert _text("Fica a parte intima-\nda para compa-\nrecer.") == "Fica a parte intimada para comparecer."
+
+
+def test_enclitic_hyphen_is_kept():
+    assert _text("Intime-\nse a parte. Cite-\no réu para intimá-\nlo.") == "Intime-se a parte. Cite-o réu para intimá-lo."
+
+
+def test_uppercase_continuation_is_not_joined():
+    assert _text("Processo nº 123-\nAutor: Fulano") == "Processo nº 123-\nAutor: Fulano"
+
+
+def test_boilerplate_and_noise_lines_are_removed():
+    raw = (
+        "Fica a parte autora intimada.\n"
+        "Documento assinado eletronicamente por JOSÉ DA SILVA em 10/02/2025\n"
+        "Número do documento: 24021012345678900000012345678\n"
+        "____________________\n"
+        "Página 1 de 3\n"
+    )
+    result = normalize_legal_text(raw)
+    assert result.text == "Fica a parte autora intimada."
+    assert result.removed_lines == 4
+    assert 0 < result.reduction < 1
+
+
+def test_page_edge_repetitions_keep_first_occurrence():
+    page = "TRIBUNAL DE JUSTIÇA\nVARA CÍVEL\n{body}\nRua Central, 100"
+    raw = "\f".join(page.format(body=body) for body in ("Primeira página.", "Segunda página.", "Terceira página."))
+    text = _text(raw)
+    assert text.count("TRIBUNAL DE JUSTIÇA") == 1
+    assert text.count("Rua Central, 100") == 1
+    assert "Primeira página." in text and "Terceira página." in text
+
+
+def test_repeated_body_lines_are_kept():
+    lines = [f"Parágrafo {i}." for i in range(20)]
+    lines[8] = lines[12] = "Intime-se."
+    page = "\n".join(lines)
+    assert _text(page + "\f" + page.replace("Parágrafo", "Item")).count("Intime-se.") == 4
+
+
+def test_single_page_keeps_its_edges():
+    raw = "TRIBUNAL DE JUSTIÇA\nDespacho.\nTRIBUNAL DE JUSTIÇA"
+    assert _text(raw).count("TRIBUNAL DE JUSTIÇA") == 2
+
+
+def test_only_boilerplate_falls_back_to_original():
+    raw = "Página 1 de 1"
+    result = normalize_legal_text(raw)
+    assert result.text == raw
+    assert result.removed_lines == 0